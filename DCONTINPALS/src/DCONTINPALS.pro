@@ -17,6 +17,12 @@ CONTINPALS/CONTPALS.FOR
 HEADERS += dcontinpals.h\
         dcontinpals_global.h
 
+# the common blocks of CONTIN-PALS are declared THREADPRIVATE (-fopenmp), so that analyses on different
+# handles can run concurrently (see analyseDataByHandle())
+QMAKE_CFLAGS   += -fopenmp
+QMAKE_CXXFLAGS += -fopenmp
+QMAKE_LFLAGS   += -fopenmp
+
 LIBS += -lgfortran
 LIBS += -static-libgcc -static-libstdc++
 
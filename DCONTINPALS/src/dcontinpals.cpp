@@ -25,6 +25,32 @@
 
 static DCONTINPALSPrivateData *m_results = nullptr;
 
+/* guards the global results and the FORT.* files (fixed names in the working directory) */
+static QMutex m_globalMutex;
+
+/* kernel cache: see setKernelCacheSize() and setKernelCacheDirectory() (cost = kB) */
+static QMutex m_kernelCacheMutex;
+static QCache<QByteArray, QVector<float> > m_kernelCache(64*1024);
+static QString m_kernelCacheDir;
+static qint64 m_kernelCacheDirMaxSize = 0;
+
+/* warm start of analyseDataInMemory() (guarded by m_globalMutex) */
+static DCONTINPALSWarmStart m_warmStart;
+
+/* budget of analyseDataInMemory() (guarded by m_globalMutex) */
+static DCONTINPALSBudget m_budget;
+
+/* threads of an analysis of analyseData() and analyseDataInMemory() (guarded by m_globalMutex) */
+static int m_threads = 1;
+
+/* statistics of the last analysis of analyseData() or analyseDataInMemory() (guarded by m_globalMutex) */
+static DCONTINPALSStatistics m_statistics;
+
+#ifndef _OPENMP
+/* CONTIN-PALS is only reentrant if its common blocks are THREADPRIVATE (-fopenmp) */
+static QMutex m_continMutex;
+#endif
+
 dcpalsVersionInfo::versionNumber version(void) {
     return dcpalsVersionInfo::versionNumber::MAJOR;
 }
@@ -39,14 +65,475 @@ dcpalsErrorCode analyseData(int lifetimeData[],
                             int numberOfGridPoints,
                             int offsetChannelBkgrdCalc,
                             int numberChannelsBkgrdCalc) {
+    QMutexLocker locker(&m_globalMutex);
+
+    QElapsedTimer totalTimer;
+    totalTimer.start();
+
+    m_statistics.reset();
+
+    /* return to initial state */
+    deleteAllFiles();
+
+    if (m_results) {
+        delete m_results;
+        m_results = nullptr;
+    }
+
+    const dcpalsErrorCode error = checkInputParameters(lifetimeData,
+                                                       refLifetimeData,
+                                                       ltDataLen,
+                                                       binWidth_ps,
+                                                       minTauGrid_ps,
+                                                       maxTauGrid_ps,
+                                                       numberOfGridPoints,
+                                                       offsetChannelBkgrdCalc,
+                                                       numberChannelsBkgrdCalc);
+
+    if (error != dcpalsErrorCode::SUCCESS)
+        return error;
+
+    QElapsedTimer timer;
+    timer.start();
+
+    /* create CONTIN-PALS compatible files */
+    createAndEditFORT2(minTauGrid_ps,
+                       maxTauGrid_ps,
+                       numberOfGridPoints,
+                       ltDataLen,
+                       binWidth_ps);
+
+    createAndEditFORT50(lifetimeData,
+                        offsetChannelBkgrdCalc,
+                        numberChannelsBkgrdCalc);
+
+    createAndEditFORT51(refLifetimeData,
+                        refMonoDecayLifetime_ps,
+                        offsetChannelBkgrdCalc,
+                        numberChannelsBkgrdCalc);
+
+    createAndEditFORT55(lifetimeData,
+                        ltDataLen);
+
+    createAndEditFORT56(refLifetimeData,
+                        ltDataLen);
+
+    m_statistics.m_time[PHASE_FILES] = timer.nsecsElapsed()*1E-6;
+    m_statistics.m_counter[COUNTER_BYTES_WRITTEN] = sizeOfFiles(QStringList() << "FORT.2" << "FORT.50" << "FORT.51" << "FORT.55" << "FORT.56");
+
+    /* call CONTIN-PALS */
+    {
+#ifndef _OPENMP
+        QMutexLocker continLocker(&m_continMutex);
+#endif
+
+        /* the work arrays are allocated according to the size of the problem */
+        int ny = ltDataLen;
+        int ng = numberOfGridPoints;
+
+        continpalssetsize_(&ny, &ng);
+        continpalssetthreads_(&m_threads);
+        continpalsmainprogram_();
+
+        m_statistics.fetchContinStatistics();
+    }
+
+    m_statistics.m_counter[COUNTER_BYTES_READ] = sizeOfFiles(QStringList() << "FORT.82" << "FORT.11");
+
+    timer.restart();
+
+    /* check for results */
+    const bool hasResults = prepareResults();
+
+    m_statistics.m_time[PHASE_RESULTS] = timer.nsecsElapsed()*1E-6;
+    m_statistics.m_time[PHASE_TOTAL] = totalTimer.nsecsElapsed()*1E-6;
+
+    if (!hasResults)
+        return dcpalsErrorCode::NO_RESULTS;
+
     /* return to initial state */
     deleteAllFiles();
 
+    return dcpalsErrorCode::SUCCESS;
+}
+
+dcpalsErrorCode analyseDataInMemory(int lifetimeData[],
+                                    int refLifetimeData[],
+                                    int ltDataLen,
+                                    double refMonoDecayLifetime_ps,
+                                    double binWidth_ps,
+                                    double minTauGrid_ps,
+                                    double maxTauGrid_ps,
+                                    int numberOfGridPoints,
+                                    int offsetChannelBkgrdCalc,
+                                    int numberChannelsBkgrdCalc) {
+    QMutexLocker locker(&m_globalMutex);
+
+    /* return to initial state */
     if (m_results) {
         delete m_results;
         m_results = nullptr;
     }
 
+    DCONTINPALSPrivateData *results = new DCONTINPALSPrivateData();
+
+    const dcpalsErrorCode error = runContinPALSInMemory(results,
+                                                        lifetimeData,
+                                                        refLifetimeData,
+                                                        ltDataLen,
+                                                        refMonoDecayLifetime_ps,
+                                                        binWidth_ps,
+                                                        minTauGrid_ps,
+                                                        maxTauGrid_ps,
+                                                        numberOfGridPoints,
+                                                        offsetChannelBkgrdCalc,
+                                                        numberChannelsBkgrdCalc,
+                                                        &m_warmStart,
+                                                        &m_budget,
+                                                        m_threads,
+                                                        &m_statistics);
+
+    if (error != dcpalsErrorCode::SUCCESS) {
+        delete results;
+
+        return error;
+    }
+
+    m_results = results;
+
+    return dcpalsErrorCode::SUCCESS;
+}
+
+void setKernelCacheSize(int maxSize_MB) {
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    m_kernelCache.setMaxCost(qMax(maxSize_MB, 0)*1024);
+}
+
+void setKernelCacheDirectory(const char *path, int maxSize_MB) {
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    m_kernelCacheDir = path ? QString::fromLocal8Bit(path) : QString();
+    m_kernelCacheDirMaxSize = qint64(qMax(maxSize_MB, 0))*1024*1024;
+
+    if (!m_kernelCacheDir.isEmpty())
+        QDir().mkpath(m_kernelCacheDir);
+}
+
+void clearKernelCache(void) {
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    m_kernelCache.clear();
+}
+
+void setWarmStart(bool enabled) {
+    QMutexLocker locker(&m_globalMutex);
+
+    m_warmStart.m_enabled = enabled;
+}
+
+void resetWarmStart(void) {
+    QMutexLocker locker(&m_globalMutex);
+
+    m_warmStart.reset();
+}
+
+void setWarmStartAcrossGrids(bool enabled) {
+    QMutexLocker locker(&m_globalMutex);
+
+    m_warmStart.m_acrossGrids = enabled;
+}
+
+void setAnalysisBudget(double maxTime_ms, int maxSolutions) {
+    QMutexLocker locker(&m_globalMutex);
+
+    m_budget.m_maxTime_ms = maxTime_ms;
+    m_budget.m_maxSolutions = maxSolutions;
+}
+
+bool isTruncated(void) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return m_statistics.m_truncated;
+}
+
+void setAnalysisThreads(int threads) {
+    QMutexLocker locker(&m_globalMutex);
+
+    m_threads = qMax(threads, 1);
+}
+
+dcpalsHandle createHandle(void) {
+    return new DCONTINPALSPrivateData();
+}
+
+void destroyHandle(dcpalsHandle handle) {
+    if (!handle)
+        return;
+
+    delete static_cast<DCONTINPALSPrivateData*>(handle);
+}
+
+void setWarmStartByHandle(dcpalsHandle handle, bool enabled) {
+    if (!handle)
+        return;
+
+    static_cast<DCONTINPALSPrivateData*>(handle)->m_warmStart.m_enabled = enabled;
+}
+
+void resetWarmStartByHandle(dcpalsHandle handle) {
+    if (!handle)
+        return;
+
+    static_cast<DCONTINPALSPrivateData*>(handle)->m_warmStart.reset();
+}
+
+void setWarmStartAcrossGridsByHandle(dcpalsHandle handle, bool enabled) {
+    if (!handle)
+        return;
+
+    static_cast<DCONTINPALSPrivateData*>(handle)->m_warmStart.m_acrossGrids = enabled;
+}
+
+void setAnalysisBudgetByHandle(dcpalsHandle handle, double maxTime_ms, int maxSolutions) {
+    if (!handle)
+        return;
+
+    DCONTINPALSBudget& budget = static_cast<DCONTINPALSPrivateData*>(handle)->m_budget;
+
+    budget.m_maxTime_ms = maxTime_ms;
+    budget.m_maxSolutions = maxSolutions;
+}
+
+void setAnalysisThreadsByHandle(dcpalsHandle handle, int threads) {
+    if (!handle)
+        return;
+
+    static_cast<DCONTINPALSPrivateData*>(handle)->m_threads = qMax(threads, 1);
+}
+
+dcpalsErrorCode analyseDataByHandle(dcpalsHandle handle,
+                                    int lifetimeData[],
+                                    int refLifetimeData[],
+                                    int ltDataLen,
+                                    double refMonoDecayLifetime_ps,
+                                    double binWidth_ps,
+                                    double minTauGrid_ps,
+                                    double maxTauGrid_ps,
+                                    int numberOfGridPoints,
+                                    int offsetChannelBkgrdCalc,
+                                    int numberChannelsBkgrdCalc) {
+    if (!handle)
+        return dcpalsErrorCode::INVALID_HANDLE;
+
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
+    /* return to initial state */
+    results->clear();
+
+    return runContinPALSInMemory(results,
+                                 lifetimeData,
+                                 refLifetimeData,
+                                 ltDataLen,
+                                 refMonoDecayLifetime_ps,
+                                 binWidth_ps,
+                                 minTauGrid_ps,
+                                 maxTauGrid_ps,
+                                 numberOfGridPoints,
+                                 offsetChannelBkgrdCalc,
+                                 numberChannelsBkgrdCalc,
+                                 &results->m_warmStart,
+                                 &results->m_budget,
+                                 results->m_threads,
+                                 &results->m_statistics);
+}
+
+dcpalsErrorCode runContinPALSInMemory(DCONTINPALSPrivateData *results,
+                                      int lifetimeData[],
+                                      int refLifetimeData[],
+                                      int ltDataLen,
+                                      double refMonoDecayLifetime_ps,
+                                      double binWidth_ps,
+                                      double minTauGrid_ps,
+                                      double maxTauGrid_ps,
+                                      int numberOfGridPoints,
+                                      int offsetChannelBkgrdCalc,
+                                      int numberChannelsBkgrdCalc,
+                                      DCONTINPALSWarmStart *warmStart,
+                                      const DCONTINPALSBudget *budget,
+                                      int threads,
+                                      DCONTINPALSStatistics *statistics) {
+    QElapsedTimer totalTimer;
+    totalTimer.start();
+
+    statistics->reset();
+
+    const dcpalsErrorCode error = checkInputParameters(lifetimeData,
+                                                       refLifetimeData,
+                                                       ltDataLen,
+                                                       binWidth_ps,
+                                                       minTauGrid_ps,
+                                                       maxTauGrid_ps,
+                                                       numberOfGridPoints,
+                                                       offsetChannelBkgrdCalc,
+                                                       numberChannelsBkgrdCalc);
+
+    if (error != dcpalsErrorCode::SUCCESS)
+        return error;
+
+    /* CONTIN-PALS expects the data as double precision */
+    QVector<double> y(ltDataLen), yRef(ltDataLen);
+
+    for (int i = 0 ; i < ltDataLen ; ++ i) {
+        y[i] = lifetimeData[i];
+        yRef[i] = refLifetimeData[i];
+    }
+
+    int ny = ltDataLen;
+    int ng = numberOfGridPoints;
+
+    double minDecayRate = 1.0/(maxTauGrid_ps*1E-3); /* convert to lambda value (annihilation rate) */
+    double maxDecayRate = 1.0/(minTauGrid_ps*1E-3);
+    double binWidth_ns = binWidth_ps*1E-3;
+
+    double refDecayRate = 1.0/1E-12;
+
+    if (!qIsNull(refMonoDecayLifetime_ps))
+        refDecayRate = 1.0/(refMonoDecayLifetime_ps*1E-3); /* convert to lambda value (annihilation rate) */
+
+    double bkgrd[2];
+    bkgrd[0] = calcBackground(lifetimeData, offsetChannelBkgrdCalc, numberChannelsBkgrdCalc);
+    bkgrd[1] = calcBackground(refLifetimeData, offsetChannelBkgrdCalc, numberChannelsBkgrdCalc);
+
+    int ngOut = 0, nyOut = 0;
+
+    QVector<double> decayRate(ng), intensity(ng), intensityErr(ng), residuals(ny);
+
+    /* kernel of a previous run with the same reference or compute (and cache) it during this run */
+    QByteArray kernelKey;
+    QVector<float> kernel;
+
+    int kernelState = 0;
+
+    if (isKernelCacheEnabled()) {
+        kernelKey = kernelCacheKey(refLifetimeData, ltDataLen, bkgrd[1], refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, ng);
+
+        kernelState = lookupKernel(kernelKey, &kernel) ? 2 : 1;
+
+        if (kernelState == 1)
+            kernel.resize(ny*ng);
+    }
+
+    /* warm start from the previous analysis or provide the values for the next one */
+    int warmState = 0;
+    double warmAlpha = 0.0;
+
+    QVector<double> warmSqrtw(ny, 1.0);
+
+    if (warmStart && warmStart->m_enabled) {
+        warmState = 1;
+
+        if (warmStart->isApplicable(ltDataLen, ng, minDecayRate, maxDecayRate, binWidth_ns)) {
+            warmState = 2;
+            warmAlpha = warmStart->alpha(ng, minDecayRate, maxDecayRate);
+            warmSqrtw = warmStart->m_sqrtw;
+        }
+    }
+
+    /* budget of the scan of the regularization parameter */
+    double maxTime_s = 0.0;
+    int maxSolutions = 0;
+    int truncated = 0;
+
+    if (budget) {
+        maxTime_s = qMax(budget->m_maxTime_ms, 0.0)*1E-3;
+        maxSolutions = qMax(budget->m_maxSolutions, 0);
+    }
+
+    /* call CONTIN-PALS */
+    {
+#ifndef _OPENMP
+        QMutexLocker continLocker(&m_continMutex);
+#endif
+
+        continpalssetthreads_(&threads);
+        continpalsmemoryprogram_(&ny,
+                                 y.data(),
+                                 yRef.data(),
+                                 &ng,
+                                 &minDecayRate,
+                                 &maxDecayRate,
+                                 &binWidth_ns,
+                                 &refDecayRate,
+                                 bkgrd,
+                                 &ngOut,
+                                 decayRate.data(),
+                                 intensity.data(),
+                                 intensityErr.data(),
+                                 &nyOut,
+                                 residuals.data(),
+                                 kernel.data(),
+                                 &kernelState,
+                                 &warmState,
+                                 &warmAlpha,
+                                 warmSqrtw.data(),
+                                 &maxTime_s,
+                                 &maxSolutions,
+                                 &truncated);
+
+        statistics->fetchContinStatistics();
+        statistics->m_truncated = (truncated != 0);
+    }
+
+    QElapsedTimer timer;
+    timer.start();
+
+    if (!kernelKey.isEmpty()
+            && kernel.size() == ny*ng
+            && kernelState == 2)
+        insertKernel(kernelKey, kernel);
+
+    /* check for results */
+    if (ngOut <= 0) {
+        statistics->m_time[PHASE_TOTAL] = totalTimer.nsecsElapsed()*1E-6;
+
+        return dcpalsErrorCode::NO_RESULTS;
+    }
+
+    if (warmState != 0 && warmAlpha > 0.0) {
+        warmStart->m_valid = true;
+        warmStart->m_ltDataLen = ltDataLen;
+        warmStart->m_numberOfGridPoints = ng;
+        warmStart->m_minDecayRate = minDecayRate;
+        warmStart->m_maxDecayRate = maxDecayRate;
+        warmStart->m_binWidth_ns = binWidth_ns;
+        warmStart->m_alpha = warmAlpha;
+        warmStart->m_sqrtw = warmSqrtw;
+    }
+
+    for (int i = 0 ; i < ngOut ; ++ i)
+        results->append(decayRate.at(i), intensity.at(i), intensityErr.at(i));
+
+    results->calcSumOfIntensities();
+
+    for (int i = 0 ; i < nyOut ; ++ i)
+        results->appendResiduals(residuals.at(i));
+
+    statistics->m_time[PHASE_RESULTS] = timer.nsecsElapsed()*1E-6;
+    statistics->m_time[PHASE_TOTAL] = totalTimer.nsecsElapsed()*1E-6;
+
+    return dcpalsErrorCode::SUCCESS;
+}
+
+dcpalsErrorCode checkInputParameters(int lifetimeData[],
+                                     int refLifetimeData[],
+                                     int ltDataLen,
+                                     double binWidth_ps,
+                                     double minTauGrid_ps,
+                                     double maxTauGrid_ps,
+                                     int numberOfGridPoints,
+                                     int offsetChannelBkgrdCalc,
+                                     int numberChannelsBkgrdCalc) {
     if (!lifetimeData) {
         return dcpalsErrorCode::NO_LIFETIMEDATA;
     }
@@ -59,7 +546,7 @@ dcpalsErrorCode analyseData(int lifetimeData[],
         return dcpalsErrorCode::DATALENGTH_TOO_SHORT;
     }
 
-    if (ltDataLen > 4000) // limited by CONTIN-PALS
+    if (ltDataLen > 99999) // limited by the format of FORT.2 (NSTEND)
         return dcpalsErrorCode::DATALENGTH_TOO_HIGH;
 
     if (binWidth_ps <= 0.0
@@ -82,7 +569,7 @@ dcpalsErrorCode analyseData(int lifetimeData[],
         return dcpalsErrorCode::BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LOW;
     }
 
-    if (numberOfGridPoints > 100) { // limited by CONTIN-PALS
+    if (numberOfGridPoints > 1000) { // the work arrays grow with the square of the number of grid points
         return dcpalsErrorCode::BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LARGE;
     }
 
@@ -92,40 +579,19 @@ dcpalsErrorCode analyseData(int lifetimeData[],
         return dcpalsErrorCode::BADVALUE_BACKGROUNDCHANNELS;
     }
 
-    /* create CONTIN-PALS compatible files */
-    createAndEditFORT2(minTauGrid_ps,
-                       maxTauGrid_ps,
-                       numberOfGridPoints,
-                       ltDataLen,
-                       binWidth_ps);
-
-    createAndEditFORT50(lifetimeData,
-                        offsetChannelBkgrdCalc,
-                        numberChannelsBkgrdCalc);
-
-    createAndEditFORT51(refLifetimeData,
-                        refMonoDecayLifetime_ps,
-                        offsetChannelBkgrdCalc,
-                        numberChannelsBkgrdCalc);
-
-    createAndEditFORT55(lifetimeData,
-                        ltDataLen);
-
-    createAndEditFORT56(refLifetimeData,
-                        ltDataLen);
-
-
-    /* call CONTIN-PALS */
-    continpalsmainprogram_();
+    return dcpalsErrorCode::SUCCESS;
+}
 
-    /* check for results */
-    if (!prepareResults())
-        return dcpalsErrorCode::NO_RESULTS;
+double calcBackground(int lifetimeData[],
+                      int offsetChannelBkgrdCalc,
+                      int numberChannelsBkgrdCalc) {
+    double bkgrd = 0.0;
+    for (int i = offsetChannelBkgrdCalc ; i < (offsetChannelBkgrdCalc + numberChannelsBkgrdCalc) ; ++ i)
+        bkgrd += lifetimeData[i];
 
-    /* return to initial state */
-    deleteAllFiles();
+    bkgrd /= (double)numberChannelsBkgrdCalc;
 
-    return dcpalsErrorCode::SUCCESS;
+    return bkgrd;
 }
 
 void deleteAllFiles(void) {
@@ -142,6 +608,28 @@ void deleteAllFiles(void) {
     QFile::remove("FORT.11");
 }
 
+qint64 sizeOfFiles(const QStringList& fileNames) {
+    qint64 size = 0;
+
+    for (const QString& fileName : fileNames)
+        size += QFileInfo(fileName).size();
+
+    return size;
+}
+
+void DCONTINPALSStatistics::fetchContinStatistics() {
+    double time_s[5];
+    int counter[5];
+
+    continpalsstatistics_(time_s, counter);
+
+    /* see module CONSTA in CONTINPALS/CONTPALS.FOR */
+    for (int i = 0 ; i < 5 ; ++ i) {
+        m_time[PHASE_INPUT + i] = time_s[i]*1E3;
+        m_counter[COUNTER_ALPHAS + i] = counter[i];
+    }
+}
+
 QString formatLine(const QString& paramName,
                    double value,
                    int len,
@@ -292,11 +780,9 @@ bool createAndEditFORT2(double minTauGrid_ps,
 bool createAndEditFORT50(int lifetimeData[],
                          int offsetChannelBkgrdCalc,
                          int numberChannelsBkgrdCalc) {
-    double bkgrd = 0.0;
-    for (int i = offsetChannelBkgrdCalc ; i < (offsetChannelBkgrdCalc + numberChannelsBkgrdCalc) ; ++ i)
-        bkgrd += lifetimeData[i];
-
-    bkgrd /= (double)numberChannelsBkgrdCalc;
+    const double bkgrd = calcBackground(lifetimeData,
+                                        offsetChannelBkgrdCalc,
+                                        numberChannelsBkgrdCalc);
 
     const int intBkgrd = (int)bkgrd;
 
@@ -343,11 +829,9 @@ bool createAndEditFORT51(int refLifetimeData[],
                          double refMonoDecayLifetime_ps,
                          int offsetChannelBkgrdCalc,
                          int numberChannelsBkgrdCalc) {
-    double bkgrd = 0.0;
-    for (int i = offsetChannelBkgrdCalc ; i < (offsetChannelBkgrdCalc + numberChannelsBkgrdCalc) ; ++ i)
-        bkgrd += refLifetimeData[i];
-
-    bkgrd /= (double)numberChannelsBkgrdCalc;
+    const double bkgrd = calcBackground(refLifetimeData,
+                                        offsetChannelBkgrdCalc,
+                                        numberChannelsBkgrdCalc);
 
     const int intBkgrd = (int)bkgrd;
 
@@ -696,74 +1180,411 @@ bool parseResultsLine2(const QString line,
 }
 
 int gridSize() {
-    if (!m_results)
-        return 0;
+    QMutexLocker locker(&m_globalMutex);
 
-    return m_results->size();
+    return gridSizeByHandle(m_results);
 }
 
 int dataSize() {
-    if (!m_results)
-        return 0;
+    QMutexLocker locker(&m_globalMutex);
 
-    return m_results->residualsSize();
+    return dataSizeByHandle(m_results);
 }
 
 double decayRateAt(int index) {
-    if (!m_results)
+    QMutexLocker locker(&m_globalMutex);
+
+    return decayRateAtByHandle(m_results, index);
+}
+
+double lifetimeAt(int index) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return lifetimeAtByHandle(m_results, index);
+}
+
+double intensityAt(int index) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return intensityAtByHandle(m_results, index);
+}
+
+double intensityErrAt(int index) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return intensityErrAtByHandle(m_results, index);
+}
+
+double residualsAt(int index) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return residualsAtByHandle(m_results, index);
+}
+
+int exportResults(double decayRate[],
+                  double lifetime[],
+                  double intensity[],
+                  double intensityErr[],
+                  int bufferLen) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return exportResultsByHandle(m_results, decayRate, lifetime, intensity, intensityErr, bufferLen);
+}
+
+int exportResiduals(double residuals[],
+                    int bufferLen) {
+    QMutexLocker locker(&m_globalMutex);
+
+    return exportResidualsByHandle(m_results, residuals, bufferLen);
+}
+
+double phaseTime(int phase) {
+    QMutexLocker locker(&m_globalMutex);
+
+    if (phase < 0
+            || phase >= NUMBER_OF_PHASES)
+        return 0.0;
+
+    return m_statistics.m_time[phase];
+}
+
+long long counterValue(int counter) {
+    QMutexLocker locker(&m_globalMutex);
+
+    if (counter < 0
+            || counter >= NUMBER_OF_COUNTERS)
+        return 0;
+
+    return m_statistics.m_counter[counter];
+}
+
+int exportPhaseTimes(double phaseTime[],
+                     int bufferLen) {
+    QMutexLocker locker(&m_globalMutex);
+
+    if (!phaseTime)
+        return 0;
+
+    const int count = qMin(qMax(bufferLen, 0), int(NUMBER_OF_PHASES));
+
+    for (int i = 0 ; i < count ; ++ i)
+        phaseTime[i] = m_statistics.m_time[i];
+
+    return count;
+}
+
+int exportCounters(long long counter[],
+                   int bufferLen) {
+    QMutexLocker locker(&m_globalMutex);
+
+    if (!counter)
+        return 0;
+
+    const int count = qMin(qMax(bufferLen, 0), int(NUMBER_OF_COUNTERS));
+
+    for (int i = 0 ; i < count ; ++ i)
+        counter[i] = m_statistics.m_counter[i];
+
+    return count;
+}
+
+int gridSizeByHandle(dcpalsHandle handle) {
+    if (!handle)
+        return 0;
+
+    return static_cast<DCONTINPALSPrivateData*>(handle)->size();
+}
+
+int dataSizeByHandle(dcpalsHandle handle) {
+    if (!handle)
+        return 0;
+
+    return static_cast<DCONTINPALSPrivateData*>(handle)->residualsSize();
+}
+
+double decayRateAtByHandle(dcpalsHandle handle, int index) {
+    if (!handle)
         return -1.0;
 
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
     if (index < 0
-            || index >= m_results->size())
+            || index >= results->size())
         return 0.0;
 
 
-    return m_results->m_x[index];
+    return results->m_x[index];
 }
 
-double lifetimeAt(int index) {
-    if (!m_results)
+double lifetimeAtByHandle(dcpalsHandle handle, int index) {
+    if (!handle)
         return -1.0;
 
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
     if (index < 0
-            || index >= m_results->size())
+            || index >= results->size())
         return 0.0;
 
-    if (qIsNull(m_results->m_x[index]))
+    if (qIsNull(results->m_x[index]))
         return 0.0;
 
-    return 1.0/(m_results->m_x[index]*1E-3);
+    return 1.0/(results->m_x[index]*1E-3);
 }
 
-double intensityAt(int index) {
-    if (!m_results)
+double intensityAtByHandle(dcpalsHandle handle, int index) {
+    if (!handle)
         return -1.0;
 
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
     if (index < 0
-            || index >= m_results->size())
+            || index >= results->size())
         return 0.0;
 
-    return m_results->m_y[index]/m_results->sumOfIntensities();
+    return results->m_y[index]/results->sumOfIntensities();
 }
 
-double intensityErrAt(int index) {
-    if (!m_results)
+double intensityErrAtByHandle(dcpalsHandle handle, int index) {
+    if (!handle)
         return -1.0;
 
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
     if (index < 0
-            || index >= m_results->size())
+            || index >= results->size())
         return 0.0;
 
-    return m_results->m_yerr[index]/m_results->sumOfIntensities();
+    return results->m_yerr[index]/results->sumOfIntensities();
 }
 
-double residualsAt(int index) {
-    if (!m_results)
+double residualsAtByHandle(dcpalsHandle handle, int index) {
+    if (!handle)
         return 0.0;
 
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
     if (index < 0
-            || index >= m_results->residualsSize())
+            || index >= results->residualsSize())
         return 0.0;
 
-    return m_results->m_residuals[index];
+    return results->m_residuals[index];
+}
+
+int exportResultsByHandle(dcpalsHandle handle,
+                          double decayRate[],
+                          double lifetime[],
+                          double intensity[],
+                          double intensityErr[],
+                          int bufferLen) {
+    if (!handle)
+        return 0;
+
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
+    const int count = qMin(qMax(bufferLen, 0), results->size());
+
+    const double *x    = results->m_x.constData();
+    const double *y    = results->m_y.constData();
+    const double *yerr = results->m_yerr.constData();
+
+    const double sumOfIntensities = results->sumOfIntensities();
+
+    for (int i = 0 ; i < count ; ++ i) {
+        if (decayRate)
+            decayRate[i] = x[i];
+
+        if (lifetime)
+            lifetime[i] = qIsNull(x[i]) ? 0.0 : 1.0/(x[i]*1E-3);
+
+        if (intensity)
+            intensity[i] = y[i]/sumOfIntensities;
+
+        if (intensityErr)
+            intensityErr[i] = yerr[i]/sumOfIntensities;
+    }
+
+    return count;
+}
+
+int exportResidualsByHandle(dcpalsHandle handle,
+                            double residuals[],
+                            int bufferLen) {
+    if (!handle
+            || !residuals)
+        return 0;
+
+    DCONTINPALSPrivateData *results = static_cast<DCONTINPALSPrivateData*>(handle);
+
+    const int count = qMin(qMax(bufferLen, 0), results->residualsSize());
+
+    const double *res = results->m_residuals.constData();
+
+    for (int i = 0 ; i < count ; ++ i)
+        residuals[i] = res[i];
+
+    return count;
+}
+
+double phaseTimeByHandle(dcpalsHandle handle, int phase) {
+    if (!handle
+            || phase < 0
+            || phase >= NUMBER_OF_PHASES)
+        return 0.0;
+
+    return static_cast<DCONTINPALSPrivateData*>(handle)->m_statistics.m_time[phase];
+}
+
+long long counterValueByHandle(dcpalsHandle handle, int counter) {
+    if (!handle
+            || counter < 0
+            || counter >= NUMBER_OF_COUNTERS)
+        return 0;
+
+    return static_cast<DCONTINPALSPrivateData*>(handle)->m_statistics.m_counter[counter];
+}
+
+int exportPhaseTimesByHandle(dcpalsHandle handle,
+                             double phaseTime[],
+                             int bufferLen) {
+    if (!handle
+            || !phaseTime)
+        return 0;
+
+    const DCONTINPALSStatistics& statistics = static_cast<DCONTINPALSPrivateData*>(handle)->m_statistics;
+
+    const int count = qMin(qMax(bufferLen, 0), int(NUMBER_OF_PHASES));
+
+    for (int i = 0 ; i < count ; ++ i)
+        phaseTime[i] = statistics.m_time[i];
+
+    return count;
+}
+
+int exportCountersByHandle(dcpalsHandle handle,
+                           long long counter[],
+                           int bufferLen) {
+    if (!handle
+            || !counter)
+        return 0;
+
+    const DCONTINPALSStatistics& statistics = static_cast<DCONTINPALSPrivateData*>(handle)->m_statistics;
+
+    const int count = qMin(qMax(bufferLen, 0), int(NUMBER_OF_COUNTERS));
+
+    for (int i = 0 ; i < count ; ++ i)
+        counter[i] = statistics.m_counter[i];
+
+    return count;
+}
+
+bool isTruncatedByHandle(dcpalsHandle handle) {
+    if (!handle)
+        return false;
+
+    return static_cast<DCONTINPALSPrivateData*>(handle)->m_statistics.m_truncated;
+}
+
+QByteArray kernelCacheKey(int refLifetimeData[],
+                          int ltDataLen,
+                          double refBkgrd,
+                          double refDecayRate,
+                          double binWidth_ns,
+                          double minDecayRate,
+                          double maxDecayRate,
+                          int numberOfGridPoints) {
+    QCryptographicHash hash(QCryptographicHash::Sha1);
+
+    hash.addData(reinterpret_cast<const char*>(&ltDataLen), sizeof(int));
+    hash.addData(reinterpret_cast<const char*>(refLifetimeData), ltDataLen*sizeof(int));
+    hash.addData(reinterpret_cast<const char*>(&refBkgrd), sizeof(double));
+    hash.addData(reinterpret_cast<const char*>(&refDecayRate), sizeof(double));
+    hash.addData(reinterpret_cast<const char*>(&binWidth_ns), sizeof(double));
+    hash.addData(reinterpret_cast<const char*>(&minDecayRate), sizeof(double));
+    hash.addData(reinterpret_cast<const char*>(&maxDecayRate), sizeof(double));
+    hash.addData(reinterpret_cast<const char*>(&numberOfGridPoints), sizeof(int));
+
+    return hash.result().toHex();
+}
+
+bool isKernelCacheEnabled(void) {
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    return (m_kernelCache.maxCost() > 0
+            || !m_kernelCacheDir.isEmpty());
+}
+
+bool lookupKernel(const QByteArray& key, QVector<float> *kernel) {
+    if (!kernel)
+        return false;
+
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    if (m_kernelCache.contains(key)) {
+        *kernel = *m_kernelCache.object(key);
+
+        return true;
+    }
+
+    if (m_kernelCacheDir.isEmpty())
+        return false;
+
+    QFile file(QDir(m_kernelCacheDir).filePath(QString::fromLatin1(key) % ".kernel"));
+
+    if (!file.open(QIODevice::ReadOnly))
+        return false;
+
+    const QByteArray data = file.readAll();
+
+    if (data.isEmpty()
+            || data.size() % sizeof(float))
+        return false;
+
+    kernel->resize(data.size()/sizeof(float));
+    memcpy(kernel->data(), data.constData(), data.size());
+
+    const int cost = qMax(1, int(data.size()/1024));
+
+    if (cost <= m_kernelCache.maxCost())
+        m_kernelCache.insert(key, new QVector<float>(*kernel), cost);
+
+    return true;
+}
+
+void insertKernel(const QByteArray& key, const QVector<float>& kernel) {
+    QMutexLocker locker(&m_kernelCacheMutex);
+
+    const qint64 size = qint64(kernel.size())*sizeof(float);
+    const int cost = qMax(1, int(size/1024));
+
+    if (cost <= m_kernelCache.maxCost())
+        m_kernelCache.insert(key, new QVector<float>(kernel), cost);
+
+    if (m_kernelCacheDir.isEmpty())
+        return;
+
+    QSaveFile file(QDir(m_kernelCacheDir).filePath(QString::fromLatin1(key) % ".kernel"));
+
+    if (!file.open(QIODevice::WriteOnly))
+        return;
+
+    file.write(reinterpret_cast<const char*>(kernel.constData()), size);
+
+    if (!file.commit())
+        return;
+
+    /* size-bounded: remove the oldest kernels */
+    if (m_kernelCacheDirMaxSize <= 0)
+        return;
+
+    const QFileInfoList files = QDir(m_kernelCacheDir).entryInfoList(QStringList() << "*.kernel", QDir::Files, QDir::Time);
+
+    qint64 totalSize = 0;
+
+    for (const QFileInfo& fileInfo : files) {
+        totalSize += fileInfo.size();
+
+        if (totalSize > m_kernelCacheDirMaxSize)
+            QFile::remove(fileInfo.absoluteFilePath());
+    }
 }
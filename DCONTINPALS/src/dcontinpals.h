@@ -32,16 +32,147 @@
 #include <QVariant>
 #include <QString>
 #include <QStringBuilder>
+#include <QMutex>
+#include <QMutexLocker>
+#include <QCache>
+#include <QByteArray>
+#include <QCryptographicHash>
+#include <QDir>
+#include <QFileInfo>
+#include <QSaveFile>
+#include <QElapsedTimer>
+#include <QStringList>
+#include <QtMath>
 
 #define EOL "\n"
 
 #define DCONTINPALS_VERSION         1
 #define DCONTINPALS_RELEASE_DATE    "11.02.2020"
 
+/* phases of an analysis (see phaseTime()) */
+enum dcpalsPhase : int {
+    PHASE_TOTAL       = 0, // complete call of analyseData(), analyseDataInMemory() or analyseDataByHandle()
+    PHASE_FILES       = 1, // writing the FORT.* input files (analyseData() only)
+    PHASE_INPUT       = 2, // reading the input (INPUT or MEMINP)
+    PHASE_GRID        = 3, // setting up the quadrature grid (SETGRD)
+    PHASE_PRELIMINARY = 4, // preliminary unweighted analysis (ANALYZ), skipped by a warm start
+    PHASE_WEIGHTS     = 5, // calculation of the weights (SETWT)
+    PHASE_FINAL       = 6, // final weighted analysis (ANALYZ)
+    PHASE_RESULTS     = 7, // reading (analyseData()) or copying the results
+    NUMBER_OF_PHASES  = 8
+};
+
+/* counters of an analysis (see counterValue()) */
+enum dcpalsCounter : int {
+    COUNTER_ALPHAS             = 0, // solutions computed, i.e. values of the regularization parameter (alpha) scanned
+    COUNTER_NNLS_ITERATIONS    = 1, // iterations of the non-negative least squares solver (NNLS)
+    COUNTER_LDP_CALLS          = 2, // least distance programming problems solved (LDP)
+    COUNTER_KERNEL_EVALUATIONS = 3, // values of the kernel computed
+    COUNTER_KERNEL_CACHED      = 4, // values of the kernel taken from the kernel cache
+    COUNTER_BYTES_WRITTEN      = 5, // size of the FORT.* input files written (analyseData() only)
+    COUNTER_BYTES_READ         = 6, // size of the FORT.* result files read (analyseData() only)
+    NUMBER_OF_COUNTERS         = 7
+};
+
+/* wall times [ms] of the phases and counters of the last analysis (kept if it fails) */
+class DCONTINPALSStatistics {
+public:
+    DCONTINPALSStatistics() {
+        reset();
+    }
+    ~DCONTINPALSStatistics() {}
+
+    inline void reset() {
+        for (int i = 0 ; i < NUMBER_OF_PHASES ; ++ i)
+            m_time[i] = 0.0;
+
+        for (int i = 0 ; i < NUMBER_OF_COUNTERS ; ++ i)
+            m_counter[i] = 0;
+
+        m_truncated = false;
+    }
+
+    /* see CONTINPALSSTATISTICS (to be called in the thread which ran CONTIN-PALS) */
+    void fetchContinStatistics();
+
+    double m_time[NUMBER_OF_PHASES];
+    qint64 m_counter[NUMBER_OF_COUNTERS];
+
+    bool m_truncated; // the scan of the regularization parameter has been stopped by the budget (see DCONTINPALSBudget)
+};
+
+/* budget of an analysis (see CONTINPALSMEMORYPROGRAM): the scan of the regularization parameter stops as soon as the chosen solution is bracketed and,
+   if the wall time or the number of solutions exceeds the budget, with the best solution so far */
+class DCONTINPALSBudget {
+public:
+    DCONTINPALSBudget()
+        : m_maxTime_ms(0.0),
+          m_maxSolutions(0) {}
+    ~DCONTINPALSBudget() {}
+
+    double m_maxTime_ms; // 0 = no limit
+    int m_maxSolutions;  // 0 = no limit
+};
+
+/* warm start of an analysis from the chosen regularization parameter (alpha) and the weights of the previous one (see CONTINPALSMEMORYPROGRAM) */
+class DCONTINPALSWarmStart {
+public:
+    DCONTINPALSWarmStart()
+        : m_enabled(false),
+          m_acrossGrids(false),
+          m_valid(false),
+          m_ltDataLen(0),
+          m_numberOfGridPoints(0),
+          m_minDecayRate(0.0),
+          m_maxDecayRate(0.0),
+          m_binWidth_ns(0.0),
+          m_alpha(0.0) {}
+    ~DCONTINPALSWarmStart() {}
+
+    inline void reset() {
+        m_valid = false;
+        m_sqrtw.clear();
+    }
+
+    inline bool isApplicable(int ltDataLen, int numberOfGridPoints, double minDecayRate, double maxDecayRate, double binWidth_ns) const {
+        return m_enabled
+                && m_valid
+                && m_ltDataLen == ltDataLen
+                && (m_acrossGrids || (m_numberOfGridPoints == numberOfGridPoints
+                                      && qFuzzyCompare(m_minDecayRate, minDecayRate)
+                                      && qFuzzyCompare(m_maxDecayRate, maxDecayRate)))
+                && qFuzzyCompare(m_binWidth_ns, binWidth_ns)
+                && m_sqrtw.size() == ltDataLen;
+    }
+
+    /* alpha/S(1) for the given grid: the regularizor (second differences) scales with the square of the grid step in log(decay rate) */
+    inline double alpha(int numberOfGridPoints, double minDecayRate, double maxDecayRate) const {
+        const double step = qLn(maxDecayRate/minDecayRate)/(numberOfGridPoints - 1);
+        const double previousStep = qLn(m_maxDecayRate/m_minDecayRate)/(m_numberOfGridPoints - 1);
+
+        return m_alpha*(previousStep*previousStep)/(step*step);
+    }
+
+    bool m_enabled;
+    bool m_acrossGrids; // the weights do not depend on the grid, so they also apply to another grid (e.g. refining the one of the previous analysis)
+    bool m_valid;
+
+    int m_ltDataLen;
+    int m_numberOfGridPoints;
+
+    double m_minDecayRate;
+    double m_maxDecayRate;
+    double m_binWidth_ns;
+
+    double m_alpha; // alpha/S(1)
+    QVector<double> m_sqrtw;
+};
+
 class DCONTINPALSPrivateData {
 public:
     DCONTINPALSPrivateData()
-        : m_sumOfIntensities(0.0)  {}
+        : m_sumOfIntensities(0.0),
+          m_threads(1)  {}
     ~DCONTINPALSPrivateData() {}
 
     inline void clear() {
@@ -49,6 +180,8 @@ public:
         m_y.clear();
         m_yerr.clear();
         m_residuals.clear();
+
+        m_sumOfIntensities = 0.0;
     }
 
     inline int size() const {
@@ -86,6 +219,11 @@ public:
     QVector<double> m_residuals;
 
     double m_sumOfIntensities;
+
+    DCONTINPALSWarmStart m_warmStart; // not affected by clear()
+    DCONTINPALSStatistics m_statistics; // not affected by clear()
+    DCONTINPALSBudget m_budget; // not affected by clear()
+    int m_threads; // see setAnalysisThreadsByHandle(), not affected by clear()
 };
 
 extern "C" {
@@ -109,11 +247,41 @@ extern "C" {
         DATALENGTH_TOO_HIGH                    = -7,
         DATALENGTH_TOO_SHORT                   = -8,
         BINWIDTH_TOO_SHORT                     = -9,
-        NO_RESULTS                             = -10
+        NO_RESULTS                             = -10,
+        INVALID_HANDLE                         = -11
     };
 
+    /* opaque analysis handle: see createHandle() */
+    typedef void* dcpalsHandle;
+
     /* accessing FORTRAN functions */
     extern void continpalsmainprogram_(void);
+    extern void continpalssetsize_(int *ny, int *ng);
+    extern void continpalssetthreads_(int *threads);
+    extern void continpalsmemoryprogram_(int *ny,
+                                         double *y,
+                                         double *yref,
+                                         int *ng,
+                                         double *minDecayRate,
+                                         double *maxDecayRate,
+                                         double *binWidth_ns,
+                                         double *refDecayRate,
+                                         double bkgrd[2],
+                                         int *ngOut,
+                                         double *decayRateOut,
+                                         double *intensityOut,
+                                         double *intensityErrOut,
+                                         int *nyOut,
+                                         double *residualsOut,
+                                         float *kernel,
+                                         int *kernelState,
+                                         int *warmState,
+                                         double *warmAlpha,
+                                         double *warmSqrtw,
+                                         double *maxTime_s,
+                                         int *maxSolutions,
+                                         int *truncated);
+    extern void continpalsstatistics_(double time_s[5], int counter[5]);
 
     bool DCONTINPALSSHARED_EXPORT prepareResults(void);
 
@@ -129,6 +297,20 @@ extern "C" {
                                                          int offsetChannelBkgrdCalc,
                                                          int numberChannelsBkgrdCalc);
 
+    /* same as analyseData() but without any file I/O: the data are passed directly to CONTIN-PALS */
+    dcpalsErrorCode DCONTINPALSSHARED_EXPORT analyseDataInMemory(int lifetimeData[],
+                                                                 int refLifetimeData[],
+                                                                 int ltDataLen,
+                                                                 double refMonoDecayLifetime_ps,
+                                                                 double binWidth_ps,
+                                                                 double minTauGrid_ps,
+                                                                 double maxTauGrid_ps,
+                                                                 int numberOfGridPoints,
+                                                                 int offsetChannelBkgrdCalc,
+                                                                 int numberChannelsBkgrdCalc);
+
+    /* results of the last analysis of analyseData() or analyseDataInMemory(): each call is serialized with the analyses, but the results may be
+       replaced by an analysis of another thread between two calls (use the ByHandle API for concurrent analyses) */
     int    DCONTINPALSSHARED_EXPORT gridSize(void);
     double DCONTINPALSSHARED_EXPORT decayRateAt(int index);    // lambda [1/ns]
     double DCONTINPALSSHARED_EXPORT lifetimeAt(int index);     // tau    [ps]
@@ -137,8 +319,144 @@ extern "C" {
 
     int    DCONTINPALSSHARED_EXPORT dataSize(void);
     double DCONTINPALSSHARED_EXPORT residualsAt(int index);    // [sigma]
+
+    /* bulk export: fill caller-provided buffers of length 'bufferLen' (any of the buffers might be NULL) and return the number of values written per buffer */
+    int    DCONTINPALSSHARED_EXPORT exportResults(double decayRate[],    // lambda [1/ns]
+                                                  double lifetime[],     // tau    [ps]
+                                                  double intensity[],    // 0 .. 1 [a.u.]
+                                                  double intensityErr[], // 0 .. 1 [a.u.]
+                                                  int bufferLen);
+    int    DCONTINPALSSHARED_EXPORT exportResiduals(double residuals[], // [sigma]
+                                                    int bufferLen);
+
+    /* cache of kernel matrices: runs with the same reference spectrum (and background), mono-decay lifetime, bin width and grid skip the construction of the kernel.
+       The kernels are kept in memory (default: 64 MB, 0 = disabled) and optionally on disk (NULL = disabled), where the oldest files are removed if 'maxSize_MB' is exceeded */
+    void DCONTINPALSSHARED_EXPORT setKernelCacheSize(int maxSize_MB);
+    void DCONTINPALSSHARED_EXPORT setKernelCacheDirectory(const char *path, int maxSize_MB);
+    void DCONTINPALSSHARED_EXPORT clearKernelCache(void); // in memory only
+
+    /* warm start (default: disabled) for series of similar spectra analysed one after another with the same data length, bin width and grid:
+       the regularization parameter chosen for the previous spectrum only narrows the scan of the next one and its fit provides the weights,
+       so that the preliminary unweighted analysis is skipped. The results differ slightly from those of a complete analysis.
+       Applies to analyseDataInMemory() or to analyseDataByHandle() of the given handle, respectively */
+    void DCONTINPALSSHARED_EXPORT setWarmStart(bool enabled);
+    void DCONTINPALSSHARED_EXPORT resetWarmStart(void); // e.g. when a new series starts
+
+    /* warm start of an analysis of the same spectrum on another grid, e.g. on a grid refined around the peaks found on a coarse one (default: disabled).
+       If the regularization parameter of the previous grid does not apply to the new one, the complete analysis is done */
+    void DCONTINPALSSHARED_EXPORT setWarmStartAcrossGrids(bool enabled);
+
+    /* budget of the scan of the regularization parameter (default: none, 0 = no limit): the scan stops as soon as the chosen solution is bracketed and,
+       if the wall time [ms] or the number of solutions computed exceeds the budget, with the best solution so far. isTruncated() tells whether the
+       last analysis has been stopped by the budget. Applies to analyseDataInMemory() or to analyseDataByHandle() of the given handle, respectively */
+    void DCONTINPALSSHARED_EXPORT setAnalysisBudget(double maxTime_ms, int maxSolutions);
+    bool DCONTINPALSSHARED_EXPORT isTruncated(void);
+
+    /* number of threads solving the candidates of the regularization parameter of one analysis concurrently (default: 1, requires -fopenmp).
+       The choice of the solution is still made in the order of the scan, i.e. the results do not depend on the number of threads.
+       Applies to analyseData() and analyseDataInMemory() or to analyseDataByHandle() of the given handle, respectively */
+    void DCONTINPALSSHARED_EXPORT setAnalysisThreads(int threads);
+
+    /* wall time [ms] of the given phase (see dcpalsPhase) and value of the given counter (see dcpalsCounter) of the last analysis, which are kept
+       if it fails (0 for an invalid phase or counter). The bulk exports fill caller-provided buffers and return the number of values written */
+    double    DCONTINPALSSHARED_EXPORT phaseTime(int phase);
+    long long DCONTINPALSSHARED_EXPORT counterValue(int counter);
+    int       DCONTINPALSSHARED_EXPORT exportPhaseTimes(double phaseTime[], int bufferLen);
+    int       DCONTINPALSSHARED_EXPORT exportCounters(long long counter[], int bufferLen);
+
+    /* reentrant API: each handle keeps its own results, i.e. analyses on different handles can be run concurrently from multiple threads
+       (requires CONTIN-PALS to be built with -fopenmp, otherwise the analyses are serialized) */
+    dcpalsHandle    DCONTINPALSSHARED_EXPORT createHandle(void);
+    void            DCONTINPALSSHARED_EXPORT destroyHandle(dcpalsHandle handle);
+
+    void            DCONTINPALSSHARED_EXPORT setWarmStartByHandle(dcpalsHandle handle, bool enabled);
+    void            DCONTINPALSSHARED_EXPORT resetWarmStartByHandle(dcpalsHandle handle);
+    void            DCONTINPALSSHARED_EXPORT setWarmStartAcrossGridsByHandle(dcpalsHandle handle, bool enabled);
+    void            DCONTINPALSSHARED_EXPORT setAnalysisBudgetByHandle(dcpalsHandle handle, double maxTime_ms, int maxSolutions);
+    void            DCONTINPALSSHARED_EXPORT setAnalysisThreadsByHandle(dcpalsHandle handle, int threads);
+
+    dcpalsErrorCode DCONTINPALSSHARED_EXPORT analyseDataByHandle(dcpalsHandle handle,
+                                                                 int lifetimeData[],
+                                                                 int refLifetimeData[],
+                                                                 int ltDataLen,
+                                                                 double refMonoDecayLifetime_ps,
+                                                                 double binWidth_ps,
+                                                                 double minTauGrid_ps,
+                                                                 double maxTauGrid_ps,
+                                                                 int numberOfGridPoints,
+                                                                 int offsetChannelBkgrdCalc,
+                                                                 int numberChannelsBkgrdCalc);
+
+    int    DCONTINPALSSHARED_EXPORT gridSizeByHandle(dcpalsHandle handle);
+    double DCONTINPALSSHARED_EXPORT decayRateAtByHandle(dcpalsHandle handle, int index);    // lambda [1/ns]
+    double DCONTINPALSSHARED_EXPORT lifetimeAtByHandle(dcpalsHandle handle, int index);     // tau    [ps]
+    double DCONTINPALSSHARED_EXPORT intensityAtByHandle(dcpalsHandle handle, int index);    // 0 .. 1 [a.u.]
+    double DCONTINPALSSHARED_EXPORT intensityErrAtByHandle(dcpalsHandle handle, int index); // 0 .. 1 [a.u.]
+
+    int    DCONTINPALSSHARED_EXPORT dataSizeByHandle(dcpalsHandle handle);
+    double DCONTINPALSSHARED_EXPORT residualsAtByHandle(dcpalsHandle handle, int index);    // [sigma]
+
+    int    DCONTINPALSSHARED_EXPORT exportResultsByHandle(dcpalsHandle handle,
+                                                          double decayRate[],    // lambda [1/ns]
+                                                          double lifetime[],     // tau    [ps]
+                                                          double intensity[],    // 0 .. 1 [a.u.]
+                                                          double intensityErr[], // 0 .. 1 [a.u.]
+                                                          int bufferLen);
+    int    DCONTINPALSSHARED_EXPORT exportResidualsByHandle(dcpalsHandle handle,
+                                                            double residuals[], // [sigma]
+                                                            int bufferLen);
+
+    double    DCONTINPALSSHARED_EXPORT phaseTimeByHandle(dcpalsHandle handle, int phase);
+    long long DCONTINPALSSHARED_EXPORT counterValueByHandle(dcpalsHandle handle, int counter);
+    int       DCONTINPALSSHARED_EXPORT exportPhaseTimesByHandle(dcpalsHandle handle, double phaseTime[], int bufferLen);
+    int       DCONTINPALSSHARED_EXPORT exportCountersByHandle(dcpalsHandle handle, long long counter[], int bufferLen);
+    bool      DCONTINPALSSHARED_EXPORT isTruncatedByHandle(dcpalsHandle handle);
 }
 
+dcpalsErrorCode runContinPALSInMemory(DCONTINPALSPrivateData *results,
+                                      int lifetimeData[],
+                                      int refLifetimeData[],
+                                      int ltDataLen,
+                                      double refMonoDecayLifetime_ps,
+                                      double binWidth_ps,
+                                      double minTauGrid_ps,
+                                      double maxTauGrid_ps,
+                                      int numberOfGridPoints,
+                                      int offsetChannelBkgrdCalc,
+                                      int numberChannelsBkgrdCalc,
+                                      DCONTINPALSWarmStart *warmStart,
+                                      const DCONTINPALSBudget *budget,
+                                      int threads,
+                                      DCONTINPALSStatistics *statistics);
+
+dcpalsErrorCode checkInputParameters(int lifetimeData[],
+                                     int refLifetimeData[],
+                                     int ltDataLen,
+                                     double binWidth_ps,
+                                     double minTauGrid_ps,
+                                     double maxTauGrid_ps,
+                                     int numberOfGridPoints,
+                                     int offsetChannelBkgrdCalc,
+                                     int numberChannelsBkgrdCalc);
+
+double calcBackground(int lifetimeData[],
+                      int offsetChannelBkgrdCalc,
+                      int numberChannelsBkgrdCalc);
+
+/* kernel cache */
+QByteArray kernelCacheKey(int refLifetimeData[],
+                          int ltDataLen,
+                          double refBkgrd,
+                          double refDecayRate,
+                          double binWidth_ns,
+                          double minDecayRate,
+                          double maxDecayRate,
+                          int numberOfGridPoints);
+
+bool isKernelCacheEnabled(void);
+bool lookupKernel(const QByteArray& key, QVector<float> *kernel);
+void insertKernel(const QByteArray& key, const QVector<float>& kernel);
+
 /* fort.2 */
 bool createAndEditFORT2(double minTauGrid_ps,
                         double maxTauGrid_ps,
@@ -181,4 +499,7 @@ bool parseResultsLine2(const QString line,
 
 void deleteAllFiles(void);
 
+/* total size of the given files [bytes] */
+qint64 sizeOfFiles(const QStringList& fileNames);
+
 #endif // DCONTINPALS_H
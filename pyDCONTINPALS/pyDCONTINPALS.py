@@ -23,16 +23,33 @@ VERSION_HANDSHAKE = 1 # v1.0x
 #**
 #*************************************************************************************************
 
-import ctypes
-from ctypes import cdll
+# analysis of a single lifetime spectrum. The steps of the script are provided as functions taking their parameters explicitly (see
+# defaultParameters()), so that they can be used by other modules and (worker) processes:
+#
+#   parameters        = defaultParameters()
+#   specData, refData = loadData(parameters)
+#   prepared          = preprocess(specData, refData, parameters)
+#   init(parameters)
+#   result            = analyse(prepared, parameters)
+#   peaks             = postProcess(result)
+#
+# the user input (pyDCONTINPALSInput.py), matplotlib and the spectrum simulator are imported on first use only. The engine is set up once per
+# process and parameters by init() (called by analyse() if required), so that analysing further spectra does not repeat its set-up.
+
 from pathlib import Path
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.optimize import curve_fit
-from scipy import interpolate
 
-import pyDCONTINPALSSpecSimulator as specSimulator
-import pyDCONTINPALSInput as userInput
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSLoader as loader
+import pyDCONTINPALSPreprocessing as preprocessing
+import pyDCONTINPALSPeaks as peakAnalysis
+
+# components of the simulated spectrum of the demo mode
+DEMO_LIFETIMES     = [180.0, 400.0, 1600.0]
+DEMO_CONTRIBUTIONS = [0.30,  0.50, 0.20]
+
+# parameters and library the engine is set up for (see init())
+__engineSetup = None
 
 def __information__():
     print("#********************* pyDCONTINPALS 1.03 (25.08.2022) *********************")
@@ -68,307 +85,226 @@ def __licence__():
 def gaussian(x=[],amplitude=1.,loc=0.,scale=1.):
     return amplitude*np.exp(-0.5*((x-loc)/scale)**2)
     
+# local maxima with a prominence of at least 1% of the max. intensity (see pyDCONTINPALSPeaks.py)
 def detectPeaks(x=[],y=[]):
-    peak_list = []
-    peak_list_y = []
+    peaks = peakAnalysis.findPeaks(y)
     
-    der_1st = []
-    for i in range(0,len(y)-1):
-        der_1st.append((y[i+1]-y[i])/(x[i+1]-x[i]))
-        
-    #plt.plot(der_1st,'ro')
-    #plt.show()
-    
-    for i in range(0,len(der_1st)-1):
-        p1=der_1st[i]   
-        p2=der_1st[i+1]
-        
-        if np.abs(p1-p2)<=1e-5:
-            continue
-            
-        if (p1 > 0 and p2 < 0) or (p2 > 0 and p1 < 0):
-            peak_list.append(x[i+1])
-            peak_list_y.append(y[i+1])
-                
-    return peak_list,peak_list_y
+    return list(np.asarray(x)[peaks]),list(np.asarray(y)[peaks])
     
+# simultaneous fit of a Gaussian at each peak found by detectPeaks() (see pyDCONTINPALSPeaks.py)
 def multiPeakFit(x=[],y=[]):
-    peak_list_x,peak_list_y = detectPeaks(x,y)
+    result = peakAnalysis.fitPeaks(x,y)
     
-    results = []
-    results_uncertainties = []
-    results_curve = []
-    results_area = []
-    
-    for i in range(0,len(peak_list_x)):
-        init_vals = [peak_list_y[i],peak_list_x[i],50.]
-        
-        best_vals,covar = curve_fit(gaussian,x,y,p0=init_vals)
-        
-        results.append(best_vals)
-        results_uncertainties.append(np.sqrt(np.diag(covar)))
-        results_curve.append(gaussian(x,amplitude=best_vals[0],loc=best_vals[1],scale=best_vals[2]))
-        results_area.append(sum(gaussian(x,amplitude=best_vals[0],loc=best_vals[1],scale=best_vals[2])))
+    results = list(result['parameters'])
+    results_uncertainties = list(result['uncertainties'])
+    results_curve = list(result['curves'])
+    results_area = list(result['areas'])
             
     return results,results_uncertainties,results_curve,results_area
 
-if __name__ == '__main__':
-    __information__()
-    
-    # (1) check for the currently required version
-    __dllPtr = cdll.LoadLibrary('dcontinpals.dll')
-    
-    if not (__dllPtr.version() == VERSION_HANDSHAKE):
-        print("version misfit: dcontinpals.dll (v{0}) vs. pyDCONTINPALS (v{1})".format(__dllPtr.version(), VERSION_HANDSHAKE))
-        exit();
-        
-    monoDecayTau   = userInput.__tau_monoDecaySpec_in_ps
-    binWidth_in_ps = userInput.__channelResolutionInPs
-    tauGrid_in_ps  = [userInput.__gridTau_start,userInput.__gridTau_stop]
-    gridPoints     = userInput.__gridPoints
-    binFac         = userInput.__binFactor
-        
-    # running demo mode ?
-    if userInput.__demoMode:
-        numberOfBins = userInput.__bkgrd_startIndex + userInput.__bkgrd_count + 10 # set to the maximum for demonstration purposes
-        
-        charactLifetimes_in_ps  = [180.0, 400.0, 1600.0]
-        contributionOfLifetimes = [0.30,  0.50, 0.20]
-        
-        specdata_sample = specSimulator.generateCompleteLTSpectrum(numberOfComponents=len(charactLifetimes_in_ps),
-                                                                    binWidth_in_ps=binWidth_in_ps, 
-                                                                    integralCounts=5000000, 
-                                                                    constBkgrdCounts=5, 
-                                                                    numberOfBins=numberOfBins, 
-                                                                    charactLifetimes_in_ps=charactLifetimes_in_ps, 
-                                                                    contributionOfLifetimes=contributionOfLifetimes,
-                                                                    irf_tZero_in_ps=userInput.__t_zero*userInput.__channelResolutionInPs,
-                                                                    irf_fwhm_in_ps=230.0,
-                                                                    noise=True,
-                                                                    noiseLevel=1.0)
-        
-        specdata_ref = specSimulator.generateCompleteLTSpectrum(numberOfComponents=1,
-                                                                    binWidth_in_ps=binWidth_in_ps, 
-                                                                    integralCounts=5000000, 
-                                                                    constBkgrdCounts=5, 
-                                                                    numberOfBins=numberOfBins, 
-                                                                    charactLifetimes_in_ps=[userInput.__tau_monoDecaySpec_in_ps], 
-                                                                    contributionOfLifetimes=[1.],
-                                                                    irf_tZero_in_ps=userInput.__t_zero*userInput.__channelResolutionInPs,
-                                                                    irf_fwhm_in_ps=230.0,
-                                                                    noise=True,
-                                                                    noiseLevel=1.0)
+# parameters of the analysis given by the user input (pyDCONTINPALSInput.py): the settings of pyDCONTINPALSBatch.defaultSettings() and
+# the data files, the engine and the figures of the script
+def defaultParameters():
+    import pyDCONTINPALSInput as userInput
+    
+    parameters = batch.defaultSettings()
+    
+    parameters.update({'demoMode'    : userInput.__demoMode,
+                       'filePathSpec': userInput.__filePathSpec,
+                       'specIndex'   : userInput.__specIndex,
+                       'filePathRef' : userInput.__filePathRefOrIRFSpec,
+                       'engine'      : userInput.__engine,
+                       'headless'    : userInput.__headless,
+                       'figureDir'   : userInput.__figureDir,
+                       'figureFormat': userInput.__figureFormat})
+    
+    return parameters
+
+# simulated sample and reference spectrum (see DEMO_LIFETIMES)
+def demoData(parameters):
+    import pyDCONTINPALSSpecSimulator as specSimulator
+    
+    numberOfBins = parameters['bkgrdStartIndex'] + parameters['bkgrdCount'] + 10 # set to the maximum for demonstration purposes
+    
+    specdata_sample = specSimulator.generateCompleteLTSpectrum(numberOfComponents=len(DEMO_LIFETIMES),
+                                                                binWidth_in_ps=parameters['channelResolutionInPs'], 
+                                                                integralCounts=5000000, 
+                                                                constBkgrdCounts=5, 
+                                                                numberOfBins=numberOfBins, 
+                                                                charactLifetimes_in_ps=DEMO_LIFETIMES, 
+                                                                contributionOfLifetimes=DEMO_CONTRIBUTIONS,
+                                                                irf_tZero_in_ps=parameters['tZero']*parameters['channelResolutionInPs'],
+                                                                irf_fwhm_in_ps=230.0,
+                                                                noise=True,
+                                                                noiseLevel=1.0)
+    
+    specdata_ref = specSimulator.generateCompleteLTSpectrum(numberOfComponents=1,
+                                                             binWidth_in_ps=parameters['channelResolutionInPs'], 
+                                                             integralCounts=5000000, 
+                                                             constBkgrdCounts=5, 
+                                                             numberOfBins=numberOfBins, 
+                                                             charactLifetimes_in_ps=[parameters['tauMonoDecayInPs']], 
+                                                             contributionOfLifetimes=[1.],
+                                                             irf_tZero_in_ps=parameters['tZero']*parameters['channelResolutionInPs'],
+                                                             irf_fwhm_in_ps=230.0,
+                                                             noise=True,
+                                                             noiseLevel=1.0)
+    
+    return specdata_sample,specdata_ref
+
+# sample and reference spectrum (or the Gaussian IRF) of the given parameters (see defaultParameters())
+def loadData(parameters):
+    if parameters['demoMode']:
+        specdata_sample,specdata_ref = demoData(parameters)
     else:
-        specdata_sample = np.loadtxt(userInput.__filePathSpec, delimiter=userInput.__specDataDelimiter, skiprows=userInput.__skipRows, unpack=True, dtype='float')
+        binaryFormat = batch.binaryFormat(parameters)
+        
+        specdata_sample = loader.loadSpectrum((parameters['filePathSpec'], parameters['specIndex']), parameters['specDataDelimiter'], parameters['skipRows'], binaryFormat)
         
-        if userInput.__usingRefSpectrum:
-            specdata_ref = np.loadtxt(userInput.__filePathRefOrIRFSpec, delimiter=userInput.__refDataDelimiter, skiprows=userInput.__skipRows, unpack=True, dtype='float')
+        if parameters['usingRefSpectrum']:
+            specdata_ref = loader.loadSpectrum(parameters['filePathRef'], parameters['refDataDelimiter'], parameters['skipRows'], binaryFormat)
         else:
             specdata_ref = np.zeros(len(specdata_sample))
         
-    spec_rebinned = np.zeros(int(np.ceil(len(specdata_sample)/binFac)))
-    
-    i_bin = 0
-    sum_bins = 0.
-    for i in range(0,len(specdata_sample)):
-        sum_bins += specdata_sample[i]
-        if not i%binFac:
-            spec_rebinned[i_bin] = sum_bins
-            i_bin += 1
-            sum_bins = 0.
-            
-    specdata_sample = spec_rebinned
-    
-    if not userInput.__usingRefSpectrum:
-        for i in range(len(specdata_ref)):
-            t = (i-userInput.__t_zero)*binWidth_in_ps
-            
-            a = 0
-            for ii in range(len(userInput.__irf_fwhm)):
-                a += userInput.__irf_intensity[ii]*np.exp(-0.5*((t-userInput.__irf_t0[ii])/(userInput.__irf_fwhm[ii]/2.3548))**2)
-                
-            specdata_ref[i] = a
+    if not parameters['usingRefSpectrum']:
+        specdata_ref = preprocessing.gaussianIRF(len(specdata_ref), 
+                                                 parameters['tZero'], 
+                                                 parameters['channelResolutionInPs'], 
+                                                 parameters['irfFWHM'], 
+                                                 parameters['irfIntensity'], 
+                                                 parameters['irfT0'])
         
-    irf_rebinned = np.zeros(int(np.ceil(len(specdata_ref)/binFac)))
-    
-    i_bin = 0
-    sum_bins = 0.
-    for i in range(0,len(specdata_ref)):
-        sum_bins += specdata_ref[i]
-        if not i%binFac:
-            irf_rebinned[i_bin] = sum_bins
-            i_bin += 1
-            sum_bins = 0.
-            
-    specdata_ref = irf_rebinned
-    
-    # adjust values to rebinned data ...
-    binWidth_in_ps *= binFac
-    
-    roi_start = int(np.ceil(userInput.__roi_start/binFac))
-    roi_end   = int(np.ceil(userInput.__roi_end/binFac))
-    
-    bkgrd_startIndex = int(np.ceil(userInput.__bkgrd_startIndex/binFac))
-    bkgrd_count      = int(np.ceil(userInput.__bkgrd_count/binFac))
+    return specdata_sample,specdata_ref
+
+# rebinned region of interest of the sample and the reference and the channels of the ROI, the background and t-zero adjusted to the rebinned data
+def preprocess(specData, refData, parameters):
+    binFac = parameters['binFactor']
     
-    bkgrd_startIndex -= roi_start+1
+    specdata_sample = preprocessing.rebin(specData, binFac)
+    specdata_ref    = preprocessing.rebin(refData, binFac)
     
-    t_zero_chn = int(np.ceil(userInput.__t_zero/binFac))
+    spec_data_roi = preprocessing.roi(specdata_sample, parameters['roiStart'], parameters['roiEnd'], binFac)
+    irf_data_roi  = preprocessing.roi(specdata_ref, parameters['roiStart'], parameters['roiEnd'], binFac)
     
-    spec_data_roi = specdata_sample[roi_start:roi_end]
-    irf_data_roi  = specdata_ref[roi_start:roi_end]
+    binWidth_in_ps = parameters['channelResolutionInPs']*binFac
+    numberOfBins   = len(spec_data_roi)
     
-    numberOfBins = len(spec_data_roi)
-        
     # catch general limitations given by CONTIN-PALS
     
-    assert numberOfBins <= 4000 and numberOfBins >= 10 
-    assert gridPoints >= 10 and gridPoints <= 100
+    assert numberOfBins <= 99999 and numberOfBins >= 10 
+    assert len(irf_data_roi) >= numberOfBins
+    assert parameters['gridPoints'] >= 10 and parameters['gridPoints'] <= 1000
     assert binWidth_in_ps >= 10.0
     
-    if not userInput.__usingRefSpectrum:
-        monoDecayTau = 1E-6
+    return {'specData'    : spec_data_roi,
+            'refData'     : irf_data_roi[:numberOfBins],
+            'binWidthInPs': binWidth_in_ps,
+            'roi'         : preprocessing.roiIndices(parameters['roiStart'], parameters['roiEnd'], binFac),
+            'bkgrd'       : preprocessing.backgroundWindow(parameters['bkgrdStartIndex'], parameters['bkgrdCount'], parameters['roiStart'], binFac),
+            'tZeroChannel': int(np.ceil(parameters['tZero']/binFac))}
 
-    # show the data
-    fig, ax = plt.subplots()
+# sets up the engine for the given parameters (see pyDCONTINPALSBatch.initAnalysis()) unless it is already set up for them
+def init(parameters, libraryPath=None):
+    global __engineSetup
     
-    if userInput.__usingRefSpectrum:
-        plt.semilogy(spec_data_roi/sum(spec_data_roi), 'bo', irf_data_roi/sum(irf_data_roi), 'r-')
-    else:
-        plt.semilogy(spec_data_roi/sum(spec_data_roi), 'bo')
-        
-    ax.set_ylabel('area normalized counts [a.u.]')
-    ax.set_xlabel('channels [{} ps]'.format(binWidth_in_ps))
-    plt.show()
+    setup = (repr(sorted(parameters.items())), libraryPath)
     
-    specSamp = (ctypes.c_int*numberOfBins)()
-    specRef  = (ctypes.c_int*numberOfBins)()
+    if setup == __engineSetup:
+        return
     
-    for i in range(numberOfBins):
-        specSamp[i] = int(spec_data_roi[i])
-        specRef[i]  = int(irf_data_roi[i])
+    batch.initAnalysis(None, parameters, libraryPath)
     
-    program          = __dllPtr.analyseData
-    program.restype = ctypes.c_int
+    __engineSetup = setup
     
-    # run CONTIN-PALS
-    result = program(specSamp,
-                     specRef,
-                     ctypes.c_int(numberOfBins),
-                     ctypes.c_double(monoDecayTau),
-                     ctypes.c_double(binWidth_in_ps),
-                     ctypes.c_double(tauGrid_in_ps[0]),
-                     ctypes.c_double(tauGrid_in_ps[1]),
-                     ctypes.c_int(gridPoints),
-                     ctypes.c_int(bkgrd_startIndex),
-                     ctypes.c_int(bkgrd_count))
-    
-    if not result == 1:
-        if result == 0:
-            print("no lifetime data available")
-        elif result == -1:
-            print("no reference data (IRF or mono-decay sepctrum) available")
-        elif result == -2:
-            print("zero (= 0.0 ps) binning detected")
-        elif result == -3:
-            print("grid limits are badly set")
-        elif result == -4:
-            print("number of grid points too low (must be >= 10)")
-        elif result == -5:
-            print("number of grid points too high (must be <= 1000)")
-        elif result == -6:
-            print("indices for background estimation are badly set")
-        elif result == -7:
-            print("data vector too long (must be <= 4000)")
-        elif result == -8:
-            print("data vector too short (must be >= 10)")
-        elif result == -9:
-            print("binning too short (must be >= 10 ps)")
-        elif result == -10:
-            print("no results available")
-            
-        #exit()
+# analysis of the preprocessed data (see preprocess()) by the engine of the given parameters, returning the result of pyDCONTINPALSBatch.analysePrepared()
+def analyse(prepared, parameters, libraryPath=None):
+    init(parameters, libraryPath)
+    
+    return batch.analysePrepared(prepared['specData'], prepared['refData'], parameters)
+
+# Gaussians fitted to the peaks of the lifetime distribution (see pyDCONTINPALSPeaks.fitPeaks(), no peaks if the analysis failed)
+def postProcess(result, peakSettings=None):
+    return peakAnalysis.fitPeaks(result['lifetime'], result['intensity'], peakSettings)
+
+def __showOrRender(figureDir, fileName, function, *args):
+    if figureDir is not None:
+        import pyDCONTINPALSFigures as figures
         
-    m_x    = __dllPtr.lifetimeAt
-    m_y    = __dllPtr.intensityAt
-    m_yerr = __dllPtr.intensityErrAt
-    m_res  = __dllPtr.residualsAt
-    
-    m_x.restype    = ctypes.c_double 
-    m_y.restype    = ctypes.c_double 
-    m_yerr.restype = ctypes.c_double 
-    m_res.restype  = ctypes.c_double 
+        figures.renderAsync(function, *args, fileName=figureDir / fileName)
+    else:
+        import matplotlib.pyplot as plt
         
-    x    = np.zeros(gridPoints)
-    y    = np.zeros(gridPoints)
-    yerr = np.zeros(gridPoints)
-    
-    res  = np.zeros(numberOfBins)
+        function(*args, figure=plt.figure())
+        plt.show()
+
+def main(parameters=None, libraryPath=None):
+    __information__()
     
-    # visualize results
-    for i in range(0, gridPoints):
-        x[i]    = m_x(ctypes.c_int(i))
-        y[i]    = m_y(ctypes.c_int(i))
-        yerr[i] = m_yerr(ctypes.c_int(i))
+    if parameters is None:
+        parameters = defaultParameters()
         
-    # fit results to retrieve information ...
-    results,uncertainties,fitData,intensities = multiPeakFit(x,y)    
+    specData,refData = loadData(parameters)
+    
+    prepared = preprocess(specData, refData, parameters)
     
-    for i in range(0, numberOfBins):
-        res[i]  = m_res(ctypes.c_int(i))
+    binWidth_in_ps = prepared['binWidthInPs']
+    
+    # running headless: the figures are rendered into image files in the background while the analysis goes on ...
+    figureDir = None
+    
+    if parameters['headless'] and parameters['figureDir']:
+        figureDir = Path(parameters['figureDir'])
+        figureDir.mkdir(parents=True, exist_ok=True)
         
-    fig, ax = plt.subplots()
-    plt.errorbar(x,y,yerr=yerr,marker='s',mfc='red',mec='blue', ms=2, mew=4,label="CONTIN-PALS results")
+    figureFormat = parameters['figureFormat']
     
-    for i in range(0,len(fitData)):
-        plt.plot(x,fitData[i],'r--',lw=1,label='Gaussian fit at {} ps'.format(results[i][1]))
+    # show the data (... otherwise they are shown)
+    if figureDir is not None or not parameters['headless']:
+        import pyDCONTINPALSFigures as figures
         
-        x_v = [results[i][1],results[i][1]]
-        y_v = [0,results[i][0]]
+        __showOrRender(figureDir, 'data.{}'.format(figureFormat), figures.plotData, prepared['specData'], prepared['refData'] if parameters['usingRefSpectrum'] else None, binWidth_in_ps)
+    
+    # run CONTIN-PALS
+    result = analyse(prepared, parameters, libraryPath)
+    
+    if not result['errorCode'] == batch.SUCCESS:
+        print(result['errorString'])
         
-        plt.plot(x_v,y_v,'r-',lw=2)
+    # fit results to retrieve information ...
+    peaks = postProcess(result)
+    
+    results       = peaks['parameters']
+    uncertainties = peaks['uncertainties']
+    intensities   = peaks['areas']
     
     # running demo mode ?
-    if userInput.__demoMode:
-        for xc in charactLifetimes_in_ps:
-            plt.axvline(x=xc, color='k', linestyle='--')
-        
-    ax.set_ylabel('intensity pdf [a.u.]')
-    ax.set_xlabel('characteristic lifetimes [ps]')
-    plt.legend(loc='best')
-    plt.show()
-    
-    fig, ax = plt.subplots()
-    plt.plot(res,'ro',label="error normalized residuals")
-    plt.legend(loc='best')
-    
-    hlines = [-4,-2,0,2,4]    
-    for yc in hlines:
-        plt.axhline(y=yc, color='k', linestyle='--')
-        
-    ax.set_ylabel('confidence level [sigma]')
-    ax.set_xlabel('channels [{} ps]'.format(binWidth_in_ps))
-    ax.set_ylim([-6,6])
-    plt.show()
+    referenceLifetimes = DEMO_LIFETIMES if parameters['demoMode'] else None
+    
+    if figureDir is not None or not parameters['headless']:
+        __showOrRender(figureDir, 'distribution.{}'.format(figureFormat), figures.plotDistribution, result['lifetime'], result['intensity'], result['intensityErr'], results, referenceLifetimes)
+        __showOrRender(figureDir, 'residuals.{}'.format(figureFormat), figures.plotResiduals, result['residuals'], binWidth_in_ps)
+    
+    roi_start, roi_end            = prepared['roi']
+    bkgrd_startIndex, bkgrd_count = prepared['bkgrd']
     
     print('')
-    print('channel-width:  {} ps (= {} x {} ps)'.format(binWidth_in_ps,binFac,userInput.__channelResolutionInPs))
+    print('channel-width:  {} ps (= {} x {} ps)'.format(binWidth_in_ps,parameters['binFactor'],parameters['channelResolutionInPs']))
     print('')
     print('ROI:            [{} : {}]'.format(roi_start,roi_end))
     
-    if not userInput.__usingRefSpectrum:
-        print('t-zero channel: {}'.format(t_zero_chn))
+    if not parameters['usingRefSpectrum']:
+        print('t-zero channel: {}'.format(prepared['tZeroChannel']))
         
     print('background:     [{} : {}]'.format(bkgrd_startIndex,bkgrd_startIndex+bkgrd_count))
     print('')
     
-    if not userInput.__usingRefSpectrum:
-        for i in range(len(userInput.__irf_fwhm)):
-            print('----- fixed Gaussian IRF components ({}/{}) -----'.format(i+1,len(userInput.__irf_fwhm)))
+    if not parameters['usingRefSpectrum']:
+        for i in range(len(parameters['irfFWHM'])):
+            print('----- fixed Gaussian IRF components ({}/{}) -----'.format(i+1,len(parameters['irfFWHM'])))
             print('')
-            print('intensity:  {} %'.format(100.*userInput.__irf_intensity[i]))
-            print('t:          {} ps'.format(userInput.__irf_t0[i]))
-            print('FWHM:       {} ps'.format(userInput.__irf_fwhm[i]))
+            print('intensity:  {} %'.format(100.*parameters['irfIntensity'][i]))
+            print('t:          {} ps'.format(parameters['irfT0'][i]))
+            print('FWHM:       {} ps'.format(parameters['irfFWHM'][i]))
         
         print('')
         
@@ -380,8 +316,13 @@ if __name__ == '__main__':
         print('')
         print('intensity:  {} %'.format(100.*intensities[i]/sum(intensities)))
         print('')
-    
-    
-    
-    
-    
+        
+    # the figures are written as soon as the background process has rendered them
+    if figureDir is not None:
+        for fileName in figures.waitForFigures():
+            print('-> {}'.format(fileName))
+            
+    return result, peaks
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,838 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# batch analysis of series of lifetime spectra (e.g. temperature or ageing series) sharing one reference spectrum:
+#
+#   python pyDCONTINPALSBatch.py <spectra files and/or directories> --ref <reference spectrum> [--output <directory>]
+#
+# the spectra are distributed over a pool of worker processes, each of them loading the dcontinpals library once. Engines analysing stacks of
+# spectra (see pyDCONTINPALSEngine.analyseSpectra()) are given contiguous parts of the series sharing the factorization of the reference.
+#
+# the user input (pyDCONTINPALSInput.py) is only read by defaultSettings() and the library is loaded once per process (see loadLibrary()).
+
+import argparse
+import contextlib
+import ctypes
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from multiprocessing import Pool
+from pathlib import Path
+import numpy as np
+
+import pyDCONTINPALSCache as resultCache
+import pyDCONTINPALSLoader as loader
+import pyDCONTINPALSPeaks as peakAnalysis
+import pyDCONTINPALSPreprocessing as preprocessing
+
+VERSION_HANDSHAKE = 1 # v1.0x
+
+# see 'dcpalsErrorCode' in dcontinpals.h
+ERROR_CODES = { 1: "success",
+                0: "no lifetime data available",
+               -1: "no reference data (IRF or mono-decay sepctrum) available",
+               -2: "zero (= 0.0 ps) binning detected",
+               -3: "grid limits are badly set",
+               -4: "number of grid points too low (must be >= 10)",
+               -5: "number of grid points too high (must be <= 1000)",
+               -6: "indices for background estimation are badly set",
+               -7: "data vector too long (must be <= 99999)",
+               -8: "data vector too short (must be >= 10)",
+               -9: "binning too short (must be >= 10 ps)",
+              -10: "no results available",
+              -11: "invalid handle"}
+
+SUCCESS = 1
+NO_LIFETIMEDATA = 0
+
+# min. number of grid points accepted by the engines (see 'checkInputParameters' in dcontinpals.cpp)
+MIN_GRID_POINTS = 11
+
+# see 'dcpalsPhase' and 'dcpalsCounter' in dcontinpals.h
+PHASES   = ('total', 'files', 'input', 'grid', 'preliminary', 'weights', 'final', 'results')
+COUNTERS = ('alphas', 'nnlsIterations', 'ldpCalls', 'kernelEvaluations', 'kernelCached', 'bytesWritten', 'bytesRead')
+
+# the library loaded by the current (worker) process and the reference shared by all spectra of a batch
+__dllPtr   = None
+__program  = None
+__inMemory = True
+__settings = None
+__refData  = None
+
+# libraries loaded by this process (by path) and the builds of the engines (see engineBuild())
+__libraries = {}
+__builds    = {}
+
+def libraryName():
+    if sys.platform.startswith('win'):
+        return 'dcontinpals.dll'
+
+    return 'libdcontinpals.so'
+
+# the dcontinpals library (loaded once per process and path)
+def loadLibrary(libraryPath=None):
+    if libraryPath is None:
+        libraryPath = Path(__file__).resolve().parent / libraryName()
+
+        if not libraryPath.exists():
+            libraryPath = libraryName()
+
+    libraryPath = str(libraryPath)
+
+    if libraryPath in __libraries:
+        return __libraries[libraryPath]
+
+    dllPtr = ctypes.cdll.LoadLibrary(libraryPath)
+
+    if not (dllPtr.version() == VERSION_HANDSHAKE):
+        raise RuntimeError("version misfit: {0} (v{1}) vs. pyDCONTINPALS (v{2})".format(libraryPath, dllPtr.version(), VERSION_HANDSHAKE))
+
+    dllPtr.lifetimeAt.restype     = ctypes.c_double
+    dllPtr.decayRateAt.restype    = ctypes.c_double
+    dllPtr.intensityAt.restype    = ctypes.c_double
+    dllPtr.intensityErrAt.restype = ctypes.c_double
+    dllPtr.residualsAt.restype    = ctypes.c_double
+
+    # bulk export of the results into numpy arrays (zero-copy)
+    if hasattr(dllPtr, 'exportResults'):
+        c_double_p = np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS')
+
+        dllPtr.exportResults.argtypes   = [c_double_p, c_double_p, c_double_p, c_double_p, ctypes.c_int]
+        dllPtr.exportResiduals.argtypes = [c_double_p, ctypes.c_int]
+
+    # wall times of the phases and counters of the last analysis
+    if hasattr(dllPtr, 'exportPhaseTimes'):
+        dllPtr.exportPhaseTimes.argtypes = [np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS'), ctypes.c_int]
+        dllPtr.exportCounters.argtypes   = [np.ctypeslib.ndpointer(dtype=np.int64, flags='C_CONTIGUOUS'), ctypes.c_int]
+
+    # budget of the scan of the regularization parameter
+    if hasattr(dllPtr, 'setAnalysisBudget'):
+        dllPtr.setAnalysisBudget.argtypes = [ctypes.c_double, ctypes.c_int]
+        dllPtr.isTruncated.restype        = ctypes.c_bool
+
+    # threads solving the candidates of the regularization parameter of one analysis
+    if hasattr(dllPtr, 'setAnalysisThreads'):
+        dllPtr.setAnalysisThreads.argtypes = [ctypes.c_int]
+
+    __libraries[libraryPath] = dllPtr
+
+    return dllPtr
+
+# wall times [ms] of the phases and counters (see PHASES and COUNTERS) of the last analysis of the given engine or None if it does not provide them
+def analysisStatistics(dllPtr):
+    if not hasattr(dllPtr, 'exportPhaseTimes'):
+        return None
+
+    phaseTimes = np.zeros(len(PHASES))
+    counters   = np.zeros(len(COUNTERS), dtype=np.int64)
+
+    dllPtr.exportPhaseTimes(phaseTimes, len(PHASES))
+    dllPtr.exportCounters(counters, len(COUNTERS))
+
+    return {'timeInMs': dict(zip(PHASES, phaseTimes.tolist())),
+            'counters': dict(zip(COUNTERS, counters.tolist()))}
+
+# identity of the build of the given engine: hash of the library file or of pyDCONTINPALSEngine.py and the versions of NumPy and SciPy. The version
+# of the library only changes with its interface (see VERSION_HANDSHAKE), while its results may change with every build.
+def engineBuild(dllPtr):
+    if isinstance(dllPtr, ctypes.CDLL):
+        fileName, extra = dllPtr._name, ''
+    else:
+        import scipy
+
+        fileName, extra = dllPtr.__file__, np.__version__ + scipy.__version__
+
+    if fileName in __builds:
+        return __builds[fileName]
+
+    digest = hashlib.sha1(extra.encode())
+
+    try:
+        with open(fileName, 'rb') as file:
+            for block in iter(lambda: file.read(1048576), b''):
+                digest.update(block)
+    except OSError: # found by the search path of the system only
+        digest.update('{}:{}'.format(fileName, dllPtr.version()).encode())
+
+    __builds[fileName] = digest.hexdigest()[:16]
+
+    return __builds[fileName]
+
+# the dcontinpals library ('library') or its NumPy/SciPy implementation pyDCONTINPALSEngine ('numpy') providing the same functions
+def loadEngine(engine='library', libraryPath=None):
+    if engine == 'numpy':
+        import pyDCONTINPALSEngine as numpyEngine
+
+        return numpyEngine
+
+    return loadLibrary(libraryPath)
+
+def defaultSettings():
+    import pyDCONTINPALSInput as userInput
+
+    return {'roiStart'             : userInput.__roi_start,
+            'roiEnd'               : userInput.__roi_end,
+            'skipRows'             : userInput.__skipRows,
+            'specDataDelimiter'    : userInput.__specDataDelimiter,
+            'refDataDelimiter'     : userInput.__refDataDelimiter,
+            'binaryDataType'       : userInput.__binaryDataType,
+            'binaryChannels'       : userInput.__binaryChannels,
+            'binaryHeaderBytes'    : userInput.__binaryHeaderBytes,
+            'usingRefSpectrum'     : userInput.__usingRefSpectrum,
+            'tauMonoDecayInPs'     : userInput.__tau_monoDecaySpec_in_ps,
+            'tZero'                : userInput.__t_zero,
+            'irfFWHM'              : userInput.__irf_fwhm,
+            'irfIntensity'         : userInput.__irf_intensity,
+            'irfT0'                : userInput.__irf_t0,
+            'gridTauInPs'          : [userInput.__gridTau_start,userInput.__gridTau_stop],
+            'gridPoints'           : userInput.__gridPoints,
+            'channelResolutionInPs': userInput.__channelResolutionInPs,
+            'binFactor'            : userInput.__binFactor,
+            'bkgrdStartIndex'      : userInput.__bkgrd_startIndex,
+            'bkgrdCount'           : userInput.__bkgrd_count,
+            'kernelCacheDir'       : None, # directory of the kernel matrices shared by the worker processes (optional)
+            'kernelCacheSizeInMB'  : 256,
+            'engine'               : 'library', # 'library' (dcontinpals) or 'numpy' (pyDCONTINPALSEngine)
+            'warmStart'            : False, # seed each analysis with the regularization and weights of the previous spectrum of the same worker (similar spectra only)
+            'spectraPerSolve'      : 16,    # spectra analysed at once sharing the factorization of the reference (engines providing analyseSpectra() only)
+            'sharedWeights'        : False, # weights of the summed spectra of each part shared by its spectra (spectra of the same shape only)
+            'adaptiveGrid'         : False, # coarse grid refined around its peaks (see refinedGrid())
+            'coarseGridPoints'     : 30,
+            'timeBudgetInMs'       : 0,     # budget of the scan of the regularization parameter per analysis (0: no limit, see setAnalysisBudget() in dcontinpals.h)
+            'maxSolutions'         : 0,     # max. number of regularization parameters scanned per analysis (0: no limit)
+            'solverThreads'        : 1,     # threads solving the candidates of the regularization parameter of one analysis concurrently (see setAnalysisThreads() in dcontinpals.h)
+            'resultCacheSizeInMB'  : 0,     # results kept in memory by each process (0: disabled, see pyDCONTINPALSCache.py)
+            'resultCacheDir'       : None,  # directory of the results shared by all processes and runs (optional)
+            'resultDirSizeInMB'    : 1024}
+
+# format of raw binary spectrum files (see pyDCONTINPALSLoader.defaultBinaryFormat())
+def binaryFormat(settings):
+    return {'dataType'   : settings['binaryDataType'],
+            'channels'   : settings['binaryChannels'],
+            'headerBytes': settings['binaryHeaderBytes']}
+
+# spectrum given as file, (file, index) of a file of several spectra or data vector (see pyDCONTINPALSLoader.py)
+def loadSpectrum(spectrum, delimiter, skipRows, binaryFormat=None):
+    return loader.loadSpectrum(spectrum, delimiter, skipRows, binaryFormat)
+
+# reference spectrum (or Gaussian IRF) prepared once per batch
+def prepareReference(refSpectrum, numberOfChannels, settings):
+    if settings['usingRefSpectrum']:
+        return loader.loadROI(refSpectrum, settings['roiStart'], settings['roiEnd'], settings['binFactor'], settings['refDataDelimiter'], settings['skipRows'], binaryFormat(settings))
+
+    refData = preprocessing.gaussianIRF(numberOfChannels,
+                                        settings['tZero'],
+                                        settings['channelResolutionInPs'],
+                                        settings['irfFWHM'],
+                                        settings['irfIntensity'],
+                                        settings['irfT0'])
+
+    return preprocessing.roi(preprocessing.rebin(refData, settings['binFactor']), settings['roiStart'], settings['roiEnd'], settings['binFactor'])
+
+def __hasBudget(settings):
+    return settings['timeBudgetInMs'] > 0 or settings['maxSolutions'] > 0
+
+def __initWorker(libraryPath, settings, refData):
+    global __dllPtr, __program, __inMemory, __settings, __refData
+
+    __dllPtr   = loadEngine(settings['engine'], libraryPath)
+    __settings = settings
+    __refData  = refData
+
+    # prefer the in-memory data exchange (otherwise see __fortranFiles())
+    __inMemory = hasattr(__dllPtr, 'analyseDataInMemory')
+
+    if __inMemory:
+        __program = __dllPtr.analyseDataInMemory
+    else:
+        __program = __dllPtr.analyseData
+
+    if isinstance(__dllPtr, ctypes.CDLL):
+        __program.restype = ctypes.c_int
+
+    # the kernel matrix of the shared reference is computed once and read from the directory by all other workers
+    if settings['kernelCacheDir'] and hasattr(__dllPtr, 'setKernelCacheDirectory'):
+        __dllPtr.setKernelCacheDirectory(str(Path(settings['kernelCacheDir']).resolve()).encode(), ctypes.c_int(settings['kernelCacheSizeInMB']))
+
+    if settings['warmStart'] and hasattr(__dllPtr, 'setWarmStart'):
+        __dllPtr.setWarmStart(ctypes.c_bool(True))
+
+    if hasattr(__dllPtr, 'setAnalysisBudget'):
+        __dllPtr.setAnalysisBudget(ctypes.c_double(settings['timeBudgetInMs']), ctypes.c_int(settings['maxSolutions']))
+
+    if hasattr(__dllPtr, 'setAnalysisThreads'):
+        __dllPtr.setAnalysisThreads(ctypes.c_int(settings['solverThreads']))
+
+    if settings['resultCacheSizeInMB'] > 0 or settings['resultCacheDir']:
+        resultCache.configure(settings['resultCacheSizeInMB'], settings['resultCacheDir'], settings['resultDirSizeInMB'], settings['engine'], engineBuild(__dllPtr))
+    else:
+        resultCache.configure(0)
+
+# working directory of the FORT.* files of the library (fixed names) if it does not provide the in-memory data exchange: a directory of its own
+# per analysis, which is removed afterwards, while the working directory of the calling process is restored (relative paths of the user)
+@contextlib.contextmanager
+def __fortranFiles():
+    if __inMemory:
+        yield
+        return
+
+    cwd       = os.getcwd()
+    directory = tempfile.mkdtemp(prefix='dcontinpals_')
+
+    os.chdir(directory)
+
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+        shutil.rmtree(directory, ignore_errors=True)
+
+def __emptyResult(index, name, settings):
+    return {'index'       : index,
+            'name'        : name,
+            'errorCode'   : NO_LIFETIMEDATA,
+            'errorString' : ERROR_CODES[NO_LIFETIMEDATA],
+            'binWidthInPs': settings['channelResolutionInPs']*settings['binFactor'],
+            'lifetime'    : np.zeros(0),
+            'decayRate'   : np.zeros(0),
+            'intensity'   : np.zeros(0),
+            'intensityErr': np.zeros(0),
+            'residuals'   : np.zeros(0),
+            'statistics'  : None,
+            'truncated'   : False,
+            'cached'      : False}
+
+def __analyseSpectrum(task):
+    index, name, spectrum = task[:3]
+
+    # reference of this spectrum only (e.g. bootstrap replicas) or the one shared by the batch
+    refData = task[3] if len(task) > 3 and task[3] is not None else __refData
+
+    settings = __settings
+
+    result = __emptyResult(index, name, settings)
+
+    # only the channels of the region of interest are read
+    try:
+        spec_data_roi = loader.loadROI(spectrum, settings['roiStart'], settings['roiEnd'], settings['binFactor'], settings['specDataDelimiter'], settings['skipRows'], binaryFormat(settings))
+    except (OSError, ValueError, IndexError) as e:
+        result['errorString'] = str(e)
+        return result
+
+    return __analyseROI(result, spec_data_roi, refData, settings)
+
+def __monoDecayTau(settings):
+    return settings['tauMonoDecayInPs'] if settings['usingRefSpectrum'] else 1E-6
+
+# key of the result cache (see pyDCONTINPALSCache.py) of the data and parameters passed to the engine or None if the cache is disabled
+def __cacheKey(specSampBuffer, specRefBuffer, binWidthInPs, bkgrd_startIndex, bkgrd_count, settings):
+    if not resultCache.enabled():
+        return None
+
+    parameters = (__monoDecayTau(settings),
+                  binWidthInPs,
+                  settings['gridTauInPs'][0],
+                  settings['gridTauInPs'][1],
+                  settings['gridPoints'],
+                  bkgrd_startIndex,
+                  bkgrd_count)
+
+    # the scan stops earlier with a budget
+    if __hasBudget(settings):
+        parameters += (settings['timeBudgetInMs'], settings['maxSolutions'])
+
+    return resultCache.resultKey(specSampBuffer, specRefBuffer, parameters)
+
+def __fromCache(result, cacheKey):
+    if cacheKey is None:
+        return False
+
+    cached = resultCache.lookup(cacheKey)
+
+    if cached is None:
+        return False
+
+    result.update(cached)
+
+    result['errorCode']   = SUCCESS
+    result['errorString'] = ERROR_CODES[SUCCESS]
+    result['cached']      = True
+
+    return True
+
+# analysis of the rebinned region of interest of the sample and the reference using the given settings
+def __analyseROI(result, spec_data_roi, irf_data_roi, settings):
+    if settings['adaptiveGrid']:
+        return __analyseAdaptive(result, spec_data_roi, irf_data_roi, settings)
+
+    bkgrd_startIndex, bkgrd_count = preprocessing.backgroundWindow(settings['bkgrdStartIndex'], settings['bkgrdCount'], settings['roiStart'], settings['binFactor'])
+
+    numberOfBins = min(len(spec_data_roi), len(irf_data_roi))
+
+    specSampBuffer = preprocessing.toIntBuffer(spec_data_roi[:numberOfBins])
+    specRefBuffer  = preprocessing.toIntBuffer(irf_data_roi[:numberOfBins])
+
+    specSamp = preprocessing.intPointer(specSampBuffer)
+    specRef  = preprocessing.intPointer(specRefBuffer)
+
+    monoDecayTau = __monoDecayTau(settings)
+
+    # results of identical data and parameters are taken from the cache
+    cacheKey = __cacheKey(specSampBuffer, specRefBuffer, result['binWidthInPs'], bkgrd_startIndex, bkgrd_count, settings)
+
+    if __fromCache(result, cacheKey):
+        return result
+
+    with __fortranFiles():
+        errorCode = __program(specSamp,
+                              specRef,
+                              ctypes.c_int(numberOfBins),
+                              ctypes.c_double(monoDecayTau),
+                              ctypes.c_double(result['binWidthInPs']),
+                              ctypes.c_double(settings['gridTauInPs'][0]),
+                              ctypes.c_double(settings['gridTauInPs'][1]),
+                              ctypes.c_int(settings['gridPoints']),
+                              ctypes.c_int(bkgrd_startIndex),
+                              ctypes.c_int(bkgrd_count))
+
+    result['errorCode']   = errorCode
+    result['errorString'] = ERROR_CODES.get(errorCode, "unknown error")
+    result['statistics']  = analysisStatistics(__dllPtr)
+
+    if hasattr(__dllPtr, 'isTruncated'):
+        result['truncated'] = bool(__dllPtr.isTruncated())
+
+    if not errorCode == SUCCESS:
+        return result
+
+    gridSize = __dllPtr.gridSize()
+    dataSize = __dllPtr.dataSize()
+
+    if hasattr(__dllPtr, 'exportResults'):
+        result['decayRate']    = np.zeros(gridSize)
+        result['lifetime']     = np.zeros(gridSize)
+        result['intensity']    = np.zeros(gridSize)
+        result['intensityErr'] = np.zeros(gridSize)
+        result['residuals']    = np.zeros(dataSize)
+
+        __dllPtr.exportResults(result['decayRate'], result['lifetime'], result['intensity'], result['intensityErr'], gridSize)
+        __dllPtr.exportResiduals(result['residuals'], dataSize)
+    else:
+        result['lifetime']     = np.array([__dllPtr.lifetimeAt(ctypes.c_int(i)) for i in range(gridSize)])
+        result['decayRate']    = np.array([__dllPtr.decayRateAt(ctypes.c_int(i)) for i in range(gridSize)])
+        result['intensity']    = np.array([__dllPtr.intensityAt(ctypes.c_int(i)) for i in range(gridSize)])
+        result['intensityErr'] = np.array([__dllPtr.intensityErrAt(ctypes.c_int(i)) for i in range(gridSize)])
+        result['residuals']    = np.array([__dllPtr.residualsAt(ctypes.c_int(i)) for i in range(dataSize)])
+
+    # results stopped by the time budget depend on the load of the machine and warm started ones on the previous analysis (not on the key)
+    if cacheKey is not None and not result['truncated'] and not settings['warmStart']:
+        resultCache.store(cacheKey, result)
+
+    return result
+
+# refined grid [ps] and its number of points of the adaptive analysis or None: the span of the regions of the coarse distribution with significant
+# intensity ('minIntensity' times its max.) around its peaks (see pyDCONTINPALSPeaks.findPeaks()) plus two grid points on both sides. The grid
+# is equidistant in log(lifetime) (see SETGRD), so the span is sampled with the density of the grid of settings['gridPoints'] over the whole range.
+def refinedGrid(lifetime, intensity, settings, minIntensity=0.01, peakSettings=None):
+    if peakSettings is None:
+        peakSettings = peakAnalysis.defaultPeakSettings()
+
+    order = np.argsort(lifetime)
+
+    lifetime  = np.asarray(lifetime, dtype='float')[order]
+    intensity = np.asarray(intensity, dtype='float')[order]
+
+    peaks = peakAnalysis.findPeaks(intensity, peakSettings['minProminence'], peakSettings['maxPeaks'])
+
+    if not len(peaks):
+        return None
+
+    significant = intensity >= minIntensity*intensity.max()
+
+    # regions of significant intensity containing a peak
+    lower = [peak - np.argmin(significant[peak::-1]) + 1 if not significant[:peak+1].all() else 0 for peak in peaks]
+    upper = [peak + np.argmin(significant[peak:]) - 1 if not significant[peak:].all() else len(intensity) - 1 for peak in peaks]
+
+    first = max(min(lower) - 2, 0)
+    last  = min(max(upper) + 2, len(lifetime) - 1)
+
+    tauStart, tauStop = settings['gridTauInPs']
+
+    density = (settings['gridPoints'] - 1)/np.log(tauStop/tauStart)
+
+    gridPoints = int(np.clip(np.ceil(density*np.log(lifetime[last]/lifetime[first])) + 1, MIN_GRID_POINTS, max(settings['gridPoints'], MIN_GRID_POINTS)))
+
+    return [float(lifetime[first]), float(lifetime[last])], gridPoints
+
+# coarse-to-fine analysis: the spectrum is analysed on a coarse grid of settings['coarseGridPoints'] over the whole range and then on the grid refined
+# around its peaks (see refinedGrid()), which is warm started from the coarse analysis if the library supports it. The dense grid is used if the
+# coarse analysis fails or does not show any peak and if the refined analysis fails.
+def __analyseAdaptive(result, spec_data_roi, irf_data_roi, settings):
+    settings = dict(settings, adaptiveGrid=False)
+
+    # the library keeps the weights and the regularization parameter of the coarse analysis for the refined one
+    warmStart = hasattr(__dllPtr, 'setWarmStartAcrossGrids')
+
+    if warmStart and not settings['warmStart']:
+        __dllPtr.resetWarmStart()
+        __dllPtr.setWarmStart(ctypes.c_bool(True))
+
+    try:
+        coarse = __analyseROI(dict(result), spec_data_roi, irf_data_roi, dict(settings, gridPoints=settings['coarseGridPoints']))
+
+        refined = None
+
+        if coarse['errorCode'] == SUCCESS:
+            refined = refinedGrid(coarse['lifetime'], coarse['intensity'], settings)
+
+        # all but the coarse analysis are warm started by the library (see __analyseROI() for the cache)
+        dense = dict(settings, warmStart=settings['warmStart'] or warmStart)
+
+        if refined is None:
+            return __analyseROI(result, spec_data_roi, irf_data_roi, dense)
+
+        if warmStart:
+            __dllPtr.setWarmStartAcrossGrids(ctypes.c_bool(True))
+
+        __analyseROI(result, spec_data_roi, irf_data_roi, dict(dense, gridTauInPs=refined[0], gridPoints=refined[1]))
+
+        if not result['errorCode'] == SUCCESS:
+            if warmStart:
+                __dllPtr.setWarmStartAcrossGrids(ctypes.c_bool(False))
+
+            return __analyseROI(result, spec_data_roi, irf_data_roi, dense)
+
+        # the refined grid depends on the coarse analysis
+        result['truncated'] = result['truncated'] or coarse['truncated']
+
+        return result
+    finally:
+        if warmStart:
+            __dllPtr.setWarmStartAcrossGrids(ctypes.c_bool(False))
+
+        if warmStart and not settings['warmStart']:
+            __dllPtr.setWarmStart(ctypes.c_bool(False))
+            __dllPtr.resetWarmStart()
+
+# analysis of a contiguous part of the series at once by the engine's analyseSpectra() (see pyDCONTINPALSEngine.py), so that the spectra share
+# the factorization of the reference (and with settings['sharedWeights'] the one of the weighted analysis)
+def __analyseSpectra(tasks):
+    settings = __settings
+
+    bkgrd_startIndex, bkgrd_count = preprocessing.backgroundWindow(settings['bkgrdStartIndex'], settings['bkgrdCount'], settings['roiStart'], settings['binFactor'])
+
+    specRefBuffer = preprocessing.toIntBuffer(__refData)
+
+    results = []
+    stack   = []
+
+    for index, name, spectrum in tasks:
+        result = __emptyResult(index, name, settings)
+
+        results.append(result)
+
+        try:
+            spec_data_roi = loader.loadROI(spectrum, settings['roiStart'], settings['roiEnd'], settings['binFactor'], settings['specDataDelimiter'], settings['skipRows'], binaryFormat(settings))
+        except (OSError, ValueError, IndexError) as e:
+            result['errorString'] = str(e)
+            continue
+
+        # spectra shorter than the reference are analysed on their own
+        if len(spec_data_roi) < len(__refData):
+            __analyseROI(result, spec_data_roi, __refData, settings)
+            continue
+
+        specSampBuffer = preprocessing.toIntBuffer(spec_data_roi[:len(__refData)])
+
+        # the results with shared weights depend on all spectra of the part
+        cacheKey = None if settings['sharedWeights'] else __cacheKey(specSampBuffer, specRefBuffer, result['binWidthInPs'], bkgrd_startIndex, bkgrd_count, settings)
+
+        if not __fromCache(result, cacheKey):
+            stack.append((result, specSampBuffer, cacheKey))
+
+    if not stack:
+        return results
+
+    analysed = __dllPtr.analyseSpectra(np.array([specSampBuffer for result, specSampBuffer, cacheKey in stack]),
+                                       specRefBuffer,
+                                       __monoDecayTau(settings),
+                                       settings['channelResolutionInPs']*settings['binFactor'],
+                                       settings['gridTauInPs'][0],
+                                       settings['gridTauInPs'][1],
+                                       settings['gridPoints'],
+                                       bkgrd_startIndex,
+                                       bkgrd_count,
+                                       sharedWeights=settings['sharedWeights'])
+
+    for (result, specSampBuffer, cacheKey), spectrumResult in zip(stack, analysed):
+        result['errorCode']   = spectrumResult['errorCode']
+        result['errorString'] = ERROR_CODES.get(spectrumResult['errorCode'], "unknown error")
+
+        if not result['errorCode'] == SUCCESS:
+            continue
+
+        for name in ('decayRate', 'lifetime', 'intensity', 'intensityErr', 'residuals'):
+            result[name] = spectrumResult[name]
+
+        result['truncated'] = spectrumResult['truncated']
+
+        # results stopped by the time budget depend on the load of the machine
+        if cacheKey is not None and not result['truncated']:
+            resultCache.store(cacheKey, result)
+
+    return results
+
+# engines analysing stacks of spectra (see __analyseSpectra()), which are loaded by the worker processes, i.e. without loading the library here
+def __solvesStacks(settings):
+    return settings['engine'] == 'numpy' and not (settings['warmStart'] or settings['adaptiveGrid']) and settings['spectraPerSolve'] > 1
+
+# analysis within the current process (see pyDCONTINPALSStream.py and pyDCONTINPALSBootstrap.py): the engine is loaded and the prepared reference is kept for all following spectra
+def initAnalysis(refData, settings, libraryPath=None):
+    __initWorker(libraryPath, settings, refData)
+
+def analyseSpectrum(spectrum, index=0, name='spectrum', refData=None):
+    return __analyseSpectrum((index, name, spectrum, refData))
+
+# analysis of an already rebinned region of interest of the sample and the reference (see pyDCONTINPALSLoader.loadROI() and prepareReference())
+# using the given settings instead of those of initAnalysis() (e.g. configurations of a parameter sweep sharing the preprocessing)
+def analysePrepared(specDataROI, refDataROI, settings, index=0, name='spectrum'):
+    return __analyseROI(__emptyResult(index, name, settings), np.asarray(specDataROI, dtype='float'), np.asarray(refDataROI, dtype='float'), settings)
+
+# all files of the given directories (matching 'pattern') and the given files in this order
+def collectSpectra(paths, pattern='*'):
+    spectra = []
+
+    for path in paths:
+        path = Path(path)
+
+        if path.is_dir():
+            spectra.extend(sorted(p for p in path.glob(pattern) if p.is_file()))
+        else:
+            spectra.append(path)
+
+    return spectra
+
+# generator yielding the results (dict) of the spectra in order of their completion
+#
+# spectra:     list of file paths, (file path, index) of files of several spectra (see pyDCONTINPALSLoader.expandSpectra()) and/or data vectors (sample spectra)
+# refSpectrum: file path or data vector of the reference spectrum shared by all spectra (ignored if settings['usingRefSpectrum'] = False)
+# settings:    see defaultSettings()
+# processes:   number of worker processes (default: number of CPU cores)
+def analyseSeries(spectra, refSpectrum=None, settings=None, processes=None, libraryPath=None):
+    if settings is None:
+        settings = defaultSettings()
+
+    spectra = list(spectra)
+
+    if not spectra:
+        return
+
+    # the number of channels is only required for the Gaussian IRF
+    numberOfChannels = None
+
+    if not settings['usingRefSpectrum']:
+        numberOfChannels = loader.numberOfChannels(spectra[0], settings['specDataDelimiter'], settings['skipRows'], binaryFormat(settings))
+
+    refData = prepareReference(refSpectrum, numberOfChannels, settings)
+
+    tasks = [(index, loader.spectrumName(spectrum, index), spectrum) for index, spectrum in enumerate(spectra)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    processes = max(1, min(processes, len(tasks)))
+
+    # parts of the series analysed at once (of fixed size, so that the results with shared weights do not depend on the number of processes)
+    if __solvesStacks(settings):
+        parts = [tasks[i:i+settings['spectraPerSolve']] for i in range(0, len(tasks), settings['spectraPerSolve'])]
+
+        with Pool(processes=min(processes, len(parts)), initializer=__initWorker, initargs=(libraryPath, settings, refData)) as pool:
+            for results in pool.imap_unordered(__analyseSpectra, parts):
+                yield from results
+
+        return
+
+    # warm start: each worker analyses a contiguous part of the series
+    chunksize = 1
+    if settings['warmStart']:
+        chunksize = -(-len(tasks)//processes)
+
+    with Pool(processes=processes, initializer=__initWorker, initargs=(libraryPath, settings, refData)) as pool:
+        for result in pool.imap_unordered(__analyseSpectrum, tasks, chunksize=chunksize):
+            yield result
+
+# runs the complete batch: returns the results (in order of the given spectra) and the error codes {name: errorCode}
+def analyseBatch(spectra, refSpectrum=None, settings=None, processes=None, libraryPath=None):
+    results = sorted(analyseSeries(spectra, refSpectrum, settings, processes, libraryPath), key=lambda result: result['index'])
+
+    errorCodes = {result['name']: result['errorCode'] for result in results}
+
+    return results, errorCodes
+
+def saveResult(result, outputDir):
+    outputDir = Path(outputDir)
+    outputDir.mkdir(parents=True, exist_ok=True)
+
+    fileName = outputDir / '{}_dcontinpals.dat'.format(Path(result['name']).stem)
+
+    np.savetxt(fileName,
+               np.column_stack((result['lifetime'], result['intensity'], result['intensityErr'])),
+               delimiter='\t',
+               header='{}\nlifetime [ps]\tintensity [a.u.]\tintensity error [a.u.]'.format(result['name']))
+
+    return fileName
+
+# command line arguments of the analysis settings (shared with pyDCONTINPALSStream.py)
+def addSettingsArguments(parser, settings):
+    parser.add_argument('--ref', help='reference spectrum (or IRF) shared by all spectra')
+    parser.add_argument('--library', default=None, help='path to the dcontinpals library')
+    parser.add_argument('--engine', choices=['library','numpy'], default=settings['engine'], help='dcontinpals library or its NumPy/SciPy implementation (default: library)')
+    parser.add_argument('--kernel-cache', default=settings['kernelCacheDir'], help='directory for caching the kernel matrices (default: in memory only)')
+    parser.add_argument('--result-cache', type=float, default=settings['resultCacheSizeInMB'], metavar='MB', help='results kept in memory by each process for identical spectra and settings (default: 0, disabled)')
+    parser.add_argument('--result-cache-dir', default=settings['resultCacheDir'], help='directory caching the results for all processes and subsequent runs')
+    parser.add_argument('--warm-start', action='store_true', default=settings['warmStart'], help='seed each analysis with the previous one of the series (faster, results differ slightly)')
+    parser.add_argument('--spectra-per-solve', type=int, default=settings['spectraPerSolve'], metavar='N', help='spectra analysed at once sharing the factorization of the reference (numpy engine, default: 16)')
+    parser.add_argument('--adaptive-grid', action='store_true', default=settings['adaptiveGrid'], help='analyse on a coarse grid first and then on the grid refined around its peaks')
+    parser.add_argument('--coarse-grid-points', type=int, default=settings['coarseGridPoints'], help='number of points of the coarse grid (default: 30)')
+    parser.add_argument('--time-budget', type=float, default=settings['timeBudgetInMs'], metavar='MS', help='max. wall time of the scan of the regularization parameter per spectrum, returning the best solution so far (default: 0, no limit)')
+    parser.add_argument('--max-solutions', type=int, default=settings['maxSolutions'], metavar='N', help='max. number of regularization parameters scanned per spectrum (default: 0, no limit)')
+    parser.add_argument('--solver-threads', type=int, default=settings['solverThreads'], metavar='N', help='threads per worker solving the candidates of the regularization parameter of a spectrum concurrently, e.g. for few large spectra (default: 1)')
+    parser.add_argument('--shared-weights', action='store_true', default=settings['sharedWeights'], help='weights of the summed spectra shared by the spectra analysed at once (numpy engine, spectra of the same shape only)')
+
+    parser.add_argument('--roi', type=int, nargs=2, default=[settings['roiStart'],settings['roiEnd']], metavar=('START','END'))
+    parser.add_argument('--bkgrd', type=int, nargs=2, default=[settings['bkgrdStartIndex'],settings['bkgrdCount']], metavar=('START','COUNT'))
+    parser.add_argument('--grid', type=float, nargs=2, default=settings['gridTauInPs'], metavar=('TAU_START','TAU_STOP'), help='[ps]')
+    parser.add_argument('--grid-points', type=int, default=settings['gridPoints'])
+    parser.add_argument('--channel-resolution', type=float, default=settings['channelResolutionInPs'], help='[ps]')
+    parser.add_argument('--bin-factor', type=int, default=settings['binFactor'])
+    parser.add_argument('--tau-mono-decay', type=float, default=settings['tauMonoDecayInPs'], help='[ps]')
+    parser.add_argument('--skip-rows', type=int, default=settings['skipRows'])
+    parser.add_argument('--binary-type', default=settings['binaryDataType'], help="data type of the counts of raw binary files '*.bin', '*.raw' (default: <u4)")
+    parser.add_argument('--binary-channels', type=int, default=settings['binaryChannels'], help='number of channels per spectrum of stacked raw binary files')
+    parser.add_argument('--binary-header', type=int, default=settings['binaryHeaderBytes'], help='size of the header of raw binary files [bytes]')
+
+def applySettingsArguments(args, settings):
+    settings['roiStart'], settings['roiEnd']             = args.roi
+    settings['bkgrdStartIndex'], settings['bkgrdCount']  = args.bkgrd
+    settings['gridTauInPs']                              = list(args.grid)
+    settings['gridPoints']                               = args.grid_points
+    settings['channelResolutionInPs']                    = args.channel_resolution
+    settings['binFactor']                                = args.bin_factor
+    settings['tauMonoDecayInPs']                         = args.tau_mono_decay
+    settings['skipRows']                                 = args.skip_rows
+    settings['binaryDataType']                           = args.binary_type
+    settings['binaryChannels']                           = args.binary_channels
+    settings['binaryHeaderBytes']                        = args.binary_header
+    settings['kernelCacheDir']                           = args.kernel_cache
+    settings['warmStart']                                = args.warm_start
+    settings['spectraPerSolve']                          = args.spectra_per_solve
+    settings['sharedWeights']                            = args.shared_weights
+    settings['adaptiveGrid']                             = args.adaptive_grid
+    settings['coarseGridPoints']                         = args.coarse_grid_points
+    settings['timeBudgetInMs']                           = args.time_budget
+    settings['maxSolutions']                             = args.max_solutions
+    settings['solverThreads']                            = args.solver_threads
+    settings['resultCacheSizeInMB']                      = args.result_cache
+    settings['resultCacheDir']                           = args.result_cache_dir
+    settings['engine']                                   = args.engine
+
+    if args.ref is None:
+        settings['usingRefSpectrum'] = False
+
+    return settings
+
+def __parseArguments(argv):
+    settings = defaultSettings()
+
+    parser = argparse.ArgumentParser(description='batch analysis of lifetime spectra using CONTIN-PALS')
+
+    parser.add_argument('spectra', nargs='+', help='spectra files and/or directories containing the spectra')
+    parser.add_argument('--pattern', default='*', help='file pattern used for directories (default: *)')
+    parser.add_argument('--output', help='directory the results are written to')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--store', help='directory of the columnar result store the results are appended to (see pyDCONTINPALSStore.py)')
+    parser.add_argument('--shard-size', type=int, default=1024, help='number of records per shard of the result store (default: 1024)')
+    parser.add_argument('--figures', help='directory the figures of the distribution and the residuals of each spectrum are written to (rendered in the background)')
+    parser.add_argument('--statistics', action='store_true', help='print the wall times of the phases and the solver counters of each analysis')
+
+    addSettingsArguments(parser, settings)
+
+    args = parser.parse_args(argv)
+
+    return args, applySettingsArguments(args, settings)
+
+if __name__ == '__main__':
+    args, settings = __parseArguments(sys.argv[1:])
+
+    spectra = loader.expandSpectra(collectSpectra(args.spectra, args.pattern), settings['specDataDelimiter'], settings['skipRows'], binaryFormat(settings))
+
+    errorCodes   = {}
+    errorStrings = {}
+
+    results = analyseSeries(spectra, args.ref, settings, args.processes, args.library)
+
+    if args.figures:
+        import pyDCONTINPALSFigures as figures
+
+    if args.store:
+        import pyDCONTINPALSStore as store
+
+        results = store.storeResults(args.store, results, settings, args.shard_size)
+
+    for result in results:
+        errorCodes[result['name']]   = result['errorCode']
+        errorStrings[result['name']] = result['errorString']
+
+        line = '[{}/{}] {}: {}'.format(len(errorCodes), len(spectra), result['name'], result['errorString'])
+
+        if result['cached']:
+            line += ' (cached)'
+
+        if result['truncated']:
+            line += ' (truncated)'
+
+        if args.output and result['errorCode'] == SUCCESS:
+            line += ' -> {}'.format(saveResult(result, args.output))
+
+        if args.figures and result['errorCode'] == SUCCESS:
+            figures.renderAsync(figures.plotResult, result, args.figures)
+
+        print(line)
+
+        if args.statistics and result['statistics'] is not None:
+            print('    time [ms]: ' + ', '.join('{}: {:.1f}'.format(phase, value) for phase, value in result['statistics']['timeInMs'].items()))
+            print('    counters:  ' + ', '.join('{}: {}'.format(counter, value) for counter, value in result['statistics']['counters'].items()))
+
+    if args.figures:
+        figures.waitForFigures()
+
+    failed = {name: errorCode for name, errorCode in errorCodes.items() if not errorCode == SUCCESS}
+
+    print('')
+    print('{} of {} spectra analysed successfully'.format(len(errorCodes)-len(failed), len(errorCodes)))
+
+    for name, errorCode in sorted(failed.items()):
+        print('{} ({}): {}'.format(name, errorCode, errorStrings[name]))
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# reproducible benchmark of the complete pipeline on simulated spectra (see pyDCONTINPALSSpecSimulator.py) sweeping the number of channels,
+# grid points, integral counts and components. Each case runs in a process of its own (peak RSS per case) and records the wall time of
+# each stage (simulation, preprocessing, solve, results, peak fit) and the errors of the recovered lifetimes and intensities.
+# The records are written as JSON lines, so the results of different releases can be compared. If provided by the engine, the wall times
+# of the phases and the solver counters of the library (see batch.analysisStatistics()) of the last repeat are recorded as well.
+
+import argparse
+import ctypes
+import itertools
+import json
+import platform
+import sys
+import time
+from multiprocessing import Pool
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSBootstrap as bootstrap
+import pyDCONTINPALSPreprocessing as preprocessing
+import pyDCONTINPALSSpecSimulator as specSimulator
+import pyDCONTINPALSStream as stream
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+VERSION_HANDSHAKE = 1 # v1.0x
+
+# components of the simulated spectra (lifetimes [ps], intensities) by number of components
+GROUND_TRUTH = {1: ([400.0],               [1.0]),
+                2: ([180.0, 1600.0],       [0.75, 0.25]),
+                3: ([180.0, 400.0, 1600.0], [0.3, 0.5, 0.2])}
+
+def defaultBenchmarkSettings():
+    return {'channels'         : [1000, 2000, 4000],
+            'gridPoints'       : [20, 50, 100],
+            'integralCounts'   : [1E5, 1E6, 1E7],
+            'components'       : [1, 2, 3],
+            'repeats'          : 1,      # the wall times are the medians of the repeats
+            'seed'             : 1,
+            'binWidthInPs'     : 25.,
+            'tZeroInPs'        : 3000.,
+            'irfFWHMInPs'      : 230.,
+            'refLifetimeInPs'  : 182.,
+            'constBkgrdCounts' : 1.,
+            'gridTauInPs'      : [10.,3000.],
+            'bkgrdFraction'    : 0.1,    # last part of the channels used for the background
+            'engine'           : 'library'}
+
+def cases(benchmarkSettings):
+    return [{'channels': channels, 'gridPoints': gridPoints, 'integralCounts': integralCounts, 'components': components}
+            for channels, gridPoints, integralCounts, components in itertools.product(benchmarkSettings['channels'],
+                                                                                     benchmarkSettings['gridPoints'],
+                                                                                     benchmarkSettings['integralCounts'],
+                                                                                     benchmarkSettings['components'])]
+
+# peak resident set size of the current process [MB] (None if not available)
+def peakRSSInMB():
+    if resource is None:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macOS, kilobytes otherwise
+    return maxrss/1048576. if sys.platform == 'darwin' else maxrss/1024.
+
+def __runCase(task):
+    case, benchmarkSettings, libraryPath = task
+
+    settings = benchmarkSettings
+
+    tau, intensity = GROUND_TRUTH[case['components']]
+
+    record = dict(case)
+
+    record['errorCode'] = batch.NO_LIFETIMEDATA
+    record['time']      = {}
+
+    times = {'simulation': [], 'preprocessing': [], 'solve': [], 'results': [], 'peakFit': []}
+
+    dllPtr = batch.loadEngine(settings['engine'], libraryPath)
+
+    program = dllPtr.analyseDataInMemory if hasattr(dllPtr, 'analyseDataInMemory') else dllPtr.analyseData
+
+    if isinstance(dllPtr, ctypes.CDLL):
+        program.restype = ctypes.c_int
+
+    # scipy.signal is imported on the first peak fit only (see pyDCONTINPALSPeaks), so it is imported here to keep its import out of the time of the stage 'peakFit'
+    import scipy.signal
+
+    bkgrdCount = max(2, int(settings['bkgrdFraction']*case['channels']))
+
+    for repeat in range(settings['repeats']):
+        rng = np.random.default_rng([settings['seed'], repeat])
+
+        t = time.perf_counter()
+
+        spectra = specSimulator.generateCompleteLTSpectra(charactLifetimes_in_ps=[tau, [settings['refLifetimeInPs']]],
+                                                          contributionOfLifetimes=[intensity, [1.0]],
+                                                          binWidth_in_ps=settings['binWidthInPs'],
+                                                          integralCounts=case['integralCounts'],
+                                                          constBkgrdCounts=settings['constBkgrdCounts'],
+                                                          numberOfBins=case['channels'],
+                                                          irf_tZero_in_ps=settings['tZeroInPs'],
+                                                          irf_fwhm_in_ps=settings['irfFWHMInPs'],
+                                                          rng=rng)
+
+        times['simulation'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+
+        specSampBuffer, specRefBuffer, (offset, count), binWidth = preprocessing.preprocess(spectra[0],
+                                                                                            spectra[1],
+                                                                                            0,
+                                                                                            case['channels'],
+                                                                                            1,
+                                                                                            case['channels'] - bkgrdCount - 1,
+                                                                                            bkgrdCount,
+                                                                                            settings['binWidthInPs'])
+
+        times['preprocessing'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+
+        errorCode = program(preprocessing.intPointer(specSampBuffer),
+                            preprocessing.intPointer(specRefBuffer),
+                            ctypes.c_int(len(specSampBuffer)),
+                            ctypes.c_double(settings['refLifetimeInPs']),
+                            ctypes.c_double(binWidth),
+                            ctypes.c_double(settings['gridTauInPs'][0]),
+                            ctypes.c_double(settings['gridTauInPs'][1]),
+                            ctypes.c_int(case['gridPoints']),
+                            ctypes.c_int(offset),
+                            ctypes.c_int(count))
+
+        times['solve'].append(time.perf_counter() - t)
+
+        record['errorCode'] = errorCode
+
+        if not errorCode == batch.SUCCESS:
+            break
+
+        t = time.perf_counter()
+
+        gridSize = dllPtr.gridSize()
+
+        result = {'decayRate': np.zeros(gridSize), 'lifetime': np.zeros(gridSize), 'intensity': np.zeros(gridSize), 'intensityErr': np.zeros(gridSize)}
+
+        if hasattr(dllPtr, 'exportResults'):
+            dllPtr.exportResults(result['decayRate'], result['lifetime'], result['intensity'], result['intensityErr'], gridSize)
+        else:
+            result['lifetime']  = np.array([dllPtr.lifetimeAt(ctypes.c_int(i)) for i in range(gridSize)])
+            result['intensity'] = np.array([dllPtr.intensityAt(ctypes.c_int(i)) for i in range(gridSize)])
+
+        times['results'].append(time.perf_counter() - t)
+
+        record['statistics'] = batch.analysisStatistics(dllPtr)
+
+        t = time.perf_counter()
+
+        peaks = stream.peakParameters(result)
+
+        times['peakFit'].append(time.perf_counter() - t)
+
+    record['time'] = {stage: float(np.median(values)) for stage, values in times.items() if len(values)}
+
+    record['peakRSSInMB'] = peakRSSInMB()
+
+    if not record['errorCode'] == batch.SUCCESS:
+        return record
+
+    # errors of the recovered components (NaN if not recovered)
+    truth = np.column_stack((tau, np.full(len(tau), np.nan), intensity))
+
+    recovered = bootstrap.matchPeaks(truth, [peaks if peaks is not None else np.zeros((0, 3))])[0]
+
+    record['peaksFound']      = 0 if peaks is None else len(peaks)
+    record['lifetimeError']   = [None if np.isnan(v) else float(v) for v in recovered[:,0]/truth[:,0] - 1.]
+    record['intensityError']  = [None if np.isnan(v) else float(v) for v in recovered[:,2] - truth[:,2]]
+
+    return record
+
+# generator running the benchmark cases one after another (each in a fresh process)
+def runBenchmark(benchmarkSettings=None, libraryPath=None):
+    if benchmarkSettings is None:
+        benchmarkSettings = defaultBenchmarkSettings()
+
+    tasks = [(case, benchmarkSettings, libraryPath) for case in cases(benchmarkSettings)]
+
+    with Pool(processes=1, maxtasksperchild=1) as pool:
+        for record in pool.imap(__runCase, tasks):
+            yield record
+
+# description of the environment written as the first record
+def environment(benchmarkSettings):
+    return {'benchmark' : 'pyDCONTINPALS',
+            'version'   : VERSION_HANDSHAKE,
+            'date'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform'  : platform.platform(),
+            'python'    : platform.python_version(),
+            'numpy'     : np.__version__,
+            'settings'  : benchmarkSettings}
+
+def __parseArguments(argv):
+    benchmarkSettings = defaultBenchmarkSettings()
+
+    parser = argparse.ArgumentParser(description='benchmark of throughput and accuracy of CONTIN-PALS on simulated spectra')
+
+    parser.add_argument('--output', help='file the records are written to (JSON lines)')
+    parser.add_argument('--library', default=None, help='path to the dcontinpals library')
+    parser.add_argument('--engine', choices=['library','numpy'], default=benchmarkSettings['engine'])
+    parser.add_argument('--channels', type=int, nargs='+', default=benchmarkSettings['channels'])
+    parser.add_argument('--grid-points', type=int, nargs='+', default=benchmarkSettings['gridPoints'])
+    parser.add_argument('--counts', type=float, nargs='+', default=benchmarkSettings['integralCounts'])
+    parser.add_argument('--components', type=int, nargs='+', choices=sorted(GROUND_TRUTH), default=benchmarkSettings['components'])
+    parser.add_argument('--repeats', type=int, default=benchmarkSettings['repeats'])
+    parser.add_argument('--seed', type=int, default=benchmarkSettings['seed'])
+
+    args = parser.parse_args(argv)
+
+    benchmarkSettings['engine']         = args.engine
+    benchmarkSettings['channels']       = args.channels
+    benchmarkSettings['gridPoints']     = args.grid_points
+    benchmarkSettings['integralCounts'] = args.counts
+    benchmarkSettings['components']     = args.components
+    benchmarkSettings['repeats']        = args.repeats
+    benchmarkSettings['seed']           = args.seed
+
+    return args, benchmarkSettings
+
+if __name__ == '__main__':
+    args, benchmarkSettings = __parseArguments(sys.argv[1:])
+
+    output = open(args.output, 'w') if args.output else None
+
+    if output:
+        output.write(json.dumps(environment(benchmarkSettings)) + '\n')
+
+    print('channels  grid  counts     comp.  solve [s]  total [s]  RSS [MB]  max. |dtau/tau|  max. |dI|')
+
+    for record in runBenchmark(benchmarkSettings, args.library):
+        if output:
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+
+        line = '{:8d}  {:4d}  {:9.2e}  {:5d}  '.format(record['channels'], record['gridPoints'], record['integralCounts'], record['components'])
+
+        if not record['errorCode'] == batch.SUCCESS:
+            print(line + batch.ERROR_CODES.get(record['errorCode'], 'unknown error'))
+            continue
+
+        lifetimeErrors  = [abs(v) for v in record['lifetimeError'] if v is not None]
+        intensityErrors = [abs(v) for v in record['intensityError'] if v is not None]
+
+        line += '{:9.3f}  {:9.3f}  '.format(record['time']['solve'], sum(record['time'].values()))
+        line += '{:8.1f}  '.format(record['peakRSSInMB']) if record['peakRSSInMB'] is not None else '       -  '
+        line += '{:15.4f}  {:9.4f}'.format(max(lifetimeErrors), max(intensityErrors)) if lifetimeErrors else '              -          -'
+
+        if len(lifetimeErrors) < record['components']:
+            line += '  ({} of {} components recovered)'.format(len(lifetimeErrors), record['components'])
+
+        print(line)
+
+    if output:
+        output.close()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# Poisson bootstrap of the lifetime distribution: the sample (and reference) spectrum is resampled channel by channel and each replica
+# is analysed by a pool of worker processes. The workers write the intensity pdf of their replicas directly into arrays in shared memory.
+# The peaks of all replicas are fitted at once (see fitPeaks() in pyDCONTINPALSPeaks.py) and reduced into percentile bands at the end.
+
+import argparse
+import os
+import sys
+from multiprocessing import Pool, shared_memory
+from pathlib import Path
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSPeaks as peakAnalysis
+import pyDCONTINPALSStream as stream
+
+# shared arrays and data of the worker processes
+__shared    = None
+__arrays    = None
+__specData  = None
+__refData   = None
+__bootstrap = None
+
+def defaultBootstrapSettings():
+    return {'replicas'         : 1000,
+            'seed'             : None, # random seed of the resampling (default: drawn at random, see result['seed'])
+            'percentiles'      : [2.5,16.,50.,84.,97.5],
+            'maxPeaks'         : 8,    # max. number of peaks (the most prominent ones) per replica
+            'resampleReference': True} # resample the reference spectrum as well (ignored for a Gaussian IRF)
+
+# arrays in shared memory: error codes and intensity pdf (replica x grid point)
+def __arrayShapes(replicas, gridPoints):
+    return {'errorCode': (replicas,),
+            'intensity': (replicas, gridPoints)}
+
+def __attach(names, shapes):
+    shared = {name: shared_memory.SharedMemory(name=names[name]) for name in shapes}
+    arrays = {name: np.ndarray(shapes[name], dtype='float', buffer=shared[name].buf) for name in shapes}
+
+    return shared, arrays
+
+def __initWorker(libraryPath, settings, bootstrapSettings, specData, refData, names, shapes):
+    global __shared, __arrays, __specData, __refData, __bootstrap
+
+    batch.initAnalysis(refData, settings, libraryPath)
+
+    __shared, __arrays = __attach(names, shapes)
+
+    __specData  = specData
+    __refData   = refData
+    __bootstrap = bootstrapSettings
+
+def __analyseReplica(index):
+    settings = __bootstrap
+
+    rng = np.random.default_rng([settings['seed'], index])
+
+    specData = rng.poisson(np.maximum(__specData, 0.)).astype('float')
+    refData  = rng.poisson(np.maximum(__refData, 0.)).astype('float') if settings['resampleReference'] else None
+
+    result = batch.analyseSpectrum(specData, index, 'replica_{}'.format(index), refData)
+
+    __arrays['errorCode'][index] = result['errorCode']
+
+    if not result['errorCode'] == batch.SUCCESS:
+        return index, result['errorCode']
+
+    __arrays['intensity'][index] = result['intensity']
+
+    return index, result['errorCode']
+
+# peaks of each replica assigned to the nearest (log. lifetime) peak of the analysis of the measured spectrum (NaN if none)
+def matchPeaks(peaks, replicaPeaks):
+    matched = np.full((len(replicaPeaks), len(peaks), 3), np.nan)
+
+    for index, candidates in enumerate(replicaPeaks):
+        candidates = candidates[np.isfinite(candidates[:,0]) & (candidates[:,0] > 0.)]
+
+        if not len(candidates):
+            continue
+
+        distance = np.abs(np.log(candidates[:,0])[:,np.newaxis] - np.log(peaks[:,0])[np.newaxis,:])
+
+        nearest = np.argmin(distance, axis=0)
+
+        for k in range(len(peaks)):
+            # a peak of the replica is assigned to one peak only
+            if np.argmin(distance[nearest[k]]) == k:
+                matched[index,k] = candidates[nearest[k]]
+
+    return matched
+
+# Poisson bootstrap of the given spectrum (see pyDCONTINPALSBatch.analyseSeries() for the arguments), returning a dict with:
+#
+# 'lifetime', 'intensity', 'intensityErr', 'peaks': results of the measured spectrum
+# 'percentiles':                                   see defaultBootstrapSettings()
+# 'intensityBands':                                percentiles of the intensity pdf (percentile x grid point)
+# 'peakBands':                                     percentiles of position, width and intensity of the peaks (percentile x peak x 3)
+# 'replicaIntensity', 'replicaPeaks':              results of all replicas (NaN if failed or no matching peak)
+# 'errorCodes':                                    error codes of all replicas
+def bootstrap(spectrum, refSpectrum=None, settings=None, bootstrapSettings=None, processes=None, libraryPath=None):
+    if settings is None:
+        settings = batch.defaultSettings()
+
+    if bootstrapSettings is None:
+        bootstrapSettings = defaultBootstrapSettings()
+
+    # the replicas are compared point by point on the grid of the measured spectrum
+    if settings['adaptiveGrid']:
+        raise ValueError('the adaptive grid is not supported by the bootstrap (each replica would be analysed on a grid of its own)')
+
+    bootstrapSettings = dict(bootstrapSettings)
+
+    if bootstrapSettings['seed'] is None:
+        bootstrapSettings['seed'] = int(np.random.SeedSequence().entropy)
+
+    if not settings['usingRefSpectrum']:
+        bootstrapSettings['resampleReference'] = False
+
+    specData = batch.loadSpectrum(spectrum, settings['specDataDelimiter'], settings['skipRows'], batch.binaryFormat(settings))
+    refData  = batch.prepareReference(refSpectrum, len(specData), settings)
+
+    # the measured spectrum
+    batch.initAnalysis(refData, settings, libraryPath)
+
+    measured = batch.analyseSpectrum(specData, -1, str(spectrum) if isinstance(spectrum, (str, Path)) else 'spectrum')
+
+    if not measured['errorCode'] == batch.SUCCESS:
+        return {'errorCode': measured['errorCode'], 'errorString': measured['errorString']}
+
+    replicas   = bootstrapSettings['replicas']
+    gridPoints = len(measured['intensity'])
+
+    shapes = __arrayShapes(replicas, gridPoints)
+    shared = {name: shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)))*np.dtype('float').itemsize) for name, shape in shapes.items()}
+
+    try:
+        arrays = {name: np.ndarray(shapes[name], dtype='float', buffer=shared[name].buf) for name in shapes}
+
+        for array in arrays.values():
+            array.fill(np.nan)
+
+        names = {name: shared[name].name for name in shared}
+
+        if processes is None:
+            processes = os.cpu_count() or 1
+
+        processes = max(1, min(processes, replicas))
+        chunksize = max(1, replicas//(4*processes))
+
+        with Pool(processes=processes, initializer=__initWorker, initargs=(libraryPath, settings, bootstrapSettings, specData, refData, names, shapes)) as pool:
+            for index, errorCode in pool.imap_unordered(__analyseReplica, range(replicas), chunksize=chunksize):
+                pass
+
+        errorCodes       = arrays['errorCode'].astype('int')
+        replicaIntensity = arrays['intensity'].copy()
+    finally:
+        for memory in shared.values():
+            memory.close()
+            memory.unlink()
+
+    peakSettings = peakAnalysis.defaultPeakSettings()
+    peakSettings['maxPeaks'] = bootstrapSettings['maxPeaks']
+
+    peaks = stream.peakParameters(measured, peakSettings)
+
+    if peaks is None:
+        peaks = np.zeros((0, 3))
+
+    valid = errorCodes == batch.SUCCESS
+
+    # peaks of all (successfully analysed) replicas at once
+    replicaPeaks = [np.zeros((0, 3))]*replicas
+
+    if np.any(valid):
+        for index, table in zip(np.nonzero(valid)[0], peakAnalysis.peakTable(measured['lifetime'], replicaIntensity[valid], peakSettings)):
+            replicaPeaks[index] = table
+
+    replicaPeaks = matchPeaks(peaks, replicaPeaks)
+
+    percentiles = bootstrapSettings['percentiles']
+
+    intensityBands = np.full((len(percentiles), gridPoints), np.nan)
+    peakBands      = np.full((len(percentiles), len(peaks), 3), np.nan)
+
+    if np.any(valid):
+        intensityBands = np.percentile(replicaIntensity[valid], percentiles, axis=0)
+
+        if len(peaks) and np.any(np.isfinite(replicaPeaks[valid])):
+            peakBands = np.nanpercentile(replicaPeaks[valid], percentiles, axis=0)
+
+    return {'errorCode'       : batch.SUCCESS,
+            'errorString'     : measured['errorString'],
+            'seed'            : bootstrapSettings['seed'],
+            'lifetime'        : measured['lifetime'],
+            'intensity'       : measured['intensity'],
+            'intensityErr'    : measured['intensityErr'],
+            'peaks'           : peaks,
+            'percentiles'     : np.asarray(percentiles, dtype='float'),
+            'intensityBands'  : intensityBands,
+            'peakBands'       : peakBands,
+            'replicaIntensity': replicaIntensity,
+            'replicaPeaks'    : replicaPeaks,
+            'errorCodes'      : errorCodes}
+
+def saveBootstrap(result, fileName):
+    header = 'bootstrap (seed: {}, replicas: {})\nlifetime [ps]\tintensity [a.u.]\tintensity error [a.u.]\t'.format(result['seed'], len(result['errorCodes']))
+    header += '\t'.join('P{:g} [a.u.]'.format(p) for p in result['percentiles'])
+
+    np.savetxt(fileName,
+               np.column_stack((result['lifetime'], result['intensity'], result['intensityErr'], result['intensityBands'].T)),
+               delimiter='\t',
+               header=header)
+
+    return fileName
+
+def __parseArguments(argv):
+    settings          = batch.defaultSettings()
+    bootstrapSettings = defaultBootstrapSettings()
+
+    parser = argparse.ArgumentParser(description='Poisson bootstrap of the lifetime distribution obtained by CONTIN-PALS')
+
+    parser.add_argument('spectrum', help='sample spectrum')
+    parser.add_argument('--output', help='file the intensity bands are written to')
+    parser.add_argument('--replicas', type=int, default=bootstrapSettings['replicas'])
+    parser.add_argument('--seed', type=int, default=bootstrapSettings['seed'])
+    parser.add_argument('--percentiles', type=float, nargs='+', default=bootstrapSettings['percentiles'])
+    parser.add_argument('--keep-reference', action='store_true', help='resample the sample spectrum only')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: number of CPU cores)')
+
+    batch.addSettingsArguments(parser, settings)
+
+    args = parser.parse_args(argv)
+
+    if args.adaptive_grid:
+        parser.error('--adaptive-grid is not supported by the bootstrap')
+
+    bootstrapSettings['replicas']          = args.replicas
+    bootstrapSettings['seed']              = args.seed
+    bootstrapSettings['percentiles']       = args.percentiles
+    bootstrapSettings['resampleReference'] = not args.keep_reference
+
+    return args, batch.applySettingsArguments(args, settings), bootstrapSettings
+
+if __name__ == '__main__':
+    args, settings, bootstrapSettings = __parseArguments(sys.argv[1:])
+
+    # paths of the user are relative to the working directory at the start
+    if args.output:
+        args.output = Path(args.output).resolve()
+
+    result = bootstrap(args.spectrum, args.ref, settings, bootstrapSettings, args.processes, args.library)
+
+    if not result['errorCode'] == batch.SUCCESS:
+        print('{}: {}'.format(args.spectrum, result['errorString']))
+        sys.exit(1)
+
+    failed = int(np.count_nonzero(result['errorCodes'] != batch.SUCCESS))
+
+    print('{} of {} replicas analysed successfully (seed: {})'.format(len(result['errorCodes'])-failed, len(result['errorCodes']), result['seed']))
+    print('')
+
+    labels = ', '.join('P{:g}'.format(p) for p in result['percentiles'])
+
+    for i in range(len(result['peaks'])):
+        print('------------ found component ({}/{}) ------------'.format(i+1,len(result['peaks'])))
+        print('')
+        print('tau-mean:   {:.1f} ps [{}: {}] ps'.format(result['peaks'][i,0], labels, ', '.join('{:.1f}'.format(v) for v in result['peakBands'][:,i,0])))
+        print('tau-sigma:  {:.1f} ps [{}: {}] ps'.format(result['peaks'][i,1], labels, ', '.join('{:.1f}'.format(v) for v in result['peakBands'][:,i,1])))
+        print('intensity:  {:.2f} % [{}: {}] %'.format(100.*result['peaks'][i,2], labels, ', '.join('{:.2f}'.format(100.*v) for v in result['peakBands'][:,i,2])))
+        print('')
+
+    if args.output:
+        print('-> {}'.format(saveBootstrap(result, args.output)))
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# cache of the results of CONTIN-PALS keyed by the hash of the data passed to the engine (preprocessed sample and reference) and all parameters
+# of the analysis. The results are kept in memory (per process) and optionally in a directory shared by all processes, both limited in size
+# and evicting the least recently used results first.
+#
+# the build of the engine (see pyDCONTINPALSBatch.engineBuild(), a hash of the library file or of the NumPy engine) is part of the key and the
+# results of other builds are removed from the directory, so that a rebuilt library never returns the results of the previous one.
+
+import hashlib
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+# arrays of a cached result
+ARRAYS = ('decayRate', 'lifetime', 'intensity', 'intensityErr', 'residuals')
+
+__memory         = OrderedDict()
+__memoryBytes    = 0
+__memoryLimit    = 0
+__directory      = None
+__directoryLimit = 0
+__build          = None
+
+# memory (per process) and directory (shared) tier: the sizes are given in MB, a size of 0 disables the tier
+def configure(memorySizeInMB, directory=None, directorySizeInMB=1024, engine='library', build=None):
+    global __memoryLimit, __directory, __directoryLimit, __build, __memoryBytes
+
+    build = (engine, build)
+
+    if not build == __build:
+        __memory.clear()
+        __memoryBytes = 0
+
+    __build          = build
+    __memoryLimit    = int(memorySizeInMB*1048576)
+    __directoryLimit = int(directorySizeInMB*1048576)
+    __directory      = None
+
+    if directory and __directoryLimit > 0:
+        directory = Path(directory) / engine
+
+        __directory = directory / 'build_{}'.format(build[1])
+        __directory.mkdir(parents=True, exist_ok=True)
+
+        # results of other builds are invalid
+        for other in directory.iterdir():
+            if other.is_dir() and not other == __directory:
+                shutil.rmtree(other, ignore_errors=True)
+
+    __evictMemory()
+
+def enabled():
+    return __memoryLimit > 0 or __directory is not None
+
+# hash of the data and the parameters passed to the engine (and its build)
+def resultKey(specData, refData, parameters):
+    digest = hashlib.sha1()
+
+    for data in (specData, refData):
+        data = np.ascontiguousarray(data)
+
+        digest.update(str((data.dtype.str, data.shape)).encode())
+        digest.update(data.tobytes())
+
+    digest.update(repr((tuple(parameters), __build)).encode())
+
+    return digest.hexdigest()
+
+def __size(result):
+    return sum(result[name].nbytes for name in ARRAYS)
+
+def __evictMemory():
+    global __memoryBytes
+
+    while __memory and __memoryBytes > __memoryLimit:
+        key, result = __memory.popitem(last=False)
+
+        __memoryBytes -= __size(result)
+
+def __keepInMemory(key, result):
+    global __memoryBytes
+
+    if __memoryLimit <= 0 or __size(result) > __memoryLimit:
+        return
+
+    if key in __memory:
+        __memoryBytes -= __size(__memory.pop(key))
+
+    __memory[key] = result
+
+    __memoryBytes += __size(result)
+
+    __evictMemory()
+
+def __evictDirectory():
+    files = []
+
+    for entry in os.scandir(__directory):
+        if entry.name.endswith('.npz'):
+            try:
+                files.append((entry.stat().st_mtime, entry.stat().st_size, entry.path))
+            except OSError: # removed by another process
+                pass
+
+    total = sum(size for modified, size, path in files)
+
+    for modified, size, path in sorted(files):
+        if total <= __directoryLimit:
+            break
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+        total -= size
+
+# copy of the cached result (see ARRAYS) or None
+def lookup(key):
+    if key in __memory:
+        __memory.move_to_end(key)
+
+        return {name: array.copy() for name, array in __memory[key].items()}
+
+    if __directory is None:
+        return None
+
+    fileName = __directory / (key + '.npz')
+
+    try:
+        with np.load(fileName) as data:
+            result = {name: data[name] for name in ARRAYS}
+
+        # the modification time orders the results by their last use
+        os.utime(fileName)
+    except (OSError, KeyError, ValueError): # not cached or removed by another process
+        return None
+
+    __keepInMemory(key, result)
+
+    return {name: array.copy() for name, array in result.items()}
+
+def store(key, result):
+    result = {name: np.array(result[name], dtype='float') for name in ARRAYS}
+
+    __keepInMemory(key, result)
+
+    if __directory is None:
+        return
+
+    fileName  = __directory / (key + '.npz')
+    temporary = __directory / '{}.{}.tmp'.format(key, os.getpid())
+
+    try:
+        with open(temporary, 'wb') as file:
+            np.savez(file, **result)
+
+        os.replace(temporary, fileName)
+    except OSError:
+        return
+
+    __evictDirectory()
+
+def clear():
+    global __memoryBytes
+
+    __memory.clear()
+    __memoryBytes = 0
+
+    if __directory is not None:
+        for fileName in __directory.glob('*.npz'):
+            try:
+                fileName.unlink()
+            except OSError:
+                pass
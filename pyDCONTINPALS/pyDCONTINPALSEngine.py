@@ -0,0 +1,970 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# pure NumPy/SciPy implementation of the analysis done by CONTIN-PALS (see DCONTINPALS/src/CONTINPALS/CONTPALS.FOR) as an alternative to the dcontinpals library:
+#
+#   - kernel of USERK (IUSER(10)=6): exponential decays convoluted with the reference spectrum (computed by FFT for all decay rates at once)
+#   - regularizor of second order (NORDER=2, NENDZ=1,1), non-negative solution being zero at both ends of the grid (NEQ=2)
+#   - two linear terms (NLINF=2): constant background and the scaled reference spectrum (USERLF)
+#   - choice of the regularization parameter by the F-test (PLEVEL=0.5) after a coarse and a fine scan (NQPROG=5,15)
+#   - preliminary unweighted analysis followed by the weighted one (IWT=2, NERFIT=10)
+#
+# the constrained solutions are computed by least distance programming (LDP) as in CONTIN. The module provides the functions of the library
+# (analyseDataInMemory(), gridSize(), exportResults(), ...), so that it can be used in place of the loaded library (see pyDCONTINPALSBatch.py).
+#
+# the scaled coefficient matrix of the preliminary unweighted analysis only depends on the reference spectrum, so its factorization is computed
+# once and shared by all spectra analysed against the same reference (see analyseSpectra()). With shared weights, this also applies to the
+# factorization of the weighted analysis of a stack of spectra.
+#
+# with a budget (see setAnalysisBudget()), the scans of the regularization parameter stop as in CONTIN-PALS (see module CONBUD and ANALYZ).
+#
+# with more than one thread (see setAnalysisThreads()), the solutions of successive values of the regularization parameter are computed
+# concurrently, while the choice is made in the order of the scan (see module CONPAR and SETCAN), i.e. the results do not depend on the threads.
+
+import ctypes
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scipy.fft
+from scipy.optimize import nnls
+from scipy.special import betainc
+
+VERSION_HANDSHAKE = 1 # v1.0x
+
+# see 'dcpalsErrorCode' in dcontinpals.h
+SUCCESS                                = 1
+NO_LIFETIMEDATA                        = 0
+NO_REFLIFETIMEDATA                     = -1
+ZERO_BINWIDTH                          = -2
+BADVALUE_TAUGRIDLIMITS                 = -3
+BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LOW   = -4
+BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LARGE = -5
+BADVALUE_BACKGROUNDCHANNELS            = -6
+DATALENGTH_TOO_HIGH                    = -7
+DATALENGTH_TOO_SHORT                   = -8
+BINWIDTH_TOO_SHORT                     = -9
+NO_RESULTS                             = -10
+
+# control variables of CONTIN-PALS as set in MEMINP
+__DFMIN  = 2.
+__PLEVEL = 0.5
+__NQPROG = (5, 15)
+__NERFIT = 10
+__RANGE  = 1E35
+__SRANGE = 1E35
+
+# largest exponent of the kernel (EXMAX in INIT)
+__EXMAX = float(np.log(np.float32(__SRANGE)))
+
+# relative machine precision as determined in INIT
+def __precision():
+    fact  = float(np.float32(__RANGE**(-0.025)))
+    small = 1./__RANGE
+    size  = __RANGE
+
+    precis = None
+
+    for j in range(80):
+        ptry = 1E-8
+
+        for k in range(150):
+            ptry  *= 0.5
+            deltry = ptry*size
+
+            if deltry < small:
+                return 20.*precis
+
+            if (size + deltry) - size <= 0.:
+                break
+
+        precis = ptry if precis is None else max(ptry, precis)
+        size  *= fact
+
+    return 20.*precis
+
+__PRECIS = __precision()
+
+# results of the last analysis (see DCONTINPALSPrivateData in dcontinpals.h)
+__results = {'decayRate'   : np.zeros(0),
+             'intensity'   : np.zeros(0),
+             'intensityErr': np.zeros(0),
+             'residuals'   : np.zeros(0)}
+
+# factorization of the preliminary unweighted analysis of the last reference
+__setupKey = None
+__setup    = None
+
+# budget of the scans of the regularization parameter (0: no limit) and whether the last analysis has been stopped by it
+__budget    = {'maxTimeInS': 0., 'maxSolutions': 0}
+__truncated = False
+
+# threads solving the candidates of the regularization parameter of an analysis (see setAnalysisThreads())
+__threads  = 1
+__executor = None
+
+def version():
+    return VERSION_HANDSHAKE
+
+# grid of decay rates [1/ns] in equal intervals of log(decay rate) and the weights of the Simpson rule (IGRID=2, IQUAD=3, see SETGRD)
+def decayRateGrid(minDecayRate, maxDecayRate, numberOfGridPoints):
+    decayRates = np.geomspace(minDecayRate, maxDecayRate, numberOfGridPoints)
+
+    delta = np.log(maxDecayRate/minDecayRate)/(numberOfGridPoints - 1)
+
+    cquad = np.empty(numberOfGridPoints)
+
+    cquad[0]        = delta/3.
+    cquad[1:-1:2]   = 4.*cquad[0]
+    cquad[2:-1:2]   = 2.*cquad[0]
+    cquad[-1]       = cquad[0]
+
+    # last pair of grid points by the trapezoidal rule
+    if numberOfGridPoints % 2 == 0:
+        cquad[-1] = 1.5*cquad[0]
+        cquad[-2] = cquad[0] + cquad[-1]
+
+    return decayRates, cquad*decayRates
+
+# exponential decays convoluted with the reference spectrum (USERK, IUSER(10)=6) for RUSER(80) = 1
+#
+# refData:       reference spectrum (background subtracted)
+# refDecayRate:  decay rate of the reference [1/ns]
+# binWidth_ns:   bin width [ns]
+# decayRates:    grid of decay rates [1/ns]
+#
+# returns the kernel matrix (channel x decay rate)
+def kernelMatrix(refData, refDecayRate, binWidth_ns, decayRates):
+    refData    = np.asarray(refData, dtype='float')
+    decayRates = np.asarray(decayRates, dtype='float')
+
+    numberOfBins = refData.shape[-1]
+
+    # convolution (trapezoidal rule) of the reference with exp(-decayRate*t): C(j) = h*sum(ref(k)*q**(j-k), k <= j) - h*ref(j)/2
+    nfft = scipy.fft.next_fast_len(2*numberOfBins - 1, real=True)
+
+    refSpectrum = scipy.fft.rfft(refData, nfft)
+
+    kernel = np.empty((numberOfBins, len(decayRates)))
+
+    # decay rates in chunks limiting the memory of the transforms
+    chunk = max(1, (1 << 22)//nfft)
+
+    for start in range(0, len(decayRates), chunk):
+        g = decayRates[start:start+chunk]
+
+        decay = np.exp(-np.outer(g, np.arange(numberOfBins))*binWidth_ns)
+
+        conv = scipy.fft.irfft(scipy.fft.rfft(decay, nfft, axis=-1)*refSpectrum, nfft, axis=-1)[:, :numberOfBins]
+
+        conv = binWidth_ns*(conv - 0.5*refData)
+
+        k = conv*(refDecayRate - g)[:, np.newaxis] + refData
+        k[:, 0] -= refData[0]
+
+        k[g*binWidth_ns >= __EXMAX, 1:] = 0.
+
+        kernel[:, start:start+chunk] = k.T
+
+    return kernel
+
+# linear terms (USERLF) for RUSER(80) = 1: constant background and the reference corrected for its mono-exponential decay
+def linearTerms(refData, refDecayRate, binWidth_ns):
+    refData = np.asarray(refData, dtype='float')
+
+    return np.column_stack((np.ones(len(refData)), refDecayRate*refData + np.gradient(refData, binWidth_ns)))
+
+# regularizor of second order with one zero grid point beyond each end of the grid (NORDER=2, NENDZ=1,1, see SETREG)
+def __regularizor(numberOfGridPoints):
+    reg = np.zeros((numberOfGridPoints, numberOfGridPoints + 2))
+
+    j = np.arange(numberOfGridPoints)
+
+    reg[j, j]         = -2.
+    reg[j[1:], j[:-1]] = 1.
+    reg[j[:-1], j[1:]] = 1.
+
+    return reg
+
+# scale factors of the solution (see SETSCA) and the regularizor scaled by them (see SETREG)
+def __scaling(matrix, reg):
+    regNorm = np.abs(reg).sum(axis=0)
+    colNorm = np.abs(matrix).sum(axis=0)
+
+    regularized = regNorm > 0.
+
+    sscale = np.empty(matrix.shape[1])
+
+    sscale[regularized]  = 1./regNorm[regularized]
+    sscale[regularized] /= np.mean(colNorm[regularized]*sscale[regularized])
+    sscale[~regularized] = 1./colNorm[~regularized]
+
+    reg = reg*sscale
+    reg *= reg.size/np.abs(reg).sum()
+
+    return sscale, reg
+
+# transformation of the regularized problem to diagonal form (see ELIMEQ, DIAREG and DIAGA):
+#
+# the solution is zero at both ends of the grid, so the remaining (free) variables y = T*V*z' transform the problem to
+#
+#   min |diag(s)*z' - U^T*Q^T*b|^2 + alpha^2*|z'|^2
+#
+# with the singular values s of the scaled coefficient matrix.
+def __prepareStage(matrix, reg, sqrtw, numberOfGridPoints):
+    sscale, reg = __scaling(sqrtw[:, np.newaxis]*matrix, reg)
+
+    free    = np.r_[1:numberOfGridPoints-1, numberOfGridPoints:matrix.shape[1]]
+    nonneg  = np.arange(numberOfGridPoints - 2)
+
+    coeffs = (sqrtw[:, np.newaxis]*matrix*sscale)[:, free]
+
+    q, r = np.linalg.qr(coeffs)
+
+    # regularizor made full rank by raising its singular values (NUNREG unregularized variables)
+    _, h, zt = np.linalg.svd(reg[:, free])
+
+    small = np.sqrt(0.1*__PRECIS)*h[0]
+
+    nunreg = int(np.count_nonzero(h <= small))
+
+    h = np.maximum(h, small)
+
+    t = zt.T/h
+
+    u, s, vt = np.linalg.svd(r @ t)
+
+    return {'sscale': sscale,
+            'free'  : free,
+            'nonneg': nonneg,
+            'coeffs': coeffs,
+            'proj'  : q @ u,
+            'tv'    : t @ vt.T,
+            's'     : s,
+            'nunreg': nunreg,
+            'ng'    : numberOfGridPoints,
+            'ngl'   : matrix.shape[1]}
+
+# F-distribution (FISHNI)
+def __fisher(f, df1, df2):
+    if min(df1, df2) <= 0.:
+        return 1.
+
+    return float(betainc(0.5*df1, 0.5*df2, df1*f/(df2 + df1*f)))
+
+# constrained regularized solution for alpha by least distance programming (see LDPETC, LDP and CVNEQ)
+def __solve(stage, b, beta, alpha, errors=False):
+    s  = stage['s']
+    tv = stage['tv']
+
+    n = len(s)
+
+    denom = s*s + alpha*alpha
+
+    zhat = s*beta/denom
+    dinv = 1./np.sqrt(denom)
+
+    # y(nonneg) >= 0 as G*zeta >= h with z' = zhat + D^-1*zeta
+    tvn = tv[stage['nonneg']]
+
+    lhs = tvn*dinv
+    rhs = -(tvn @ zhat)
+
+    e = np.vstack((lhs.T, rhs))
+    f = np.zeros(n + 1)
+    f[n] = 1.
+
+    try:
+        dual, _ = nnls(e, f, maxiter=30*e.shape[1])
+    except RuntimeError:
+        return None
+
+    res = e @ dual - f
+
+    if not res[n] < 0.:
+        return None
+
+    zp = zhat - dinv*res[:n]/res[n]
+
+    y = tv @ zp
+
+    binding = stage['nonneg'][dual > 0.]
+
+    y[binding] = 0.
+
+    residuals = b - stage['coeffs'] @ y
+
+    # degrees of freedom after eliminating the binding constraints
+    basis = np.eye(n)
+
+    if len(binding):
+        _, sv, vh = np.linalg.svd(tv[binding])
+
+        rank  = int(np.count_nonzero(sv > sv[0]*n*np.finfo(float).eps))
+        basis = vh[rank:].T
+
+    ub, sb, vb = np.linalg.svd(s[:, np.newaxis]*basis, full_matrices=False)
+
+    sb = sb[:min(len(b), basis.shape[1])]
+
+    solution = {'x'        : np.zeros(stage['ngl']),
+                'residuals': residuals,
+                'var'      : float(residuals @ residuals),
+                'degfre'   : float(np.sum(sb*sb/(sb*sb + alpha*alpha)))}
+
+    solution['x'][stage['free']] = y
+
+    if errors:
+        # square root of the covariance matrix of the scaled solution divided by the standard deviation
+        cov = tv @ basis @ vb[:len(sb)].T*(sb/(sb*sb + alpha*alpha))
+
+        solution['cov'] = np.zeros((stage['ngl'], len(sb)))
+        solution['cov'][stage['free']] = cov
+
+    return solution
+
+# coarse and fine scan of alpha choosing the solution by the F-test (see ANALYZ and LDPETC)
+def __scan(stage, b, beta, run=None, narrow=None):
+    s  = stage['s']
+    s1 = s[0]
+
+    ny = len(b)
+
+    # guarantee at least NUNREG+DFMIN degrees of freedom
+    rsvm2j = __SRANGE
+
+    if not (__DFMIN < 0. or __DFMIN + stage['nunreg'] >= len(s)):
+        alp2 = s1*s1
+
+        for j in range(500):
+            if alp2 <= 0.:
+                break
+
+            if np.sum(s*s/(s*s + alp2)) > __DFMIN + stage['nunreg']:
+                break
+
+            alp2 *= 0.1
+
+        if alp2 > 0.:
+            rsvm2j = np.sqrt(10.*alp2)/s1
+
+    state = {'varz'  : __SRANGE,
+             'degfrz': 0.,
+             'rs2mnx': [-1., -1.],
+             'btest' : __SRANGE,
+             'alpbes': 0.,
+             'solbes': None}
+
+    # solution for the j-th of the k values of alpha of a scan: with more than one thread, it is taken from a batch of the following values of
+    # alpha (alpha, alpha*ralpha, ...) solved concurrently
+    def candidate(pending, j, k, alpha, ralpha):
+        if not pending and __threads > 1 and k - j > 1:
+            alphas = [alpha]
+
+            for i in range(1, min(k - j, __threads)):
+                alphas.append(alphas[-1]*ralpha)
+
+            pending.extend(__executor.map(lambda alpha: __solve(stage, b, beta, alpha), alphas))
+
+        if pending:
+            return pending.pop(0)
+
+        return __solve(stage, b, beta, alpha)
+
+    def ldpetc(alpha, solution):
+        if run is not None:
+            run['solutions'] += 1
+
+        if solution is None:
+            return None
+
+        var = solution['var']
+
+        if not state['varz'] < var:
+            state['varz']   = var
+            state['degfrz'] = solution['degfre']
+
+        degfrz = state['degfrz']
+
+        prej = __fisher(max(0., var/state['varz'] - 1.)*max(0., ny - degfrz)/degfrz, degfrz, max(0., ny - degfrz)) if degfrz > 0. else 1.
+
+        rs2mnx = state['rs2mnx']
+
+        if abs(prej) <= 0.01:
+            rs2mnx[0] = alpha/(__PRECIS*s1)
+
+        if prej >= 0.995 and rs2mnx[0] > 0. and rs2mnx[1] <= 0.:
+            rs2mnx[1] = alpha/s1
+
+        if rs2mnx[0] <= 0.:
+            rs2mnx[0] = alpha/(__PRECIS*s1)
+
+        test = abs(prej) - __PLEVEL
+        dub  = test
+
+        if alpha < state['alpbes']:
+            test = abs(dub)
+
+        if test >= state['btest']:
+            return prej
+
+        state['btest']  = abs(dub)
+        state['alpbes'] = alpha
+        state['solbes'] = solution
+
+        return prej
+
+    # the scan stops with the best solution so far if the budget has been spent (not a scan after a stopped preliminary one)
+    def stopped():
+        if run is None or run['truncated'] or not state['btest'] < __SRANGE or not __spent(run):
+            return False
+
+        run['truncated'] = True
+
+        return True
+
+    # 5 solutions from narrow/10 to narrow*10 after a stopped preliminary analysis (see CONTINPALSMAINPROGRAM)
+    if narrow is not None:
+        k = 5
+
+        rtot = min(rsvm2j, 10.*narrow)/(0.1*narrow)
+
+        if rtot <= 1.:
+            rtot = 100.
+
+        ralpha = rtot**(1./(k - 1))
+        alpha  = 0.1*narrow*s1
+
+        pending = []
+
+        for j in range(k):
+            prej  = ldpetc(alpha, candidate(pending, j, k, alpha, ralpha))
+            alpha *= ralpha
+
+            if prej is not None and prej >= __PLEVEL:
+                break
+
+        return state
+
+    # NQPROG(1) solutions from PRECIS*S(1) up to S(1)
+    k = __NQPROG[0]
+
+    rtot = min(rsvm2j, 1.)/__PRECIS
+
+    if rtot <= 1.:
+        rtot = 1./__PRECIS
+
+    ralpha = rtot**(1./(k - 1))
+    alpha  = __PRECIS*s1
+
+    pending = []
+
+    for j in range(k):
+        ldpetc(alpha, candidate(pending, j, k, alpha, ralpha))
+        alpha *= ralpha
+
+        # with a budget, the coarse scan stops as soon as the range of the fine one is bracketed
+        if run is not None and state['rs2mnx'][1] > 0.:
+            break
+
+        if stopped():
+            return state
+
+    # NQPROG(2) solutions between the limits found by the first scan
+    k = __NQPROG[1]
+
+    rs2mnx = state['rs2mnx']
+
+    nabut = 2 - int(rs2mnx[0] > 0.) - int(rs2mnx[1] > 0.)
+    l     = k - nabut + 1
+
+    if l > 0:
+        rtot = abs(min(rsvm2j, rs2mnx[1])/(rs2mnx[0]*__PRECIS))
+
+        if rtot <= 1.:
+            rtot = abs(rs2mnx[1]/(rs2mnx[0]*__PRECIS))
+
+        ralpha = rtot**(1./l)
+
+        if rs2mnx[0] > 0.:
+            rs2mnx[0] *= ralpha
+
+    alpha = abs(rs2mnx[0]*__PRECIS)*s1
+
+    pending = []
+
+    for j in range(k):
+        prej  = ldpetc(alpha, candidate(pending, j, k, alpha, ralpha))
+        alpha *= ralpha
+
+        # with a budget, the fine scan stops as soon as the chosen solution is bracketed
+        if run is not None and prej is not None and prej >= __PLEVEL:
+            break
+
+        if stopped():
+            break
+
+    return state
+
+# state of the budget of an analysis (see __scan()) or None if there is no budget
+def __newRun():
+    if __budget['maxTimeInS'] <= 0. and __budget['maxSolutions'] <= 0:
+        return None
+
+    return {'start': time.perf_counter(), 'solutions': 0, 'truncated': False}
+
+def __spent(run):
+    return ((__budget['maxTimeInS'] > 0. and time.perf_counter() - run['start'] >= __budget['maxTimeInS']) or
+            (__budget['maxSolutions'] > 0 and run['solutions'] >= __budget['maxSolutions']))
+
+# square roots of the least squares weights from the preliminary solution (IWT=2, see SETWT)
+def __weights(y, residuals):
+    fit = np.abs(y - residuals)
+
+    l    = int(np.argmin(np.abs(y - residuals)))
+    jmax = min(len(y), l + 1 + __NERFIT//2)
+    jmin = max(1, jmax - __NERFIT + 1)
+
+    errfit = np.sqrt(np.mean(residuals[jmin-1:jmax]**2))
+
+    return 1./np.sqrt(np.maximum(fit, errfit))
+
+# everything only depending on the reference, the background of the reference and the grid
+def __prepareReference(refData, refBkgrd, refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints):
+    refData = np.asarray(refData, dtype='float') - refBkgrd
+
+    decayRates, cquad = decayRateGrid(minDecayRate, maxDecayRate, numberOfGridPoints)
+
+    kernel = kernelMatrix(refData, refDecayRate, binWidth_ns, decayRates)
+    linear = linearTerms(refData, refDecayRate, binWidth_ns)
+
+    matrix = np.column_stack((kernel*cquad, linear))
+    reg    = __regularizor(numberOfGridPoints)
+
+    # the scale factors normalize the columns, so the preliminary (unweighted) stage does not depend on RUSER(80) of the spectrum
+    stage = __prepareStage(matrix, reg, np.ones(len(refData)), numberOfGridPoints)
+
+    return {'refData'   : refData,
+            'decayRates': decayRates,
+            'matrix'    : matrix,
+            'reg'       : reg,
+            'stage'     : stage}
+
+# RUSER(80) of the spectrum (see USERIN) or None if the spectrum holds no counts above the background
+def __spectrumScale(setup, y, bkgrd, refDecayRate):
+    scale = np.sum(y - bkgrd)/(np.sum(setup['refData'])*refDecayRate)
+
+    if not (np.isfinite(scale) and scale > 0.):
+        return None
+
+    return scale
+
+# column scale factors of the coefficient matrix (the background term is not scaled by RUSER(80))
+def __columnScale(setup, scale):
+    ng = len(setup['decayRates'])
+
+    colScale = np.full(setup['matrix'].shape[1], scale)
+    colScale[ng] = 1.
+
+    return colScale
+
+# complete analysis of one spectrum (both stages), 'beta' being the projection of the spectrum of the preliminary stage
+def __analyse(setup, y, bkgrd, refDecayRate, beta=None):
+    scale = __spectrumScale(setup, y, bkgrd, refDecayRate)
+
+    if scale is None:
+        return None
+
+    matrix = setup['matrix']*__columnScale(setup, scale)
+
+    # preliminary unweighted analysis
+    stage = setup['stage']
+
+    if beta is None:
+        beta = stage['proj'].T @ y
+
+    run = __newRun()
+
+    best = __scan(stage, y, beta, run)
+
+    if best['solbes'] is None:
+        return None
+
+    sqrtw = __weights(y, best['solbes']['residuals'])
+
+    # only a narrow scan around the choice of a stopped preliminary analysis
+    narrow = best['alpbes']/stage['s'][0] if run is not None and run['truncated'] else None
+
+    # weighted analysis
+    return __analyseWeighted(setup, __prepareStage(matrix, setup['reg'], sqrtw, len(setup['decayRates'])), y, sqrtw, run=run, narrow=narrow)
+
+# weighted analysis (ISTAGE=2) of the factorization 'stage' of the weighted coefficient matrix, 'beta' being the projection of the weighted spectrum
+def __analyseWeighted(setup, stage, y, sqrtw, beta=None, run=None, narrow=None):
+    ng = len(setup['decayRates'])
+
+    b = sqrtw*y
+
+    if beta is None:
+        beta = stage['proj'].T @ b
+
+    if run is None and narrow is None:
+        run = __newRun()
+
+    best = __scan(stage, b, beta, run, narrow)
+
+    if best['solbes'] is None:
+        return None
+
+    # chosen solution with the standard errors
+    solution = __solve(stage, b, beta, best['alpbes'], errors=True)
+
+    if solution is None:
+        return None
+
+    ny = len(y)
+
+    intensity    = solution['x'][:ng]*stage['sscale'][:ng]
+    intensityErr = np.zeros(ng)
+
+    if ny > solution['degfre'] and solution['degfre'] > 0.:
+        stddev = np.sqrt(solution['var']/(ny - solution['degfre']))
+
+        intensityErr = stddev*np.sqrt(np.sum(solution['cov'][:ng]**2, axis=1))*stage['sscale'][:ng]
+
+    return {'decayRate'   : setup['decayRates'].copy(),
+            'intensity'   : intensity,
+            'intensityErr': intensityErr,
+            'residuals'   : solution['residuals'],
+            'alpha'       : best['alpbes']/stage['s'][0],
+            'truncated'   : run is not None and run['truncated']}
+
+# weights shared by a stack of spectra of the same shape: the weights (see __weights()) of the preliminary solution of the summed spectra
+#
+# the scaled weighted coefficient matrix does not depend on a constant factor of the weights nor on RUSER(80) (see __scaling()), so
+# with the weights of each spectrum being those of the sum scaled to its counts, the factorization of the weighted stage is computed once
+# for all spectra and only the scale factors of the solution differ. Returns the shared weights and stage or None.
+def __sharedWeightedStage(setup, spectra, betas):
+    pooled = spectra.sum(axis=0)
+
+    best = __scan(setup['stage'], pooled, betas.sum(axis=0))
+
+    if best['solbes'] is None:
+        return None
+
+    sqrtw = __weights(pooled, best['solbes']['residuals'])
+
+    return sqrtw, __prepareStage(setup['matrix'], setup['reg'], sqrtw, len(setup['decayRates']))
+
+# see checkInputParameters() in dcontinpals.cpp
+def checkInputParameters(lifetimeData, refLifetimeData, ltDataLen, binWidth_ps, minTauGrid_ps, maxTauGrid_ps, numberOfGridPoints, offsetChannelBkgrdCalc, numberChannelsBkgrdCalc):
+    if lifetimeData is None:
+        return NO_LIFETIMEDATA
+
+    if refLifetimeData is None:
+        return NO_REFLIFETIMEDATA
+
+    if ltDataLen < 10:
+        return DATALENGTH_TOO_SHORT
+
+    if ltDataLen > 99999:
+        return DATALENGTH_TOO_HIGH
+
+    if binWidth_ps <= 0.:
+        return ZERO_BINWIDTH
+
+    if binWidth_ps < 10.:
+        return BINWIDTH_TOO_SHORT
+
+    if minTauGrid_ps <= 0. or maxTauGrid_ps <= 0. or maxTauGrid_ps <= minTauGrid_ps:
+        return BADVALUE_TAUGRIDLIMITS
+
+    if numberOfGridPoints <= 10:
+        return BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LOW
+
+    if numberOfGridPoints > 1000:
+        return BADVALUE_NUMBERTAUGRIDPOINTS_TOO_LARGE
+
+    if offsetChannelBkgrdCalc + numberChannelsBkgrdCalc >= ltDataLen or offsetChannelBkgrdCalc >= ltDataLen or numberChannelsBkgrdCalc <= 1:
+        return BADVALUE_BACKGROUNDCHANNELS
+
+    return SUCCESS
+
+# plain values of the arguments as passed to the library (ctypes) ...
+def __value(arg):
+    return getattr(arg, 'value', arg)
+
+# ... and the data as int[] (ctypes pointer) or any sequence
+def __data(arg, length):
+    if arg is None:
+        return None
+
+    if isinstance(arg, ctypes._Pointer):
+        return np.ctypeslib.as_array(arg, shape=(length,)).astype('float')
+
+    return np.asarray(arg, dtype='float')[:length]
+
+# decay rates [1/ns], rate of the reference [1/ns], bin width [ns] and the background levels as computed in runContinPALSInMemory()
+def __parameters(refMonoDecayLifetime_ps, binWidth_ps, minTauGrid_ps, maxTauGrid_ps):
+    minDecayRate = 1./(maxTauGrid_ps*1E-3)
+    maxDecayRate = 1./(minTauGrid_ps*1E-3)
+    binWidth_ns  = binWidth_ps*1E-3
+
+    refDecayRate = 1./1E-12
+
+    if not refMonoDecayLifetime_ps == 0.:
+        refDecayRate = 1./(refMonoDecayLifetime_ps*1E-3)
+
+    return minDecayRate, maxDecayRate, binWidth_ns, refDecayRate
+
+def __lookupSetup(refData, refBkgrd, refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints):
+    global __setupKey, __setup
+
+    key = (refData.tobytes(), refBkgrd, refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints)
+
+    if not key == __setupKey:
+        __setup    = __prepareReference(refData, refBkgrd, refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints)
+        __setupKey = key
+
+    return __setup
+
+# same signature and error codes as analyseDataInMemory() of the library (dcontinpals.h)
+def analyseDataInMemory(lifetimeData,
+                        refLifetimeData,
+                        ltDataLen,
+                        refMonoDecayLifetime_ps,
+                        binWidth_ps,
+                        minTauGrid_ps,
+                        maxTauGrid_ps,
+                        numberOfGridPoints,
+                        offsetChannelBkgrdCalc,
+                        numberChannelsBkgrdCalc):
+    global __truncated
+
+    ltDataLen               = __value(ltDataLen)
+    refMonoDecayLifetime_ps = __value(refMonoDecayLifetime_ps)
+    binWidth_ps             = __value(binWidth_ps)
+    minTauGrid_ps           = __value(minTauGrid_ps)
+    maxTauGrid_ps           = __value(maxTauGrid_ps)
+    numberOfGridPoints      = __value(numberOfGridPoints)
+    offsetChannelBkgrdCalc  = __value(offsetChannelBkgrdCalc)
+    numberChannelsBkgrdCalc = __value(numberChannelsBkgrdCalc)
+
+    __truncated = False
+
+    for name in __results:
+        __results[name] = np.zeros(0)
+
+    error = checkInputParameters(lifetimeData, refLifetimeData, ltDataLen, binWidth_ps, minTauGrid_ps, maxTauGrid_ps, numberOfGridPoints, offsetChannelBkgrdCalc, numberChannelsBkgrdCalc)
+
+    if not error == SUCCESS:
+        return error
+
+    y       = __data(lifetimeData, ltDataLen)
+    refData = __data(refLifetimeData, ltDataLen)
+
+    minDecayRate, maxDecayRate, binWidth_ns, refDecayRate = __parameters(refMonoDecayLifetime_ps, binWidth_ps, minTauGrid_ps, maxTauGrid_ps)
+
+    bkgrd    = y[offsetChannelBkgrdCalc:offsetChannelBkgrdCalc+numberChannelsBkgrdCalc].mean()
+    refBkgrd = refData[offsetChannelBkgrdCalc:offsetChannelBkgrdCalc+numberChannelsBkgrdCalc].mean()
+
+    setup = __lookupSetup(refData, refBkgrd, refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints)
+
+    result = __analyse(setup, y, bkgrd, refDecayRate)
+
+    if result is None:
+        return NO_RESULTS
+
+    for name in __results:
+        __results[name] = result[name]
+
+    __truncated = result['truncated']
+
+    return SUCCESS
+
+# there are no FORT.* files involved
+analyseData = analyseDataInMemory
+
+# analysis of a series of spectra sharing the reference: the spectra are projected onto the factorization of the preliminary stage at once
+#
+# spectra:       stack of spectra (spectrum x channel) or list of equally long spectra
+# sharedWeights: weights of the summed spectra scaled to the counts of each spectrum instead of the weights of its own preliminary solution,
+#                so that the factorization of the weighted stage is shared as well and the preliminary stage is done once for the stack
+#                (spectra of the same shape only, e.g. repeated measurements of a sample)
+# see analyseDataInMemory() for the other arguments (all values in [ps])
+#
+# returns a list of dicts (errorCode, decayRate, lifetime, intensity, intensityErr, residuals) in the order of the spectra
+def analyseSpectra(spectra,
+                   refSpectrum,
+                   refMonoDecayLifetime_ps,
+                   binWidth_ps,
+                   minTauGrid_ps,
+                   maxTauGrid_ps,
+                   numberOfGridPoints,
+                   offsetChannelBkgrdCalc,
+                   numberChannelsBkgrdCalc,
+                   sharedWeights=False):
+    spectra = np.atleast_2d(np.asarray(spectra, dtype='float'))
+    refData = np.asarray(refSpectrum, dtype='float')[:spectra.shape[-1]]
+
+    ltDataLen = spectra.shape[-1]
+
+    results = []
+
+    error = checkInputParameters(spectra, refData, ltDataLen, binWidth_ps, minTauGrid_ps, maxTauGrid_ps, numberOfGridPoints, offsetChannelBkgrdCalc, numberChannelsBkgrdCalc)
+
+    if error == SUCCESS and not len(refData) == ltDataLen:
+        error = NO_REFLIFETIMEDATA
+
+    if not error == SUCCESS:
+        return [{'errorCode': error} for spectrum in spectra]
+
+    minDecayRate, maxDecayRate, binWidth_ns, refDecayRate = __parameters(refMonoDecayLifetime_ps, binWidth_ps, minTauGrid_ps, maxTauGrid_ps)
+
+    window = slice(offsetChannelBkgrdCalc, offsetChannelBkgrdCalc+numberChannelsBkgrdCalc)
+
+    setup = __lookupSetup(refData, refData[window].mean(), refDecayRate, binWidth_ns, minDecayRate, maxDecayRate, numberOfGridPoints)
+
+    bkgrds = spectra[:, window].mean(axis=1)
+    betas  = spectra @ setup['stage']['proj']
+
+    shared = __sharedWeightedStage(setup, spectra, betas) if sharedWeights and len(spectra) > 1 else None
+
+    if shared is not None:
+        sqrtw, stage = shared
+
+        counts = spectra.sum(axis=1)
+        betas  = (spectra*sqrtw) @ stage['proj']
+
+    for k, (y, bkgrd, beta) in enumerate(zip(spectra, bkgrds, betas)):
+        if shared is None:
+            result = __analyse(setup, y, bkgrd, refDecayRate, beta)
+        else:
+            scale  = __spectrumScale(setup, y, bkgrd, refDecayRate)
+            result = None
+
+            if scale is not None:
+                factor = np.sqrt(counts.sum()/counts[k])
+
+                result = __analyseWeighted(setup, dict(stage, sscale=stage['sscale']/(factor*__columnScale(setup, scale))), y, factor*sqrtw, factor*beta)
+
+        if result is None:
+            results.append({'errorCode': NO_RESULTS})
+            continue
+
+        result['errorCode'] = SUCCESS
+        result['lifetime']  = 1./(result['decayRate']*1E-3)
+
+        total = result['intensity'].sum()
+
+        result['intensity']    = result['intensity']/total
+        result['intensityErr'] = result['intensityErr']/total
+
+        results.append(result)
+
+    return results
+
+# budget of the scans of the regularization parameter of each analysis as provided by the library (0: no limit): the scans stop as soon as
+# the chosen solution is bracketed and, if the wall time [ms] or the number of solutions exceeds the budget, with the best solution so far
+def setAnalysisBudget(maxTime_ms, maxSolutions):
+    __budget['maxTimeInS']   = max(float(__value(maxTime_ms)), 0.)*1E-3
+    __budget['maxSolutions'] = max(int(__value(maxSolutions)), 0)
+
+def isTruncated():
+    return __truncated
+
+# number of threads solving the candidates of the regularization parameter of an analysis concurrently as provided by the library (default: 1)
+def setAnalysisThreads(threads):
+    global __threads, __executor
+
+    threads = max(int(__value(threads)), 1)
+
+    if threads == __threads:
+        return
+
+    if __executor is not None:
+        __executor.shutdown(wait=True)
+
+    __threads  = threads
+    __executor = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+
+# access to the results of the last analysis as provided by the library
+def gridSize():
+    return len(__results['decayRate'])
+
+def dataSize():
+    return len(__results['residuals'])
+
+def __at(name, index):
+    index = __value(index)
+
+    if index < 0 or index >= len(__results[name]):
+        return 0.
+
+    return float(__results[name][index])
+
+def decayRateAt(index):
+    return __at('decayRate', index)
+
+def lifetimeAt(index):
+    decayRate = decayRateAt(index)
+
+    return 0. if decayRate == 0. else 1./(decayRate*1E-3)
+
+def intensityAt(index):
+    return __at('intensity', index)/__results['intensity'].sum()
+
+def intensityErrAt(index):
+    return __at('intensityErr', index)/__results['intensity'].sum()
+
+def residualsAt(index):
+    return __at('residuals', index)
+
+def exportResults(decayRate, lifetime, intensity, intensityErr, bufferLen):
+    count = min(max(__value(bufferLen), 0), gridSize())
+
+    x = __results['decayRate'][:count]
+
+    total = __results['intensity'].sum()
+
+    if decayRate is not None:
+        decayRate[:count] = x
+
+    if lifetime is not None:
+        lifetime[:count] = np.divide(1., x*1E-3, out=np.zeros(count), where=(x != 0.))
+
+    if intensity is not None:
+        intensity[:count] = __results['intensity'][:count]/total
+
+    if intensityErr is not None:
+        intensityErr[:count] = __results['intensityErr'][:count]/total
+
+    return count
+
+def exportResiduals(residuals, bufferLen):
+    if residuals is None:
+        return 0
+
+    count = min(max(__value(bufferLen), 0), dataSize())
+
+    residuals[:count] = __results['residuals'][:count]
+
+    return count
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# figures of the data, the lifetime distribution (with the Gaussians fitted to its peaks) and the residuals. The figures are drawn into the
+# given matplotlib figure (e.g. plt.figure() for showing them) or into a figure of their own rendered by the Agg backend without any display
+# and written to an image file.
+#
+# renderAsync() renders the figures in a background process, so that an unattended (headless) analysis does not wait for them. Call
+# waitForFigures() before exiting to make sure all image files are written.
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import pyDCONTINPALSPeaks as peakAnalysis
+
+# background process rendering the figures
+__executor = None
+__pending  = []
+
+def __figure(figure):
+    if figure is None:
+        figure = Figure()
+
+        FigureCanvasAgg(figure)
+
+    return figure, figure.add_subplot(111)
+
+def __save(figure, fileName):
+    if fileName is not None:
+        figure.savefig(fileName)
+
+    return fileName
+
+# area normalized sample (and reference) spectrum
+def plotData(specData, refData, binWidthInPs, fileName=None, figure=None):
+    figure, ax = __figure(figure)
+
+    specData = np.asarray(specData, dtype='float')
+
+    ax.semilogy(specData/specData.sum(), 'bo')
+
+    if refData is not None:
+        refData = np.asarray(refData, dtype='float')
+
+        ax.semilogy(refData/refData.sum(), 'r-')
+
+    ax.set_ylabel('area normalized counts [a.u.]')
+    ax.set_xlabel('channels [{} ps]'.format(binWidthInPs))
+
+    return __save(figure, fileName)
+
+# intensity pdf with errors, the fitted Gaussians (peak x 3: amplitude, position, width, see pyDCONTINPALSPeaks.fitPeaks()) and optional reference lifetimes
+def plotDistribution(lifetime, intensity, intensityErr, peaks=None, referenceLifetimes=None, fileName=None, figure=None):
+    figure, ax = __figure(figure)
+
+    ax.errorbar(lifetime, intensity, yerr=intensityErr, marker='s', mfc='red', mec='blue', ms=2, mew=4, label="CONTIN-PALS results")
+
+    if peaks is None:
+        peaks = np.zeros((0, 3))
+
+    curves = peakAnalysis.gaussians(np.asarray(lifetime, dtype='float'), peaks) if len(peaks) else []
+
+    for i in range(len(curves)):
+        ax.plot(lifetime, curves[i], 'r--', lw=1, label='Gaussian fit at {} ps'.format(peaks[i][1]))
+        ax.plot([peaks[i][1], peaks[i][1]], [0, peaks[i][0]], 'r-', lw=2)
+
+    for tau in (referenceLifetimes or []):
+        ax.axvline(x=tau, color='k', linestyle='--')
+
+    ax.set_ylabel('intensity pdf [a.u.]')
+    ax.set_xlabel('characteristic lifetimes [ps]')
+    ax.legend(loc='best')
+
+    return __save(figure, fileName)
+
+# error normalized residuals
+def plotResiduals(residuals, binWidthInPs, fileName=None, figure=None):
+    figure, ax = __figure(figure)
+
+    ax.plot(residuals, 'ro', label="error normalized residuals")
+    ax.legend(loc='best')
+
+    for level in [-4,-2,0,2,4]:
+        ax.axhline(y=level, color='k', linestyle='--')
+
+    ax.set_ylabel('confidence level [sigma]')
+    ax.set_xlabel('channels [{} ps]'.format(binWidthInPs))
+    ax.set_ylim([-6,6])
+
+    return __save(figure, fileName)
+
+# distribution and residuals of a result of the batch analysis (see pyDCONTINPALSBatch.analyseSpectrum()) written to the given directory
+def plotResult(result, outputDir, fileFormat='png', peakSettings=None):
+    outputDir = Path(outputDir)
+    outputDir.mkdir(parents=True, exist_ok=True)
+
+    stem = Path(result['name']).stem
+
+    peaks = peakAnalysis.fitPeaks(result['lifetime'], result['intensity'], peakSettings)['parameters'] if len(result['intensity']) else None
+
+    return [plotDistribution(result['lifetime'], result['intensity'], result['intensityErr'], peaks, fileName=outputDir / '{}_distribution.{}'.format(stem, fileFormat)),
+            plotResiduals(result['residuals'], result['binWidthInPs'], fileName=outputDir / '{}_residuals.{}'.format(stem, fileFormat))]
+
+# renders function(*args, **kwargs) (one of the plot functions writing a file) in the background process, returning its future
+def renderAsync(function, *args, **kwargs):
+    global __executor
+
+    if __executor is None:
+        __executor = ProcessPoolExecutor(max_workers=1)
+
+    future = __executor.submit(function, *args, **kwargs)
+
+    __pending.append(future)
+
+    return future
+
+# waits for all figures to be written, returning the files (errors of the rendering are raised)
+def waitForFigures():
+    global __executor, __pending
+
+    fileNames = []
+
+    try:
+        for future in __pending:
+            fileName = future.result()
+
+            fileNames.extend(fileName if isinstance(fileName, list) else [fileName])
+    finally:
+        __pending = []
+
+        if __executor is not None:
+            __executor.shutdown(wait=True)
+
+        __executor = None
+
+    return fileNames
@@ -26,7 +26,7 @@ __demoMode                  = True # disable if running from real data
 # NOTE: SPECTRUM and IRF (or mono-exponential decay spectrum) data vectors require equal length!
 
 __roi_start                 = 0
-__roi_end                   = 7400 # Note: number of channels is internally limited by CONTIN to <= 4000, so adjust the '__binFactor' in order to fit the given number of channels into this range
+__roi_end                   = 7400 # Note: the work arrays of CONTIN are allocated according to the number of channels (<= 99999), so rebinning ('__binFactor') is optional
 
 # file path (and name) to the SPECTRUM data:
 
@@ -44,6 +44,16 @@ __refDataDelimiter          = '\t'
 
 __skipRows                  = 5;
 
+# binary files are memory-mapped: '*.npy' (NumPy array of one spectrum or a stack of spectra: spectrum x channel) or '*.bin', '*.raw' (raw counts):
+
+__binaryDataType            = '<u4' # data type of the raw counts (e.g. '<u4': little-endian uint32, '<f8': little-endian double)
+__binaryChannels            = None  # number of channels per spectrum of raw files holding a stack of spectra (None: one spectrum per file)
+__binaryHeaderBytes         = 0     # size of a header preceding the raw counts [bytes]
+
+# spectrum of a file holding several spectra (row of a stack or column of a text file):
+
+__specIndex                 = 0
+
 # fixed mono-decay component in units of picoseconds [ps] (1/lambda = tau):
 
 # Note: set to values below 1E-6 if you are providing numerical IRF data as input otherwise the decay rate in [ps]: 
@@ -61,14 +71,24 @@ __irf_t0                    = [0.,6.6]         # [ps]
 
 __gridTau_start             = 10.0   # [ps]
 __gridTau_stop              = 3000.0 # [ps]
-__gridPoints                = 100    # 10 ... 100 Note: this value is internally limited by CONTIN
+__gridPoints                = 100    # 10 ... 1000 Note: the computing time grows with the third power of the number of grid points
 
 # channel/bin resolution [ps]:
 
 __channelResolutionInPs     = 10. # >= 10 ... Note: this value is internally limited by CONTIN. If lower, increase '__binFactor' to fit into this range
-__binFactor                 = 2   # Note: number of channels is internally limited by CONTIN to <= 4000, so adjust the '__binFactor' in order to fit the given number of channels into this range
+__binFactor                 = 2   # Note: the work arrays of CONTIN are allocated according to the number of channels (<= 99999), so rebinning ('__binFactor') is optional
 
 # background estimation/calculation region:
 
 __bkgrd_startIndex          = 6500;
 __bkgrd_count               = 900; # number of channels with respect to the 'startIndex'
+
+# engine running the analysis: 'library' (dcontinpals.dll) or 'numpy' (pure NumPy/SciPy implementation in pyDCONTINPALSEngine.py, no library required):
+
+__engine                    = 'library'
+
+# unattended run (e.g. on compute nodes without display): the figures are not shown but written as image files to '__figureDir' (if set) by a background process:
+
+__headless                  = False
+__figureDir                 = None  # e.g. 'figures'
+__figureFormat              = 'png'
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# loading of spectrum files holding one or more (stacked) spectra:
+#
+# '*.npy':         NumPy array of one spectrum or a stack of spectra (spectrum x channel), memory-mapped
+# '*.bin', '*.raw': raw counts (see defaultBinaryFormat()) of one spectrum or a stack of spectra with a fixed number of channels, memory-mapped
+# otherwise:       text file with one column per spectrum (e.g. of several detectors) and one row per channel
+#
+# a spectrum is referenced by its file (the first spectrum), by (file, index) or given as data vector. loadROI() reads only the channels
+# of the region of interest, i.e. only the required part of a memory-mapped file is accessed and only the required lines of a text file are parsed.
+
+import functools
+import itertools
+from pathlib import Path
+import numpy as np
+
+import pyDCONTINPALSPreprocessing as preprocessing
+
+BINARY_SUFFIXES = ('.bin', '.raw')
+
+def defaultBinaryFormat():
+    return {'dataType'   : '<u4', # data type of the counts (e.g. '<u4': little-endian uint32, '<f8': little-endian double)
+            'channels'   : None,  # number of channels per spectrum (default: one spectrum per file)
+            'headerBytes': 0}     # size of a header preceding the counts [bytes]
+
+def __isReference(spectrum):
+    return isinstance(spectrum, (str, Path)) or (isinstance(spectrum, tuple) and len(spectrum) == 2 and isinstance(spectrum[0], (str, Path)))
+
+def __fileAndIndex(spectrum):
+    if isinstance(spectrum, tuple):
+        return Path(spectrum[0]), int(spectrum[1])
+
+    return Path(spectrum), 0
+
+# values of the text lines [start, end) after skipping 'skipRows' lines (column x line): the lines outside are not parsed
+def __readText(fileName, delimiter, skipRows, start=0, end=None):
+    maxRows = None if end is None else max(end - start, 0)
+
+    if maxRows == 0:
+        return np.zeros((1, 0))
+
+    return np.loadtxt(fileName, delimiter=delimiter, skiprows=skipRows + start, max_rows=maxRows, unpack=True, dtype='float', ndmin=2)
+
+# complete text files are kept for the following spectra of the same file (e.g. one column per detector)
+@functools.lru_cache(maxsize=4)
+def __cachedText(fileName, modified, delimiter, skipRows):
+    values = __readText(fileName, delimiter, skipRows)
+    values.setflags(write=False)
+
+    return values
+
+# stack of the spectra of a binary file (spectrum x channel) mapped into memory
+def __mapBinary(fileName, binaryFormat):
+    fileName = Path(fileName)
+
+    if fileName.suffix.lower() == '.npy':
+        return np.atleast_2d(np.load(fileName, mmap_mode='r'))
+
+    if binaryFormat is None:
+        binaryFormat = defaultBinaryFormat()
+
+    dtype = np.dtype(binaryFormat['dataType'])
+
+    numberOfValues = (fileName.stat().st_size - binaryFormat['headerBytes'])//dtype.itemsize
+    channels       = binaryFormat['channels'] or numberOfValues
+
+    if numberOfValues < channels:
+        raise ValueError("{}: less than {} channels".format(fileName, channels))
+
+    return np.memmap(fileName, dtype=dtype, mode='r', offset=binaryFormat['headerBytes'], shape=(numberOfValues//channels, channels))
+
+def isBinary(fileName):
+    return Path(fileName).suffix.lower() in BINARY_SUFFIXES + ('.npy',)
+
+# number of spectra of the given file (binary files are mapped, only the first data line of text files is read)
+def numberOfSpectra(fileName, delimiter='\t', skipRows=0, binaryFormat=None):
+    if isBinary(fileName):
+        return len(__mapBinary(fileName, binaryFormat))
+
+    return len(__readText(fileName, delimiter, skipRows, 0, 1))
+
+# number of channels of the given spectrum
+def numberOfChannels(spectrum, delimiter='\t', skipRows=0, binaryFormat=None):
+    if not __isReference(spectrum):
+        return np.shape(spectrum)[-1]
+
+    fileName, index = __fileAndIndex(spectrum)
+
+    if isBinary(fileName):
+        return __mapBinary(fileName, binaryFormat).shape[1]
+
+    with open(fileName, 'r') as file:
+        return sum(1 for line in itertools.islice(file, skipRows, None) if line.strip())
+
+# the given files expanded into their spectra: a file stays as it is if it holds a single spectrum, otherwise each of its spectra is referenced by (file, index)
+def expandSpectra(spectra, delimiter='\t', skipRows=0, binaryFormat=None):
+    expanded = []
+
+    for spectrum in spectra:
+        if not isinstance(spectrum, (str, Path)):
+            expanded.append(spectrum)
+            continue
+
+        count = numberOfSpectra(spectrum, delimiter, skipRows, binaryFormat)
+
+        expanded.extend([spectrum] if count == 1 else [(spectrum, index) for index in range(count)])
+
+    return expanded
+
+def spectrumName(spectrum, index=0):
+    if isinstance(spectrum, (str, Path)):
+        return str(spectrum)
+
+    # e.g. 'spectra/detectors[3].bin'
+    if __isReference(spectrum):
+        fileName = Path(spectrum[0])
+
+        return str(fileName.with_name('{}[{}]{}'.format(fileName.stem, spectrum[1], fileName.suffix)))
+
+    return 'spectrum_{}'.format(index)
+
+# channels [start, end) of the given spectrum (file, (file, index) or data vector): views on memory-mapped files
+def loadChannels(spectrum, delimiter='\t', skipRows=0, binaryFormat=None, start=0, end=None):
+    if not __isReference(spectrum):
+        return np.asarray(spectrum, dtype='float')[start:end]
+
+    fileName, index = __fileAndIndex(spectrum)
+
+    if isBinary(fileName):
+        return __mapBinary(fileName, binaryFormat)[index, start:end]
+
+    # only the requested lines are parsed for a single spectrum, while a file of several spectra (see expandSpectra()) is parsed once and cached
+    if not isinstance(spectrum, tuple):
+        return __readText(fileName, delimiter, skipRows, start, end)[0]
+
+    values = __cachedText(str(fileName), fileName.stat().st_mtime_ns, delimiter, skipRows)
+
+    return values[index, start:end]
+
+# complete spectrum as float vector
+def loadSpectrum(spectrum, delimiter='\t', skipRows=0, binaryFormat=None):
+    return np.asarray(loadChannels(spectrum, delimiter, skipRows, binaryFormat), dtype='float')
+
+# rebinned region of interest of the spectrum (see pyDCONTINPALSPreprocessing.roi()) reading the corresponding channels only
+def loadROI(spectrum, roiStart, roiEnd, binFactor=1, delimiter='\t', skipRows=0, binaryFormat=None):
+    start, end = preprocessing.roiIndices(roiStart, roiEnd, binFactor)
+
+    binFactor = max(binFactor, 1)
+
+    return preprocessing.rebin(loadChannels(spectrum, delimiter, skipRows, binaryFormat, start*binFactor, end*binFactor), binFactor)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# peak analysis of the lifetime distributions obtained by CONTIN-PALS: the local maxima of the intensity pdf exceeding a minimum prominence
+# are the start values (height, position and half-maximum width) of a simultaneous least-squares fit of a sum of Gaussians to the distribution
+# using the analytic Jacobian. A stack of distributions (e.g. of a series or of the replicas of a bootstrap) is fitted at once by a batched
+# Levenberg-Marquardt fit: the parameters are padded to the max. number of peaks and the (dense) normal equations of all distributions are
+# solved together, while each distribution has its own damping and convergence.
+#
+# scipy.signal is imported on first use only, as its import dominates the startup of short-lived processes (e.g. workers not fitting any peaks).
+
+import warnings
+import numpy as np
+
+# FWHM = 2*sqrt(2*ln(2))*sigma
+__FWHM_TO_SIGMA = 1./(2.*np.sqrt(2.*np.log(2.)))
+
+def defaultPeakSettings():
+    return {'minProminence': 0.01,  # min. prominence of a peak relative to the max. of the distribution
+            'maxPeaks'     : None,  # max. number of peaks (the most prominent ones) per distribution (default: all)
+            'maxIterations': 200,   # max. number of iterations of the fit
+            'minAmplitude' : 1E-3}  # min. amplitude of a fitted peak relative to the max. of the distribution (see fitPeaks())
+
+# Gaussians (peak x data point) of the given parameters (peak x [amplitude, position, width])
+def gaussians(x, parameters):
+    parameters = np.atleast_2d(parameters)
+
+    return parameters[:,0,np.newaxis]*np.exp(-0.5*((x[np.newaxis,:] - parameters[:,1,np.newaxis])/parameters[:,2,np.newaxis])**2)
+
+# indices of the local maxima of each distribution (row of 'y') with a prominence of at least 'minProminence' times its maximum
+# (sorted by position), as a list of arrays for a stack of distributions and as an array for a single one
+def findPeaks(y, minProminence=0.01, maxPeaks=None):
+    from scipy.signal import peak_prominences
+
+    y = np.asarray(y, dtype='float')
+
+    stack = np.atleast_2d(y)
+
+    # interior points rising from the left and not rising to the right (the first point of a flat top)
+    slope     = np.diff(stack, axis=1)
+    candidate = np.zeros(stack.shape, dtype=bool)
+
+    candidate[:,1:-1] = (slope[:,:-1] > 0.) & (slope[:,1:] <= 0.)
+
+    rows, columns = np.nonzero(candidate)
+
+    peaks = [np.zeros(0, dtype='int')]*len(stack)
+
+    for row in np.unique(rows):
+        indices = columns[rows == row]
+
+        # a flat top followed by a rise has no prominence (removed below, scipy warns about it)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+
+            prominence = peak_prominences(stack[row], indices)[0]
+
+        selected = (prominence >= minProminence*stack[row].max()) & (prominence > 0.)
+
+        indices, prominence = indices[selected], prominence[selected]
+
+        if maxPeaks is not None and len(indices) > maxPeaks:
+            indices = np.sort(indices[np.argsort(prominence)[::-1][:maxPeaks]])
+
+        peaks[row] = indices
+
+    return peaks if y.ndim > 1 else peaks[0]
+
+# start values (peak x [amplitude, position, width]) of the given peaks: height, position and half-maximum width converted into a standard deviation
+def startValues(x, y, peaks):
+    x = np.asarray(x, dtype='float')
+    y = np.asarray(y, dtype='float')
+
+    if not len(peaks):
+        return np.zeros((0, 3))
+
+    from scipy.signal import peak_widths
+
+    width, height, left, right = peak_widths(y, peaks, rel_height=0.5)
+
+    channels = np.arange(len(x))
+
+    sigma = np.abs(np.interp(right, channels, x) - np.interp(left, channels, x))*__FWHM_TO_SIGMA
+    sigma = np.maximum(sigma, np.abs(np.gradient(x))[peaks])
+
+    return np.column_stack((y[peaks], x[peaks], sigma))
+
+# derivatives (distribution x data point x peak x [amplitude, position, width]) of the Gaussians
+def __derivatives(x, parameters):
+    u = (x[np.newaxis,:,np.newaxis] - parameters[:,np.newaxis,:,1])/parameters[:,np.newaxis,:,2]
+    e = np.exp(-0.5*u*u)
+
+    d = np.empty(u.shape + (3,))
+
+    d[...,0] = e
+    d[...,1] = parameters[:,np.newaxis,:,0]*e*u/parameters[:,np.newaxis,:,2]
+    d[...,2] = d[...,1]*u
+
+    return d
+
+# Levenberg-Marquardt fit of all distributions at once: the parameters (distribution x peak x 3) are padded to the max. number of peaks,
+# the padded peaks (amplitude 0) are kept fixed and each distribution has its own damping and stops as soon as it has converged
+def __jointFit(x, stack, parameters, valid, maxIterations, tolerance=1E-10):
+    blocks, maxPeaks = valid.shape
+
+    span = np.abs(x[-1] - x[0])
+
+    lower = np.array([0., min(x[0], x[-1]), 1E-3*np.min(np.abs(np.diff(x)))])
+    upper = np.array([np.inf, max(x[0], x[-1]), span])
+
+    free = np.repeat(valid, 3, axis=1)
+
+    # sums of the squared residuals
+    def cost(p, data):
+        model = np.sum(p[:,np.newaxis,:,0]*np.exp(-0.5*((x[np.newaxis,:,np.newaxis] - p[:,np.newaxis,:,1])/p[:,np.newaxis,:,2])**2), axis=2)
+
+        return np.sum((model - data)**2, axis=1)
+
+    parameters = np.clip(parameters, lower, upper)
+
+    damping = np.full(blocks, 1E-3)
+    active  = np.ones(blocks, dtype=bool)
+    current = cost(parameters, stack)
+
+    for iteration in range(maxIterations):
+        if not np.any(active):
+            break
+
+        p = parameters[active]
+
+        d = __derivatives(x, p)
+
+        residuals = np.einsum('bnk,bnk->bn', d[...,0], p[:,np.newaxis,:,0]) - stack[active]
+
+        jac = (d*valid[active][:,np.newaxis,:,np.newaxis]).reshape(len(p), len(x), 3*maxPeaks)
+
+        normal   = np.einsum('bni,bnj->bij', jac, jac)
+        gradient = np.einsum('bni,bn->bi', jac, residuals)
+
+        diagonal = np.where(free[active], np.diagonal(normal, axis1=1, axis2=2), 1.)
+        diagonal = np.maximum(diagonal, 1E-30)
+
+        normal += (damping[active][:,np.newaxis]*diagonal)[:,:,np.newaxis]*np.eye(3*maxPeaks)[np.newaxis,:,:]
+        normal[~free[active]] = np.eye(3*maxPeaks)[np.newaxis,:,:].repeat(len(p), axis=0)[~free[active]]
+
+        gradient[~free[active]] = 0.
+
+        step = -np.linalg.solve(normal, gradient[...,np.newaxis])[...,0]
+
+        trial = np.clip(p + step.reshape(p.shape), lower, upper)
+
+        trialCost = cost(trial, stack[active])
+
+        accepted = trialCost < current[active]
+        change   = np.where(accepted, current[active] - trialCost, 0.)
+
+        indices = np.nonzero(active)[0]
+
+        parameters[indices[accepted]] = trial[accepted]
+        current[indices[accepted]]    = trialCost[accepted]
+
+        damping[indices] = np.where(accepted, np.maximum(damping[indices]/3., 1E-12), np.minimum(damping[indices]*4., 1E12))
+
+        # converged: negligible decrease of the cost or no decrease possible anymore
+        converged = (accepted & (change <= tolerance*np.maximum(current[indices], 1E-300))) | (damping[indices] >= 1E12)
+
+        active[indices[converged]] = False
+
+    return parameters
+
+# fit of a sum of Gaussians to each distribution (row of 'y') on the grid 'x' (e.g. the lifetimes [ps]), returning a dict per distribution
+# (a list of them for a stack of distributions) with:
+#
+# 'parameters':    amplitude, position and width (standard deviation) of each Gaussian (peak x 3, sorted by position)
+# 'uncertainties': standard errors of the parameters (peak x 3), estimated like scipy.optimize.curve_fit() does
+# 'curves':        Gaussians on the grid (peak x data point)
+# 'areas':         sums of the Gaussians on the grid (peak)
+#
+# Gaussians driven to a vanishing amplitude ('minAmplitude') or to a width below half the spacing of the grid at their position (spikes of the noise
+# resolved by a single grid point) by the fit are no peaks and removed.
+def fitPeaks(x, y, peakSettings=None):
+    if peakSettings is None:
+        peakSettings = defaultPeakSettings()
+
+    x = np.asarray(x, dtype='float')
+    y = np.asarray(y, dtype='float')
+
+    stack = np.atleast_2d(y)
+
+    peaks  = findPeaks(stack, peakSettings['minProminence'], peakSettings['maxPeaks'])
+    starts = [startValues(x, stack[b], peaks[b]) for b in range(len(stack))]
+
+    results = [{'parameters'   : np.zeros((0, 3)),
+                'uncertainties': np.zeros((0, 3)),
+                'curves'       : np.zeros((0, len(x))),
+                'areas'        : np.zeros(0)} for b in range(len(stack))]
+
+    fitted = [b for b in range(len(stack)) if len(starts[b])]
+
+    if not fitted:
+        return results if y.ndim > 1 else results[0]
+
+    # start values padded to the max. number of peaks
+    maxPeaks = max(len(starts[b]) for b in fitted)
+
+    valid      = np.zeros((len(fitted), maxPeaks), dtype=bool)
+    parameters = np.tile([0., 0.5*(x[0] + x[-1]), np.abs(x[-1] - x[0])], (len(fitted), maxPeaks, 1))
+
+    for k, b in enumerate(fitted):
+        valid[k,:len(starts[b])]      = True
+        parameters[k,:len(starts[b])] = starts[b]
+
+    parameters = __jointFit(x, stack[fitted], parameters, valid, peakSettings['maxIterations'])
+
+    derivatives = __derivatives(x, parameters)
+
+    n = len(x)
+
+    ascending = np.argsort(x)
+    spacing   = np.abs(np.gradient(x))[ascending]
+
+    for k, b in enumerate(fitted):
+        p = parameters[k]
+
+        kept = valid[k] & (p[:,0] > peakSettings['minAmplitude']*stack[b].max()) & (p[:,2] >= 0.5*np.interp(p[:,1], x[ascending], spacing))
+
+        p = p[kept]
+
+        residuals = gaussians(x, p).sum(axis=0) - stack[b]
+
+        # covariance of the parameters of this distribution scaled by its residual variance (see scipy.optimize.curve_fit())
+        jac = derivatives[k][:,kept].reshape(n, -1)
+
+        degreesOfFreedom = n - jac.shape[1]
+
+        if degreesOfFreedom > 0:
+            covariance = np.linalg.pinv(jac.T @ jac)*np.sum(residuals**2)/degreesOfFreedom
+        else:
+            covariance = np.full((jac.shape[1], jac.shape[1]), np.inf)
+
+        uncertainties = np.sqrt(np.abs(np.diag(covariance))).reshape(-1, 3)
+
+        order = np.argsort(p[:,1])
+
+        curves = gaussians(x, p[order])
+
+        results[b] = {'parameters'   : p[order],
+                      'uncertainties': uncertainties[order],
+                      'curves'       : curves,
+                      'areas'        : curves.sum(axis=1)}
+
+    return results if y.ndim > 1 else results[0]
+
+# positions, widths and intensities (fractions of the sum of the areas) of the fitted peaks (peak x 3) of each distribution (see fitPeaks())
+def peakTable(x, y, peakSettings=None):
+    results = fitPeaks(x, y, peakSettings)
+
+    def table(result):
+        areas = result['areas']
+
+        return np.column_stack((result['parameters'][:,1], result['parameters'][:,2], areas/areas.sum() if areas.sum() > 0. else areas))
+
+    return [table(result) for result in results] if isinstance(results, list) else table(results)
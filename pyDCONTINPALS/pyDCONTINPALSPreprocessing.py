@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# preprocessing of lifetime spectra prior to the analysis by CONTIN-PALS
+#
+# all functions operate on the last axis, i.e. they accept single spectra (1-D) as well as stacks of spectra (2-D: spectrum x channel)
+
+import ctypes
+import numpy as np
+
+# sum of 'binFactor' adjacent channels: channels [0, binFactor), [binFactor, 2*binFactor), ... (the last bin might be incomplete)
+def rebin(data, binFactor):
+    data = np.asarray(data, dtype='float')
+
+    if binFactor <= 1:
+        return data
+
+    numberOfBins = -(-data.shape[-1]//binFactor)
+    missing      = numberOfBins*binFactor - data.shape[-1]
+
+    if missing:
+        data = np.concatenate((data, np.zeros(data.shape[:-1] + (missing,))), axis=-1)
+
+    return data.reshape(data.shape[:-1] + (numberOfBins, binFactor)).sum(axis=-1)
+
+# channel indices [start, end) with respect to the rebinned data
+def roiIndices(roiStart, roiEnd, binFactor):
+    return int(np.ceil(roiStart/binFactor)), int(np.ceil(roiEnd/binFactor))
+
+# region of interest (view on the rebinned data)
+def roi(data, roiStart, roiEnd, binFactor=1):
+    start, end = roiIndices(roiStart, roiEnd, binFactor)
+
+    return data[..., start:end]
+
+# background channels (offset, count) with respect to the rebinned region of interest as expected by CONTIN-PALS
+def backgroundWindow(bkgrdStartIndex, bkgrdCount, roiStart, binFactor):
+    start = int(np.ceil(roiStart/binFactor))
+
+    offset = int(np.ceil(bkgrdStartIndex/binFactor))
+    count  = int(np.ceil(bkgrdCount/binFactor))
+
+    offset -= start+1
+
+    return offset, count
+
+# mean background counts within the window (see calcBackground() in dcontinpals.cpp)
+def backgroundLevel(data, offset, count):
+    return np.asarray(data)[..., offset:offset+count].mean(axis=-1)
+
+# sum of Gaussian components modelling the IRF:
+#
+# tZero:             channel number of t = 0
+# fwhm_in_ps:        list of FWHMs [ps]
+# intensity:         list of the relative contributions
+# t0_in_ps:          list of the shifts with respect to t = 0 [ps]
+def gaussianIRF(numberOfChannels, tZero, channelResolutionInPs, fwhm_in_ps, intensity, t0_in_ps):
+    t = (np.arange(numberOfChannels) - tZero)*channelResolutionInPs
+
+    fwhm_in_ps = np.asarray(fwhm_in_ps, dtype='float')[:, np.newaxis]
+    intensity  = np.asarray(intensity, dtype='float')[:, np.newaxis]
+    t0_in_ps   = np.asarray(t0_in_ps, dtype='float')[:, np.newaxis]
+
+    return (intensity*np.exp(-0.5*((t - t0_in_ps)/(fwhm_in_ps/2.3548))**2)).sum(axis=0)
+
+# contiguous int32 buffer (values are truncated as by int()) which can be passed to the library ...
+def toIntBuffer(data):
+    return np.ascontiguousarray(np.trunc(data), dtype=np.int32)
+
+# ... as int[] without copying the data
+def intPointer(buffer):
+    assert buffer.dtype == np.int32 and buffer.flags['C_CONTIGUOUS']
+
+    return buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_int))
+
+# complete pipeline: rebinning, ROI and background window of the sample spectrum (or stack of spectra) and the reference
+#
+# returns the int32 buffers of the sample(s) and the reference, the background window (offset, count) and the bin width [ps]
+def preprocess(specData,
+               refData,
+               roiStart,
+               roiEnd,
+               binFactor,
+               bkgrdStartIndex,
+               bkgrdCount,
+               channelResolutionInPs):
+    specData_roi = roi(rebin(specData, binFactor), roiStart, roiEnd, binFactor)
+    refData_roi  = roi(rebin(refData, binFactor), roiStart, roiEnd, binFactor)
+
+    numberOfBins = min(specData_roi.shape[-1], refData_roi.shape[-1])
+
+    offset, count = backgroundWindow(bkgrdStartIndex, bkgrdCount, roiStart, binFactor)
+
+    return toIntBuffer(specData_roi[..., :numberOfBins]), toIntBuffer(refData_roi[..., :numberOfBins]), (offset, count), channelResolutionInPs*binFactor
@@ -21,10 +21,8 @@
 #**
 #*************************************************************************************************
 
-from ctypes import cdll
 from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
 from collections import Counter
 from copy import deepcopy
     
@@ -200,4 +198,120 @@ def generateCompleteLTSpectrum(numberOfComponents=3,
             if ySpec[z] < 0:
                 ySpec[z] = 0
     
-    return ySpec
\ No newline at end of file
+    return ySpec
+
+# linear convolution of numerical data (along the last axis) using the zero-padded convolution theorem, i.e. without wrap-around of the tail into the first channels
+def convolveDataZeroPadded(a, b):
+    a = np.asarray(a, dtype='float')
+    b = np.asarray(b, dtype='float')
+    
+    numberOfBins = a.shape[-1]
+    
+    nfft = 1 << int(2*numberOfBins - 1).bit_length()
+    
+    convAB = np.fft.irfft(np.fft.rfft(a, n=nfft)*np.fft.rfft(b, n=nfft), n=nfft)
+    
+    return convAB[..., :numberOfBins]
+
+# area normalized gaussian distribution functions G(mu = t_zero_in_ps, fwhm) evaluated at the bin centers (one row per spectrum)
+def generateGaussianIRFs(binWidth_in_ps=5.0,
+                         numberOfBins=10000,
+                         tZero_in_ps=0.0,
+                         fwhm_in_ps=230.0,
+                         numberOfSpectra=1):
+    timeBin_in_ps = (2*np.arange(numberOfBins) + 1)*binWidth_in_ps*0.5
+    
+    tZero_in_ps = np.broadcast_to(np.asarray(tZero_in_ps, dtype='float'), (numberOfSpectra,))[:, np.newaxis]
+    sigma       = np.broadcast_to(np.asarray(fwhm_in_ps, dtype='float'), (numberOfSpectra,))[:, np.newaxis]/(2*np.sqrt(2*np.log(2)))
+    
+    irf = np.exp(-0.5*((timeBin_in_ps - tZero_in_ps)/sigma)**2)
+    
+    return irf/irf.sum(axis=1, keepdims=True)
+
+# batch of N complete lifetime spectra (N x numberOfBins) at once: sum of discrete exponential decays convoluted with a gaussian IRF + constant background
+#
+# charactLifetimes_in_ps:  one set of lifetimes for all spectra (e.g. [160.0, 380.0, 1300.0]) or one set per spectrum (e.g. [[160.0, 380.0], [170.0, 400.0, 1500.0]])
+# contributionOfLifetimes: corresponding intensities (each set sums up to 1.0)
+# irf_tZero_in_ps, irf_fwhm_in_ps, integralCounts, constBkgrdCounts: scalar or one value per spectrum
+# noise:                   poisson noise sampled from 'rng' (numpy.random.Generator) or from a generator seeded by 'seed'
+#
+# note: the output intentionally differs from generateCompleteLTSpectrum(), whose circular convolution (convolveData()) wraps the part of the IRF
+# before t = 0 around into the last channels. The linear convolution used here does not, so for an IRF close to the first channel the last channels
+# differ (7.2 % of the maximum at the default irf_tZero_in_ps = 0.0), whereas for an IRF well inside the spectrum both agree to rounding.
+def generateCompleteLTSpectra(charactLifetimes_in_ps=[160.0, 380.0, 1300.0],
+                              contributionOfLifetimes=[0.8, 0.15, 0.05],
+                              numberOfSpectra=None,
+                              binWidth_in_ps=5.0,
+                              integralCounts=5000000,
+                              constBkgrdCounts=0,
+                              numberOfBins=10000,
+                              irf_tZero_in_ps=0.0,
+                              irf_fwhm_in_ps=230.0,
+                              noise=True,
+                              seed=None,
+                              rng=None):
+    if np.ndim(charactLifetimes_in_ps[0]) == 0:
+        charactLifetimes_in_ps  = [charactLifetimes_in_ps]
+        contributionOfLifetimes = [contributionOfLifetimes]
+        
+    if numberOfSpectra is None:
+        numberOfSpectra = len(charactLifetimes_in_ps)
+        
+    assert len(charactLifetimes_in_ps) in (1, numberOfSpectra)
+    assert len(charactLifetimes_in_ps) == len(contributionOfLifetimes)
+    assert numberOfBins > 0
+    assert binWidth_in_ps > 0.1
+    
+    # ragged sets of components are padded by components of zero intensity
+    numberOfComponents = max(len(tau) for tau in charactLifetimes_in_ps)
+    
+    tau       = np.ones((len(charactLifetimes_in_ps), numberOfComponents))
+    intensity = np.zeros((len(charactLifetimes_in_ps), numberOfComponents))
+    
+    for i in range(len(charactLifetimes_in_ps)):
+        assert len(charactLifetimes_in_ps[i]) == len(contributionOfLifetimes[i])
+        assert np.isclose(sum(contributionOfLifetimes[i]), 1.0)
+        assert min(charactLifetimes_in_ps[i]) > 0.0
+        
+        tau[i, :len(charactLifetimes_in_ps[i])]        = charactLifetimes_in_ps[i]
+        intensity[i, :len(contributionOfLifetimes[i])] = contributionOfLifetimes[i]
+        
+    tau       = np.broadcast_to(tau, (numberOfSpectra, numberOfComponents))
+    intensity = np.broadcast_to(intensity, (numberOfSpectra, numberOfComponents))
+    
+    constBkgrdCounts = np.broadcast_to(np.asarray(constBkgrdCounts, dtype='float'), (numberOfSpectra,))[:, np.newaxis]
+    integralCounts   = np.broadcast_to(np.asarray(integralCounts, dtype='float'), (numberOfSpectra,))[:, np.newaxis] - constBkgrdCounts*numberOfBins
+    
+    assert np.all(integralCounts > 0)
+    assert np.all(constBkgrdCounts >= 0)
+    
+    timeBin_in_ps = np.arange(numberOfBins)*binWidth_in_ps
+    
+    # ideal spectra: sum of N discrete exponential decays according to I*exp(-t/tau) normalized to the integral counts
+    ySpec = np.zeros((numberOfSpectra, numberOfBins))
+    
+    for i in range(numberOfComponents):
+        decay = np.exp(-timeBin_in_ps/tau[:, i, np.newaxis])
+        
+        ySpec += (intensity[:, i, np.newaxis]/decay.sum(axis=1, keepdims=True))*decay
+        
+    ySpec *= integralCounts
+    
+    yIRF = generateGaussianIRFs(binWidth_in_ps=binWidth_in_ps,
+                                numberOfBins=numberOfBins,
+                                tZero_in_ps=irf_tZero_in_ps,
+                                fwhm_in_ps=irf_fwhm_in_ps,
+                                numberOfSpectra=numberOfSpectra)
+    
+    ySpec = convolveDataZeroPadded(ySpec, yIRF) + constBkgrdCounts
+    
+    # numerical noise of the fft
+    ySpec[ySpec < 0] = 0
+    
+    if noise:
+        if rng is None:
+            rng = np.random.default_rng(seed)
+            
+        ySpec = rng.poisson(ySpec).astype('float')
+    
+    return ySpec
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# columnar store of the results of large analysis campaigns: each call of appendResults() writes a shard (directory) of .npy files, one per column.
+# The input parameters are scalar columns (one value per record), while the lifetime grid, intensities, errors, residuals and peaks of all
+# records of a shard are concatenated into one array per column with the offsets of the records. The index (index.npy) lists the spectrum
+# ID, the hash of the input parameters (see parameterHash()), the shard and the row of each record.
+#
+# the columns are memory-mapped by the readers (see openStore()), so a campaign can be queried and aggregated without loading it into memory.
+# A store is written by a single process at a time.
+#
+#   store/index.npy
+#   store/shard_000000/<scalar column>.npy             (records)
+#   store/shard_000000/<array column>.npy              (values of all records)
+#   store/shard_000000/<array column group>Offsets.npy (records + 1)
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSPeaks as peakAnalysis
+
+STORE_VERSION = 1
+
+# scalar columns: input parameters (see pyDCONTINPALSBatch.defaultSettings()) and results of each record
+PARAMETER_COLUMNS = ('roiStart', 'roiEnd', 'binFactor', 'gridTauStartInPs', 'gridTauStopInPs', 'gridPoints',
+                     'bkgrdStartIndex', 'bkgrdCount', 'tauMonoDecayInPs', 'channelResolutionInPs', 'usingRefSpectrum')
+RESULT_COLUMNS    = ('errorCode', 'binWidthInPs', 'timestamp', 'solveTimeInMs')
+
+# array columns sharing the offsets of their group
+ARRAY_COLUMNS = {'grid'     : ('lifetime', 'decayRate', 'intensity', 'intensityErr'),
+                 'residuals': ('residuals',),
+                 'peaks'    : ('peaks',)} # position [ps], width [ps] and intensity (fraction) of each peak
+
+# settings entering the parameter hash
+__HASHED_SETTINGS = ('roiStart', 'roiEnd', 'binFactor', 'gridTauInPs', 'gridPoints', 'bkgrdStartIndex', 'bkgrdCount', 'tauMonoDecayInPs',
+                     'channelResolutionInPs', 'usingRefSpectrum', 'tZero', 'irfFWHM', 'irfIntensity', 'irfT0', 'engine', 'warmStart',
+                     'sharedWeights', 'adaptiveGrid', 'coarseGridPoints', 'timeBudgetInMs', 'maxSolutions')
+
+# hash (16 hex digits) of the settings affecting the results, identifying records analysed with the same input parameters
+def parameterHash(settings):
+    values = {key: settings[key] for key in __HASHED_SETTINGS if key in settings}
+
+    # the IRF model is ignored if a reference spectrum is used
+    if values.get('usingRefSpectrum', False):
+        for key in ('tZero', 'irfFWHM', 'irfIntensity', 'irfT0'):
+            values.pop(key, None)
+
+    # keeps the hash of the settings without shared weights (see pyDCONTINPALSEngine.analyseSpectra()), adaptive grid (see pyDCONTINPALSBatch.refinedGrid())
+    # and budget (see setAnalysisBudget() in dcontinpals.h)
+    if not values.get('sharedWeights', False):
+        values.pop('sharedWeights', None)
+
+    if not values.get('adaptiveGrid', False):
+        values.pop('adaptiveGrid', None)
+        values.pop('coarseGridPoints', None)
+
+    for key in ('timeBudgetInMs', 'maxSolutions'):
+        if not values.get(key, 0):
+            values.pop(key, None)
+
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=float).encode()).hexdigest()[:16]
+
+def __parameterValues(settings):
+    return {'roiStart'             : settings['roiStart'],
+            'roiEnd'               : settings['roiEnd'],
+            'binFactor'            : settings['binFactor'],
+            'gridTauStartInPs'     : settings['gridTauInPs'][0],
+            'gridTauStopInPs'      : settings['gridTauInPs'][1],
+            'gridPoints'           : settings['gridPoints'],
+            'bkgrdStartIndex'      : settings['bkgrdStartIndex'],
+            'bkgrdCount'           : settings['bkgrdCount'],
+            'tauMonoDecayInPs'     : settings['tauMonoDecayInPs'],
+            'channelResolutionInPs': settings['channelResolutionInPs'],
+            'usingRefSpectrum'     : settings['usingRefSpectrum']}
+
+def __saveAtomic(fileName, array):
+    temporary = fileName.with_name(fileName.stem + '.tmp.npy')
+
+    np.save(temporary, array)
+    os.replace(temporary, fileName)
+
+def __concatenateIndex(index, appended):
+    if index is None:
+        return appended
+
+    # common lengths of the string fields
+    dtype = np.dtype([(name, index.dtype[name] if index.dtype[name].itemsize >= appended.dtype[name].itemsize else appended.dtype[name]) for name in index.dtype.names])
+
+    return np.concatenate((index.astype(dtype), appended.astype(dtype)))
+
+# appends the given results (see pyDCONTINPALSBatch.analyseSpectrum()) analysed with the given settings as a new shard, returning the number of records
+# written. The peaks of the results not providing them (see pyDCONTINPALSStream.analyseStream()) are fitted (see pyDCONTINPALSPeaks.peakTable()).
+def appendResults(path, results, settings, peakSettings=None):
+    results = list(results)
+
+    if not results:
+        return 0
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    indexFile = path / 'index.npy'
+    index     = np.load(indexFile) if indexFile.exists() else None
+
+    shard = 0 if index is None else int(index['shard'].max()) + 1
+
+    shardDir = path / 'shard_{:06d}'.format(shard)
+    shardDir.mkdir()
+
+    # peaks of all successful results lacking them at once
+    peaks = [result.get('peaks') for result in results]
+
+    missing = [i for i, result in enumerate(results) if peaks[i] is None and result['errorCode'] == batch.SUCCESS and len(result['intensity'])]
+
+    for gridPoints in set(len(results[i]['lifetime']) for i in missing):
+        subset = [i for i in missing if len(results[i]['lifetime']) == gridPoints]
+
+        for i, table in zip(subset, peakAnalysis.peakTable(results[subset[0]]['lifetime'], np.array([results[i]['intensity'] for i in subset]), peakSettings)):
+            peaks[i] = table
+
+    peaks = [np.zeros((0, 3)) if table is None else np.asarray(table, dtype='float').reshape(-1, 3) for table in peaks]
+
+    # scalar columns
+    parameters = __parameterValues(settings)
+
+    columns = {name: np.full(len(results), parameters[name]) for name in PARAMETER_COLUMNS}
+
+    columns['errorCode']     = np.array([result['errorCode'] for result in results], dtype='int32')
+    columns['binWidthInPs']  = np.array([result.get('binWidthInPs', np.nan) for result in results], dtype='float')
+    columns['timestamp']     = np.full(len(results), time.time())
+    columns['solveTimeInMs'] = np.array([result['statistics']['timeInMs']['total'] if result.get('statistics') else np.nan for result in results], dtype='float')
+
+    # array columns
+    for group, names in ARRAY_COLUMNS.items():
+        if group == 'peaks':
+            values = {'peaks': peaks}
+        else:
+            values = {name: [np.asarray(result[name], dtype='float') for result in results] for name in names}
+
+        lengths = np.array([len(value) for value in values[names[0]]])
+
+        columns[group + 'Offsets'] = np.concatenate(([0], np.cumsum(lengths))).astype('int64')
+
+        for name in names:
+            columns[name] = np.concatenate(values[name]) if lengths.sum() else np.zeros((0,) + np.shape(values[name][0])[1:])
+
+    for name, column in columns.items():
+        np.save(shardDir / (name + '.npy'), column)
+
+    # the records become visible with the index
+    appended = np.zeros(len(results), dtype=[('id', 'U{}'.format(max(1, max(len(result['name']) for result in results)))), ('parameterHash', 'U16'), ('shard', 'int32'), ('row', 'int32')])
+
+    appended['id']            = [result['name'] for result in results]
+    appended['parameterHash'] = parameterHash(settings)
+    appended['shard']         = shard
+    appended['row']           = np.arange(len(results))
+
+    __saveAtomic(indexFile, __concatenateIndex(index, appended))
+
+    return len(results)
+
+# generator passing the given results through while appending them to the store in shards of (up to) 'shardSize' records
+def storeResults(path, results, settings, shardSize=1024, peakSettings=None):
+    pending = []
+
+    try:
+        for result in results:
+            pending.append(result)
+
+            if len(pending) >= shardSize:
+                appendResults(path, pending, settings, peakSettings)
+                pending = []
+
+            yield result
+    finally:
+        appendResults(path, pending, settings, peakSettings)
+
+# opens the given stores (e.g. of several campaigns), returning a dict with the index of all records ('id', 'parameterHash', 'store', 'shard', 'row')
+# and the memory-mapped columns of the shards, which are opened on first access
+def openStore(*paths):
+    index = {'id': [], 'parameterHash': [], 'store': [], 'shard': [], 'row': []}
+
+    for store, path in enumerate(paths):
+        indexFile = Path(path) / 'index.npy'
+
+        if not indexFile.exists():
+            continue
+
+        entries = np.load(indexFile)
+
+        for name in ('id', 'parameterHash', 'shard', 'row'):
+            index[name].append(entries[name])
+
+        index['store'].append(np.full(len(entries), store, dtype='int32'))
+
+    index = {name: np.concatenate(values) if values else np.zeros(0) for name, values in index.items()}
+
+    return {'paths': [Path(path) for path in paths], 'index': index, 'shards': {}}
+
+def size(store):
+    return len(store['index']['id'])
+
+def __column(store, storeNumber, shard, name):
+    key = (int(storeNumber), int(shard))
+
+    if key not in store['shards']:
+        store['shards'][key] = {}
+
+    columns = store['shards'][key]
+
+    if name not in columns:
+        columns[name] = np.load(store['paths'][key[0]] / 'shard_{:06d}'.format(key[1]) / (name + '.npy'), mmap_mode='r')
+
+    return columns[name]
+
+def __groupOf(name):
+    for group, names in ARRAY_COLUMNS.items():
+        if name in names:
+            return group
+
+    raise KeyError("unknown array column '{}'".format(name))
+
+def __records(store, records):
+    if records is None:
+        return np.arange(size(store))
+
+    records = np.asarray(records)
+
+    return np.nonzero(records)[0] if records.dtype == bool else records
+
+# values of the given scalar column (see PARAMETER_COLUMNS and RESULT_COLUMNS) of the given records (default: all), read shard by shard
+def scalarColumn(store, name, records=None):
+    records = __records(store, records)
+
+    index = store['index']
+
+    values = None
+
+    for key in sorted(set(zip(index['store'][records].tolist(), index['shard'][records].tolist()))):
+        selected = np.nonzero((index['store'][records] == key[0]) & (index['shard'][records] == key[1]))[0]
+
+        column = __column(store, key[0], key[1], name)
+
+        if values is None:
+            values = np.empty(len(records), dtype=column.dtype)
+
+        values[selected] = column[index['row'][records[selected]]]
+
+    return values if values is not None else np.zeros(0)
+
+# numbers of the records matching all given conditions: spectrum ID, parameter hash or scalar columns, each given as a value or a function
+# returning a boolean mask of the values (e.g. errorCode=1, gridPoints=lambda n: n >= 100)
+def select(store, **conditions):
+    mask = np.ones(size(store), dtype=bool)
+
+    for name, condition in conditions.items():
+        values = store['index'][name] if name in ('id', 'parameterHash') else scalarColumn(store, name)
+
+        mask &= condition(values) if callable(condition) else (values == condition)
+
+    return np.nonzero(mask)[0]
+
+# values of the given array column of a single record (memory-mapped)
+def arrayColumn(store, name, record):
+    group = __groupOf(name)
+
+    storeNumber, shard, row = (store['index'][key][record] for key in ('store', 'shard', 'row'))
+
+    offsets = __column(store, storeNumber, shard, group + 'Offsets')
+
+    return __column(store, storeNumber, shard, name)[offsets[row]:offsets[row + 1]]
+
+# the given array column of the given records stacked into a matrix (record x value), e.g. the intensities of a series analysed on the same grid
+def stackColumn(store, name, records=None):
+    records = __records(store, records)
+
+    rows = [arrayColumn(store, name, record) for record in records]
+
+    if len(set(len(row) for row in rows)) > 1:
+        raise ValueError("the records of column '{}' differ in length".format(name))
+
+    return np.array(rows)
+
+# complete record: ID, parameter hash, scalar and array columns
+def loadRecord(store, record):
+    result = {'id': str(store['index']['id'][record]), 'parameterHash': str(store['index']['parameterHash'][record])}
+
+    for name in PARAMETER_COLUMNS + RESULT_COLUMNS:
+        result[name] = scalarColumn(store, name, [record])[0].item()
+
+    for names in ARRAY_COLUMNS.values():
+        for name in names:
+            result[name] = np.asarray(arrayColumn(store, name, record))
+
+    return result
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# analysis of a spectrum while its acquisition is still running: the accumulated histogram is re-analysed at a given cadence
+# and the distribution and the peaks (see fitPeaks() in pyDCONTINPALSPeaks.py) are compared to the previous analysis, so that
+# the measurement can be stopped as soon as the results have stabilized.
+#
+# the reference is prepared and the engine (library) is loaded only once, so all analyses of the stream share its kernel matrix.
+
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSPeaks as peakAnalysis
+
+def defaultStreamSettings():
+    return {'intervalInSeconds'    : 60.,  # cadence of the analyses [s]
+            'minCounts'            : 0,    # integral counts required for the first analysis
+            'distributionTolerance': 0.01, # max. change of the (area normalized) distribution: 0.5*sum(|I(new) - I(old)|)
+            'peakTolerance'        : 0.01, # max. relative change of the peak positions and widths and max. absolute change of the peak intensities
+            'stableUpdates'        : 3,    # number of consecutive analyses within the tolerances required for a stable result
+            'timeoutInSeconds'     : None} # stop watching a file not modified for this time [s] (default: never)
+
+# accumulated histogram of incremental count arrays (e.g. read from the acquisition), yielded at most every 'intervalInSeconds' and after the last increment
+def accumulate(increments, intervalInSeconds=0.):
+    histogram = None
+    pending   = False
+    lastYield = time.monotonic()
+
+    for increment in increments:
+        increment = np.asarray(increment, dtype='float')
+
+        histogram = increment.copy() if histogram is None else histogram + increment
+        pending   = True
+
+        if time.monotonic() - lastYield >= intervalInSeconds:
+            yield histogram.copy()
+
+            pending   = False
+            lastYield = time.monotonic()
+
+    if pending:
+        yield histogram.copy()
+
+# snapshots of a spectrum file rewritten by the acquisition software: the file is checked every 'intervalInSeconds' and yielded whenever modified
+def watchFile(path, delimiter='\t', skipRows=0, intervalInSeconds=60., timeoutInSeconds=None):
+    path = Path(path)
+
+    lastModified = None
+    lastChange   = time.monotonic()
+
+    while True:
+        try:
+            modified = path.stat().st_mtime_ns
+        except OSError:
+            modified = None
+
+        if modified is not None and not modified == lastModified:
+            try:
+                data = batch.loadSpectrum(path, delimiter, skipRows)
+            except (OSError, ValueError): # incompletely written: retried with the next check
+                data = None
+
+            if data is not None:
+                lastModified = modified
+                lastChange   = time.monotonic()
+
+                yield data
+
+        if timeoutInSeconds is not None and time.monotonic() - lastChange >= timeoutInSeconds:
+            return
+
+        time.sleep(intervalInSeconds)
+
+# positions, widths and intensities (fractions) of the peaks (see peakTable() in pyDCONTINPALSPeaks.py) or None if no peak is found
+def peakParameters(result, peakSettings=None):
+    if len(result['intensity']) == 0:
+        return None
+
+    peaks = peakAnalysis.peakTable(result['lifetime'], result['intensity'], peakSettings)
+
+    if not len(peaks):
+        return None
+
+    return peaks
+
+# change of the distribution and of the peaks between two analyses (the peak change is infinite if the number of peaks differs)
+def resultChange(previous, current):
+    distribution = 0.5*np.sum(np.abs(current['intensity']/current['intensity'].sum() - previous['intensity']/previous['intensity'].sum()))
+
+    peaks = np.inf
+
+    if previous['peaks'] is not None and current['peaks'] is not None and len(previous['peaks']) == len(current['peaks']):
+        relative = np.abs(current['peaks'][:,:2]/previous['peaks'][:,:2] - 1.)
+        absolute = np.abs(current['peaks'][:,2] - previous['peaks'][:,2])
+
+        peaks = max(relative.max(), absolute.max())
+
+    return distribution, peaks
+
+# generator analysing the snapshots of the accumulated spectrum (see accumulate() and watchFile()), yielding the results of batch.analyseSpectrum() with:
+#
+# 'counts':             integral counts of the snapshot
+# 'peaks':              see peakParameters()
+# 'distributionChange': see resultChange() (None for the first analysis)
+# 'peakChange':         see resultChange() (None for the first analysis)
+# 'stable':             True if the results stayed within the tolerances for 'stableUpdates' consecutive analyses
+def analyseStream(snapshots, refSpectrum=None, settings=None, streamSettings=None, libraryPath=None):
+    if settings is None:
+        settings = batch.defaultSettings()
+
+    if streamSettings is None:
+        streamSettings = defaultStreamSettings()
+
+    # the distributions of consecutive snapshots are compared point by point (see resultChange())
+    if settings['adaptiveGrid']:
+        raise ValueError('the adaptive grid is not supported by the stream analysis (each snapshot would be analysed on a grid of its own)')
+
+    previous = None
+    updates  = 0
+    index    = 0
+
+    for snapshot in snapshots:
+        snapshot = np.asarray(snapshot, dtype='float')
+
+        counts = float(snapshot.sum())
+
+        if counts < streamSettings['minCounts']:
+            continue
+
+        # everything depending on the reference only is done once
+        if index == 0:
+            batch.initAnalysis(batch.prepareReference(refSpectrum, len(snapshot), settings), settings, libraryPath)
+
+        result = batch.analyseSpectrum(snapshot, index, 'snapshot_{}'.format(index))
+
+        index += 1
+
+        result['counts']             = counts
+        result['peaks']              = None
+        result['distributionChange'] = None
+        result['peakChange']         = None
+        result['stable']             = False
+
+        if not result['errorCode'] == batch.SUCCESS:
+            updates = 0
+
+            yield result
+            continue
+
+        result['peaks'] = peakParameters(result)
+
+        if previous is not None:
+            result['distributionChange'], result['peakChange'] = resultChange(previous, result)
+
+            if result['distributionChange'] <= streamSettings['distributionTolerance'] and result['peakChange'] <= streamSettings['peakTolerance']:
+                updates += 1
+            else:
+                updates = 0
+
+        result['stable'] = updates >= streamSettings['stableUpdates']
+
+        previous = result
+
+        yield result
+
+def __parseArguments(argv):
+    settings       = batch.defaultSettings()
+    streamSettings = defaultStreamSettings()
+
+    parser = argparse.ArgumentParser(description='analysis of a lifetime spectrum during its acquisition using CONTIN-PALS')
+
+    parser.add_argument('spectrum', help='spectrum file rewritten by the acquisition')
+    parser.add_argument('--output', help='directory the results of each analysis are written to')
+    parser.add_argument('--interval', type=float, default=streamSettings['intervalInSeconds'], help='cadence of the analyses [s] (default: 60)')
+    parser.add_argument('--timeout', type=float, default=streamSettings['timeoutInSeconds'], help='stop if the file is not modified for this time [s] (default: never)')
+    parser.add_argument('--min-counts', type=float, default=streamSettings['minCounts'], help='integral counts required for the first analysis')
+    parser.add_argument('--tolerance', type=float, nargs=2, default=[streamSettings['distributionTolerance'],streamSettings['peakTolerance']], metavar=('DISTRIBUTION','PEAKS'))
+    parser.add_argument('--stable-updates', type=int, default=streamSettings['stableUpdates'])
+    parser.add_argument('--stop-when-stable', action='store_true', help='stop as soon as the results are stable')
+
+    batch.addSettingsArguments(parser, settings)
+
+    args = parser.parse_args(argv)
+
+    if args.adaptive_grid:
+        parser.error('--adaptive-grid is not supported by the stream analysis')
+
+    streamSettings['intervalInSeconds']                                      = args.interval
+    streamSettings['timeoutInSeconds']                                       = args.timeout
+    streamSettings['minCounts']                                              = args.min_counts
+    streamSettings['distributionTolerance'], streamSettings['peakTolerance'] = args.tolerance
+    streamSettings['stableUpdates']                                          = args.stable_updates
+
+    return args, batch.applySettingsArguments(args, settings), streamSettings
+
+if __name__ == '__main__':
+    args, settings, streamSettings = __parseArguments(sys.argv[1:])
+
+    snapshots = watchFile(args.spectrum, settings['specDataDelimiter'], settings['skipRows'], streamSettings['intervalInSeconds'], streamSettings['timeoutInSeconds'])
+
+    for result in analyseStream(snapshots, args.ref, settings, streamSettings, args.library):
+        line = '[{}] {:.0f} counts: {}'.format(result['index'], result['counts'], result['errorString'])
+
+        if result['errorCode'] == batch.SUCCESS:
+            if result['distributionChange'] is not None:
+                line += ' (change of distribution: {:.4f}, peaks: {:.4f})'.format(result['distributionChange'], result['peakChange'])
+
+            if result['peaks'] is not None:
+                line += ' peaks [ps]: ' + ', '.join('{:.1f} ({:.1f} %)'.format(peak[0], 100.*peak[2]) for peak in result['peaks'])
+
+            if args.output:
+                result['name'] = '{}_{}'.format(Path(args.spectrum).stem, result['index'])
+
+                line += ' -> {}'.format(batch.saveResult(result, args.output))
+
+        print(line)
+
+        if result['stable']:
+            print('results stable within the tolerances for {} analyses'.format(streamSettings['stableUpdates']))
+
+            if args.stop_when_stable:
+                break
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# parameter sweep: a spectrum is analysed for all combinations of the given ROIs, bin factors, grids and background windows by a pool of
+# worker processes. The sample and the reference are rebinned and cut to the ROI once per combination of ROI and bin factor and shared by
+# all configurations using it. The peaks (see pyDCONTINPALSPeaks.py) and the quality of the residuals of each configuration are collected
+# in a table, so that the robustness of the results with respect to the settings can be judged from a single run.
+
+import argparse
+import itertools
+import os
+import sys
+from multiprocessing import Pool
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSLoader as loader
+import pyDCONTINPALSPeaks as peakAnalysis
+
+# preprocessed data (by ROI and bin factor) and peak settings of the worker processes
+__prepared     = None
+__peakSettings = None
+
+# values of each swept setting (default: the given settings only)
+def defaultSweepSettings(settings=None):
+    if settings is None:
+        settings = batch.defaultSettings()
+
+    return {'roi'        : [[settings['roiStart'], settings['roiEnd']]],
+            'binFactor'  : [settings['binFactor']],
+            'gridTauInPs': [list(settings['gridTauInPs'])],
+            'gridPoints' : [settings['gridPoints']],
+            'bkgrd'      : [[settings['bkgrdStartIndex'], settings['bkgrdCount']]]}
+
+# settings of all combinations of the swept values
+def configurations(settings, sweepSettings):
+    configs = []
+
+    for roi, binFactor, gridTauInPs, gridPoints, bkgrd in itertools.product(sweepSettings['roi'],
+                                                                             sweepSettings['binFactor'],
+                                                                             sweepSettings['gridTauInPs'],
+                                                                             sweepSettings['gridPoints'],
+                                                                             sweepSettings['bkgrd']):
+        config = dict(settings)
+
+        config['roiStart'], config['roiEnd']            = roi
+        config['binFactor']                             = binFactor
+        config['gridTauInPs']                           = list(gridTauInPs)
+        config['gridPoints']                            = gridPoints
+        config['bkgrdStartIndex'], config['bkgrdCount'] = bkgrd
+        config['warmStart']                             = False # the configurations are independent
+
+        configs.append(config)
+
+    return configs
+
+def __preprocessingKey(settings):
+    return settings['roiStart'], settings['roiEnd'], settings['binFactor']
+
+def __initWorker(libraryPath, settings, prepared, peakSettings):
+    global __prepared, __peakSettings
+
+    batch.initAnalysis(None, settings, libraryPath)
+
+    __prepared     = prepared
+    __peakSettings = peakSettings
+
+# reduced chi-square of the (error normalized) residuals and their lag-1 autocorrelation (close to 0 for uncorrelated residuals)
+def residualQuality(residuals):
+    residuals = np.asarray(residuals, dtype='float')
+
+    if len(residuals) < 2:
+        return np.nan, np.nan
+
+    centered = residuals - residuals.mean()
+    variance = np.sum(centered**2)
+
+    correlation = np.sum(centered[1:]*centered[:-1])/variance if variance > 0. else np.nan
+
+    return float(np.mean(residuals**2)), float(correlation)
+
+def __analyseConfiguration(task):
+    index, settings = task
+
+    specDataROI, refDataROI = __prepared[__preprocessingKey(settings)]
+
+    result = batch.analysePrepared(specDataROI, refDataROI, settings, index, 'configuration_{}'.format(index))
+
+    record = {'index'              : index,
+              'roiStart'           : settings['roiStart'],
+              'roiEnd'             : settings['roiEnd'],
+              'binFactor'          : settings['binFactor'],
+              'gridTauInPs'        : settings['gridTauInPs'],
+              'gridPoints'         : settings['gridPoints'],
+              'bkgrdStartIndex'    : settings['bkgrdStartIndex'],
+              'bkgrdCount'         : settings['bkgrdCount'],
+              'errorCode'          : result['errorCode'],
+              'errorString'        : result['errorString'],
+              'peaks'              : np.zeros((0, 3)),
+              'reducedChiSquare'   : np.nan,
+              'residualCorrelation': np.nan}
+
+    if not result['errorCode'] == batch.SUCCESS:
+        return record
+
+    if len(result['intensity']):
+        record['peaks'] = peakAnalysis.peakTable(result['lifetime'], result['intensity'], __peakSettings)
+
+    record['reducedChiSquare'], record['residualCorrelation'] = residualQuality(result['residuals'])
+
+    return record
+
+# generator yielding a record (dict) per configuration (see configurations()) in order of completion with:
+#
+# 'index':                                   number of the configuration
+# 'roiStart', 'roiEnd', 'binFactor', ...:    swept settings of the configuration
+# 'errorCode', 'errorString':                see batch.analyseSpectrum()
+# 'peaks':                                   position [ps], width [ps] and intensity (fraction) of each peak (peak x 3)
+# 'reducedChiSquare', 'residualCorrelation': see residualQuality()
+def sweep(spectrum, refSpectrum=None, settings=None, sweepSettings=None, processes=None, libraryPath=None, peakSettings=None):
+    if settings is None:
+        settings = batch.defaultSettings()
+
+    if sweepSettings is None:
+        sweepSettings = defaultSweepSettings(settings)
+
+    configs = configurations(settings, sweepSettings)
+
+    # the spectrum is loaded once and preprocessed once per ROI and bin factor
+    specData = batch.loadSpectrum(spectrum, settings['specDataDelimiter'], settings['skipRows'], batch.binaryFormat(settings))
+
+    if settings['usingRefSpectrum']:
+        refSpectrum = batch.loadSpectrum(refSpectrum, settings['refDataDelimiter'], settings['skipRows'], batch.binaryFormat(settings))
+
+    prepared = {}
+
+    for config in configs:
+        key = __preprocessingKey(config)
+
+        if key not in prepared:
+            prepared[key] = (loader.loadROI(specData, config['roiStart'], config['roiEnd'], config['binFactor']),
+                             batch.prepareReference(refSpectrum, len(specData), config))
+
+    tasks = list(enumerate(configs))
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    processes = max(1, min(processes, len(tasks)))
+
+    with Pool(processes=processes, initializer=__initWorker, initargs=(libraryPath, settings, prepared, peakSettings)) as pool:
+        for record in pool.imap_unordered(__analyseConfiguration, tasks):
+            yield record
+
+# records of all configurations in their order
+def sweepTable(spectrum, refSpectrum=None, settings=None, sweepSettings=None, processes=None, libraryPath=None, peakSettings=None):
+    return sorted(sweep(spectrum, refSpectrum, settings, sweepSettings, processes, libraryPath, peakSettings), key=lambda record: record['index'])
+
+def saveSweep(records, fileName):
+    maxPeaks = max([len(record['peaks']) for record in records] + [0])
+
+    header = 'configuration\troi start\troi end\tbin factor\tgrid start [ps]\tgrid stop [ps]\tgrid points\tbkgrd start\tbkgrd count\terror code\treduced chi-square\tresidual correlation'
+
+    for k in range(maxPeaks):
+        header += '\ttau {0} [ps]\tsigma {0} [ps]\tintensity {0}'.format(k+1)
+
+    rows = []
+
+    for record in records:
+        peaks = np.full((maxPeaks, 3), np.nan)
+        peaks[:len(record['peaks'])] = record['peaks']
+
+        rows.append([record['index'], record['roiStart'], record['roiEnd'], record['binFactor'], record['gridTauInPs'][0], record['gridTauInPs'][1], record['gridPoints'],
+                     record['bkgrdStartIndex'], record['bkgrdCount'], record['errorCode'], record['reducedChiSquare'], record['residualCorrelation']] + list(peaks.ravel()))
+
+    np.savetxt(fileName, np.array(rows, dtype='float').reshape(len(rows), -1), delimiter='\t', fmt='%g', header=header)
+
+    return fileName
+
+def __pairs(values, option):
+    if values is None:
+        return None
+
+    if len(values) % 2:
+        raise SystemExit('{} expects pairs of values'.format(option))
+
+    return [list(values[i:i+2]) for i in range(0, len(values), 2)]
+
+def __parseArguments(argv):
+    settings = batch.defaultSettings()
+
+    parser = argparse.ArgumentParser(description='parameter sweep of the analysis of a lifetime spectrum using CONTIN-PALS')
+
+    parser.add_argument('spectrum', help='sample spectrum')
+    parser.add_argument('--output', help='file the table of the configurations is written to')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: number of CPU cores)')
+    parser.add_argument('--sweep-roi', type=int, nargs='+', metavar='START END', help='ROIs (pairs of start and end)')
+    parser.add_argument('--sweep-bin-factor', type=int, nargs='+', metavar='N')
+    parser.add_argument('--sweep-grid', type=float, nargs='+', metavar='TAU_START TAU_STOP', help='grids [ps] (pairs of start and stop)')
+    parser.add_argument('--sweep-grid-points', type=int, nargs='+', metavar='N')
+    parser.add_argument('--sweep-bkgrd', type=int, nargs='+', metavar='START COUNT', help='background windows (pairs of start and count)')
+
+    batch.addSettingsArguments(parser, settings)
+
+    args = parser.parse_args(argv)
+
+    settings      = batch.applySettingsArguments(args, settings)
+    sweepSettings = defaultSweepSettings(settings)
+
+    for key, values in (('roi', __pairs(args.sweep_roi, '--sweep-roi')),
+                        ('binFactor', args.sweep_bin_factor),
+                        ('gridTauInPs', __pairs(args.sweep_grid, '--sweep-grid')),
+                        ('gridPoints', args.sweep_grid_points),
+                        ('bkgrd', __pairs(args.sweep_bkgrd, '--sweep-bkgrd'))):
+        if values is not None:
+            sweepSettings[key] = values
+
+    return args, settings, sweepSettings
+
+if __name__ == '__main__':
+    args, settings, sweepSettings = __parseArguments(sys.argv[1:])
+
+    records = []
+
+    print('config.  roi          bin  grid [ps]        points  bkgrd        chi2      corr.   peaks [ps] (intensity)')
+
+    for record in sweep(args.spectrum, args.ref, settings, sweepSettings, args.processes, args.library):
+        records.append(record)
+
+        line = '{:7d}  {:5d}-{:<5d}  {:3d}  {:6.1f}-{:<8.1f}  {:6d}  {:5d}+{:<5d}  '.format(record['index'], record['roiStart'], record['roiEnd'], record['binFactor'],
+                                                                                          record['gridTauInPs'][0], record['gridTauInPs'][1], record['gridPoints'],
+                                                                                          record['bkgrdStartIndex'], record['bkgrdCount'])
+
+        if not record['errorCode'] == batch.SUCCESS:
+            print(line + record['errorString'])
+            continue
+
+        line += '{:8.3f}  {:6.3f}  '.format(record['reducedChiSquare'], record['residualCorrelation'])
+        line += ', '.join('{:.1f} ({:.1f} %)'.format(peak[0], 100.*peak[2]) for peak in record['peaks'])
+
+        print(line)
+
+    if args.output:
+        print('-> {}'.format(saveSweep(sorted(records, key=lambda record: record['index']), args.output)))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# regression checks of the adaptive grid (see pyDCONTINPALSBatch.refinedGrid()) using the NumPy engine, i.e. without the library:
+#
+#   python -m pytest pyDCONTINPALS
+
+import numpy as np
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSSpecSimulator as specSimulator
+
+# simulated spectrum of a single lifetime (narrow peak of the distribution) and its reference
+def __singlePeak():
+    np.random.seed(3)
+
+    common = {'binWidth_in_ps': 20., 'integralCounts': 2000000, 'constBkgrdCounts': 5, 'numberOfBins': 600, 'irf_tZero_in_ps': 1000., 'irf_fwhm_in_ps': 230., 'noise': True, 'noiseLevel': 1.0}
+
+    spectrum = specSimulator.generateCompleteLTSpectrum(numberOfComponents=1, charactLifetimes_in_ps=[400.], contributionOfLifetimes=[1.], **common)
+    refData  = specSimulator.generateCompleteLTSpectrum(numberOfComponents=1, charactLifetimes_in_ps=[182.], contributionOfLifetimes=[1.], **common)
+
+    settings = batch.defaultSettings()
+
+    settings.update({'engine'               : 'numpy',
+                     'usingRefSpectrum'     : True,
+                     'roiStart'             : 0,
+                     'roiEnd'               : 599,
+                     'binFactor'            : 1,
+                     'channelResolutionInPs': 20.,
+                     'bkgrdStartIndex'      : 500,
+                     'bkgrdCount'           : 90,
+                     'gridTauInPs'          : [10., 3000.],
+                     'gridPoints'           : 12,
+                     'adaptiveGrid'         : True})
+
+    return spectrum, refData, settings
+
+def __analyse(spectrum, refData, settings):
+    batch.initAnalysis(batch.prepareReference(refData, None, settings), settings)
+
+    return batch.analyseSpectrum(spectrum)
+
+def test_refinedGridOfNarrowPeak():
+    lifetime  = np.exp(np.linspace(np.log(10.), np.log(3000.), 30))
+    intensity = np.zeros(30)
+
+    intensity[15] = 1.
+
+    tauRange, gridPoints = batch.refinedGrid(lifetime, intensity, dict(batch.defaultSettings(), gridTauInPs=[10., 3000.], gridPoints=30))
+
+    assert gridPoints == batch.MIN_GRID_POINTS
+
+def test_adaptiveGridOfNarrowPeak():
+    spectrum, refData, settings = __singlePeak()
+
+    result = __analyse(spectrum, refData, settings)
+
+    assert result['errorCode'] == batch.SUCCESS
+    assert len(result['lifetime']) >= batch.MIN_GRID_POINTS
+
+def test_adaptiveGridFallsBackToDenseGrid(monkeypatch):
+    spectrum, refData, settings = __singlePeak()
+
+    # refined grid rejected by the engine
+    monkeypatch.setattr(batch, 'refinedGrid', lambda *args, **kwargs: ([300., 600.], 5))
+
+    result = __analyse(spectrum, refData, settings)
+
+    assert result['errorCode'] == batch.SUCCESS
+    assert len(result['lifetime']) == settings['gridPoints']
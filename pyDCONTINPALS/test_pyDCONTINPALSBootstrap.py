@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# the bootstrap compares the replicas on one fixed grid (see pyDCONTINPALSBatch.refinedGrid() for the adaptive grid):
+#
+#   python -m pytest pyDCONTINPALS
+
+import numpy as np
+import pytest
+
+import pyDCONTINPALSBatch as batch
+import pyDCONTINPALSBootstrap as bootstrap
+
+def test_adaptiveGridIsRejected():
+    settings = dict(batch.defaultSettings(), engine='numpy', adaptiveGrid=True)
+
+    with pytest.raises(ValueError):
+        bootstrap.bootstrap(np.ones(600), np.ones(600), settings, dict(bootstrap.defaultBootstrapSettings(), replicas=6))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+#*************************************************************************************************
+#**")
+#** Copyright (c) 2020-2022 Dr. Danny Petschke. All rights reserved.
+#**")
+#** This program is free software: you can redistribute it and/or modify
+#** it under the terms of the GNU General Public License as published by
+#** the Free Software Foundation, either version 3 of the License, or
+#** (at your option) any later version.
+#**
+#** This program is distributed in the hope that it will be useful,
+#** but WITHOUT ANY WARRANTY; without even the implied warranty of
+#** MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#** GNU General Public License for more details.
+#**")
+#** You should have received a copy of the GNU General Public License
+#** along with this program. If not, see http://www.gnu.org/licenses/.
+#**
+#** Contact: danny.petschke@uni-wuerzburg.de
+#**
+#*************************************************************************************************
+
+# the fit of the peaks (see pyDCONTINPALSPeaks.fitPeaks()):
+#
+#   python -m pytest pyDCONTINPALS
+
+import numpy as np
+
+import pyDCONTINPALSPeaks as peakAnalysis
+
+def test_collapsedComponentsAreRemoved():
+    lifetime  = np.exp(np.linspace(np.log(10.), np.log(3000.), 100))
+    intensity = peakAnalysis.gaussians(lifetime, np.array([[1., 200., 30.], [0.7, 260., 40.], [0.4, 1200., 150.]])).sum(axis=0)
+
+    intensity += 0.005*np.random.default_rng(17).standard_normal(len(lifetime))
+
+    parameters = peakAnalysis.fitPeaks(lifetime, intensity)['parameters']
+
+    assert np.all(parameters[:,0] > 1E-3*intensity.max())
+    assert np.all(parameters[:,2] >= 0.5*np.interp(parameters[:,1], lifetime, np.abs(np.gradient(lifetime))))
+    assert len(parameters) == 2